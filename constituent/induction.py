@@ -7,6 +7,7 @@ from grammar.induction.decomposition import *
 from grammar.lcfrs import *
 from grammar.dcp import *
 from grammar.induction.terminal_labeling import PosTerminals
+from grammar.induction.parallel_induction import induce_in_parallel, DEFAULT_SHARD_SIZE
 from hybridtree.constituent_tree import ConstituentTree
 import copy
 import re
@@ -414,6 +415,31 @@ def binarize(lhs, rhs, dcp_rule, hmarkov=0):
     return rules
 
 
+############################################################
+# Induction on a corpus.
+
+
+def induce_lcfrs_from_corpus(trees, method=direct_extract_lcfrs, start=START, n_workers=1,
+                             shard_size=DEFAULT_SHARD_SIZE, feature_logging=False):
+    """
+    :param trees: corpus of ConstituentTree (list or generator)
+    :param method: maps tree to its LCFRS, e.g., direct_extract_lcfrs or a function that calls fringe_extract_lcfrs \
+        with some recursive partitioning of the tree; if feature_logging, maps tree to pair of LCFRS and feature log
+    :type start: str
+    :param n_workers: number of processes among which the corpus is sharded (None: number of CPUs)
+    :type n_workers: int
+    :param shard_size: number of trees per shard
+    :type shard_size: int
+    :type feature_logging: bool
+    :return: number of trees, proper LCFRS, feature log (or None)
+    :rtype: tuple[int, LCFRS, defaultdict]
+    Merge the grammars of all trees. The result does not depend on n_workers.
+    """
+    n_trees, gram, feature_log = induce_in_parallel(trees, method, start, n_workers, shard_size, feature_logging)
+    gram.make_proper()
+    return n_trees, gram, feature_log
+
+
 ############################################################
 # Induction via unlabelled structure (recursive partitioning).
 
@@ -1,16 +1,17 @@
 """Parsing/Serialization between the CoNLL dependency tree format and HybridTrees."""
 __author__ = 'kilian'
 
-import re
+import glob
+import os
 import sys
 
 from hybridtree.general_hybrid_tree import HybridTree
 from hybridtree.monadic_tokens import CoNLLToken
 
-CONLL_LINE = re.compile(r'^([^\s]+)\s+([^\s]+)\s+([^\s]+)\s+([^\s]+)\s+([^\s]+)\s+([^\s]+)'
-                        r'\s+([^\s]+)\s+([^\s]+)\s+([^\s]+)\s+([^\s]+)$')
-MULTI_TOKEN = re.compile(r'^[^\s]+-[^\s]+')
-EMPTY_LINE = re.compile(r'^[^\s]*$')
+# columns of the CoNLL-X format
+CONLL_COLUMNS = ('ID', 'FORM', 'LEMMA', 'CPOSTAG', 'POSTAG', 'FEATS', 'HEAD', 'DEPREL', 'PHEAD', 'PDEPREL')
+ID, FORM, LEMMA, CPOS, POS, FEATS, HEAD, DEPREL, PHEAD, PDEPREL = range(len(CONLL_COLUMNS))
+N_COLUMNS = len(CONLL_COLUMNS)
 
 DELETE_PUNCTUATION = str.maketrans("", "", '!"&()*+#,/-:.?;<=>@[\\]^_{|}~')
 
@@ -23,8 +24,8 @@ def is_punctuation(form):
 
 def parse_conll_corpus(path, ignore_punctuation, limit=sys.maxsize, start=0):
     """
-    :param path: path to corpus
-    :type: str
+    :param path: path to corpus, or list of paths; paths may be glob patterns
+    :type: str | list[str]
     :param ignore_punctuation: exclude punctuation from tree structure
     :type ignore_punctuation: bool
     :param limit: stop generation after limit trees
@@ -35,94 +36,159 @@ def parse_conll_corpus(path, ignore_punctuation, limit=sys.maxsize, start=0):
     :rtype: __generator[HybridTree]
     :raise Exception: unexpected input in corpus file
     Lazily parses a dependency corpus (in CoNLL format) and generates GeneralHybridTrees.
+    Multiple files are read as one corpus (in the given order, glob patterns in alphabetic order).
     """
+    for tree in parse_conll_lines(_corpus_lines(conll_files(path)), ignore_punctuation, limit, start):
+        yield tree
 
-    # print path
-    with open(path) as file_content:
-        tree_count = 0
-
-        while tree_count < limit:
-            tree = None
-
-            try:
-                line = next(file_content)
-                while line.startswith('#'):
-                    line = next(file_content)
-            except StopIteration:
-                break
-
-            match = CONLL_LINE.match(line)
-            while match:
-                if match.group(1) == '1':
-                    tree_count += 1
-                    tree = HybridTree('tree' + str(tree_count))
-
-                node_id = match.group(1)
-                form = match.group(2)
-                lemma = match.group(3)
-                cpos = match.group(4)
-                pos = match.group(5)
-                feats = match.group(6)
-                parent = match.group(7)
-                deprel = match.group(8)
-
-                # We ignore information about multiple token's as present in the UD version of Prague Dep. TB
-                if MULTI_TOKEN.search(node_id):
-                  pass
-                else:
-                    # If punctuation is to be ignored, we
-                    # remove it from the hybrid tree
-                    # Punctuation according to definition
-                    # cf. http://ilk.uvt.nl/conll/software.html#eval
-
-                    # if not ignore_punctuation or form.translate(no_translation, string.punctuation):
-                    tree.add_node(node_id, CoNLLToken(form, lemma, cpos, pos, feats, deprel), True, True)
-                    if parent != '0':
-                        tree.add_child(parent, node_id)
-                    # else:
-                    #    tree.add_node(node_id, CoNLLToken(form, lemma, pos, fine_grained_pos, feats, deprel), True, False)
-
-                    # TODO: If punctuation is ignored and the root is punctuation,
-                    # TODO: it is added to the tree anyhow.
-                    if parent == '0':
-                        tree.add_to_root(node_id)
-
-                try:
-                    line = next(file_content)
-                    while line.startswith('#'):
-                        line = next(file_content)
-                    match = CONLL_LINE.search(line)
-                except StopIteration:
-                    line = ''
-                    match = None
-
-            # Assume empty line, otherwise raise exception
-            match = EMPTY_LINE.match(line)
-            if not match:
-                raise Exception("Unexpected input in CoNLL corpus file.")
-
-            if tree:
-                # basic sanity checks
-                if not tree.root:
-                    # FIXME: ignoring punctuation may leads to malformed trees
-                    print("non-rooted")
-                    if ignore_punctuation:
-                        continue
-                    raise Exception
-                    # elif root > 1:
-                    # FIXME: turkish corpus contains trees with more than one root
-                    # FIXME: currently, they are ignored
-                    # continue
-                elif tree.n_nodes() != len(tree.id_yield()) or len(tree.nodes()) != len(tree.full_yield()):
-                    # FIXME: ignoring punctuation may leads to malformed trees
-                    if ignore_punctuation:
-                        continue
-                    raise Exception(
-                        '{4}: connected nodes: {0}, total nodes: {1}, full yield: {2}, connected yield: {3}'.format(
-                            str(tree.n_nodes()), str(len(tree.nodes())), str(len(tree.full_yield())),
-                            str(len(tree.id_yield())), tree.sent_label()))
-                if tree_count > start:
+
+def conll_files(paths):
+    """
+    :param paths: path or list of paths, which may be glob patterns
+    :type paths: str | list[str]
+    :return: paths of files, patterns that do not match any file are kept
+    :rtype: list[str]
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    files = []
+    for path in paths:
+        path = os.path.expanduser(path)
+        matches = sorted(glob.glob(path))
+        files += matches if matches else [path]
+    return files
+
+
+def _corpus_lines(files):
+    for path in files:
+        with open(path) as file_content:
+            for line in file_content:
+                yield line
+        # a sentence does not continue in the next file
+        yield '\n'
+
+
+def split_conll_line(line):
+    """
+    :param line: line of a corpus in CoNLL format
+    :type line: str
+    :return: the fields of the line (cf. CONLL_COLUMNS), or None if the line separates sentences
+    :rtype: list[str]
+    :raise Exception: unexpected input in corpus file
+    Fields are separated by tabs; lines that are not tab-separated are split at whitespace.
+    """
+    fields = line.rstrip('\r\n').split('\t')
+    if len(fields) == N_COLUMNS:
+        return fields
+    fields = line.split()
+    if len(fields) == N_COLUMNS:
+        return fields
+    if len(fields) <= 1:
+        return None
+    raise Exception("Unexpected input in CoNLL corpus file.")
+
+
+def parse_conll_lines(lines, ignore_punctuation, limit=sys.maxsize, start=0, tree_count=0):
+    """
+    :param lines: lines of a corpus in CoNLL format, starting at the beginning of a sentence
+    :param ignore_punctuation: exclude punctuation from tree structure
+    :type ignore_punctuation: bool
+    :param limit: stop generation after limit trees (counted from the beginning of the corpus)
+    :type: int
+    :param start: start generation with start'th tree
+    :type start: int
+    :param tree_count: number of trees in the corpus before lines
+    :type tree_count: int
+    :return: a series of hybrid trees, cf. parse_conll_corpus
+    :rtype: __generator[HybridTree]
+    A sentence starts with a token with id 1. The tokens of sentences before start are not processed.
+    """
+    # fields of the tokens of the current sentence, None if there is none or it is skipped
+    tokens = None
+    for line in lines:
+        if line.startswith('#'):
+            continue
+        fields = split_conll_line(line)
+        if fields is None:
+            if tokens is not None:
+                tree = conll_tokens_to_tree(tokens, 'tree' + str(tree_count), ignore_punctuation)
+                tokens = None
+                if tree is not None:
                     yield tree
+            if tree_count >= limit:
+                return
+            continue
+        if fields[ID] == '1':
+            if tree_count >= limit:
+                return
+            tree_count += 1
+            tokens = [] if tree_count > start else None
+        if tokens is not None:
+            tokens.append(fields)
+    if tokens is not None:
+        tree = conll_tokens_to_tree(tokens, 'tree' + str(tree_count), ignore_punctuation)
+        if tree is not None:
+            yield tree
+
+
+def conll_tokens_to_tree(tokens, sent_label, ignore_punctuation):
+    """
+    :param tokens: fields of the tokens of a sentence, cf. split_conll_line
+    :type tokens: list[list[str]]
+    :type sent_label: str
+    :param ignore_punctuation: skip malformed trees instead of raising an exception
+    :type ignore_punctuation: bool
+    :return: dependency tree, or None if it is malformed and ignore_punctuation
+    :rtype: HybridTree
+    :raise Exception: if the tree is malformed (no root, a cycle, a missing head, a repeated id)
+    """
+    # We ignore information about multiple token's as present in the UD version of Prague Dep. TB
+    tokens = [fields for fields in tokens if '-' not in fields[ID]]
+
+    # basic sanity checks in O(n): each node has to be reachable from the root
+    children = {}
+    for fields in tokens:
+        children.setdefault(fields[HEAD], []).append(fields[ID])
+    n_ids = len({fields[ID] for fields in tokens})
+    if '0' not in children:
+        # FIXME: ignoring punctuation may leads to malformed trees
+        print("non-rooted")
+        if ignore_punctuation:
+            return None
+        raise Exception
+    connected = 0
+    visited = set()
+    agenda = ['0']
+    while agenda:
+        for child in children.get(agenda.pop(), []):
+            connected += 1
+            if child not in visited:
+                visited.add(child)
+                agenda.append(child)
+    if connected != len(tokens) or n_ids != len(tokens):
+        # FIXME: ignoring punctuation may leads to malformed trees
+        if ignore_punctuation:
+            return None
+        raise Exception(
+            '{4}: connected nodes: {0}, total nodes: {1}, full yield: {2}, connected yield: {3}'.format(
+                str(connected), str(n_ids), str(len(tokens)), str(len(tokens)), sent_label))
+
+    tree = HybridTree(sent_label)
+    for fields in tokens:
+        node_id = fields[ID]
+        # If punctuation is to be ignored, we
+        # remove it from the hybrid tree
+        # Punctuation according to definition
+        # cf. http://ilk.uvt.nl/conll/software.html#eval
+        # TODO: If punctuation is ignored and the root is punctuation,
+        # TODO: it is added to the tree anyhow.
+        tree.add_node(node_id, CoNLLToken(fields[FORM], fields[LEMMA], fields[CPOS], fields[POS], fields[FEATS],
+                                          fields[DEPREL]), True, True)
+        if fields[HEAD] == '0':
+            tree.add_to_root(node_id)
+        else:
+            tree.add_child(fields[HEAD], node_id)
+    return tree
 
 
 def tree_to_conll_str(tree):
@@ -184,12 +250,13 @@ def compare_dependency_trees(reference, test):
     lem = 0
 
     # sanity check
-    if not [token.form() for token in reference.token_yield()].__eq__([token.form() for token in test.token_yield()]):
+    reference_forms = [token.form() for token in reference.token_yield()]
+    test_forms = [token.form() for token in test.token_yield()]
+    if reference_forms != test_forms:
         raise Exception("yield of trees differs: \'{0}\' vs. \'{1}\'".format(
-            ' '.join([token.form() for token in reference.token_yield()]),
-            ' '.join([token.form() for token in test.token_yield()])))
+            ' '.join(reference_forms), ' '.join(test_forms)))
 
-    for i in range(1, len(reference.token_yield()) + 1):
+    for i in range(1, len(reference_forms) + 1):
         ref_id = reference.index_node(i)
         test_id = test.index_node(i)
         if ref_id in reference.root:
@@ -226,4 +293,4 @@ def score_cmp_dep_trees(reference, test):
     return uas * 1.0 / length, las * 1.0 / length, uem, lem
 
 
-__all__ = ["parse_conll_corpus", "tree_to_conll_str", "score_cmp_dep_trees", "compare_dependency_trees"]
+__all__ = ["parse_conll_corpus", "parse_conll_lines", "tree_to_conll_str", "score_cmp_dep_trees", "compare_dependency_trees"]
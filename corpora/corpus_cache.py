@@ -0,0 +1,273 @@
+"""Binary cache of parsed corpora, stored next to the corpus file"""
+from __future__ import print_function
+# The trees of a corpus are encoded as a few integer arrays (node ids,
+# tokens, ordering, children, secondary children) that refer to a table of
+# distinct values (strings, morphological features, ...). The cache of a
+# corpus file and reader options is stored in
+#     <path>.<hash of reader and options>.cache
+# and contains the hash of the content of the corpus file. It is rebuilt if
+# the content has changed.
+
+import hashlib
+import os
+import pickle
+import numpy as np
+
+from hybridtree.general_hybrid_tree import HybridTree, HybridDag
+from hybridtree.constituent_tree import ConstituentTree
+from hybridtree.monadic_tokens import ConstituentTerminal, ConstituentCategory, CoNLLToken
+
+# to be increased whenever the encoding changes
+FORMAT_VERSION = 1
+CACHE_SUFFIX = '.cache'
+
+TREE_CLASSES = [HybridTree, ConstituentTree, HybridDag]
+
+# token kinds, a node without token has kind NO_TOKEN
+NO_TOKEN, TERMINAL, CATEGORY, CONLL = -1, 0, 1, 2
+MAX_FIELDS = 6
+
+# position of a node w.r.t. the ordering
+UNORDERED, ORDERED, DISCONNECTED = 0, 1, 2
+
+
+class ValueTable:
+    """
+    Assigns consecutive indices to hashable values.
+    """
+    def __init__(self):
+        self.values = []
+        self.__index = {}
+
+    def index(self, value):
+        idx = self.__index.get(value)
+        if idx is None:
+            idx = self.__index[value] = len(self.values)
+            self.values.append(value)
+        return idx
+
+
+def _token_fields(token):
+    if isinstance(token, ConstituentTerminal):
+        morph = tuple(tuple(feat) if isinstance(feat, list) else feat for feat in token.morph_feats())
+        return TERMINAL, (token.form(), token.pos(), token.edge(), morph, token.lemma())
+    elif isinstance(token, ConstituentCategory):
+        return CATEGORY, (token.category(), token.edge())
+    elif isinstance(token, CoNLLToken):
+        return CONLL, (token.form(), token.lemma(), token.cpos(), token.pos(), token.feats(), token.deprel())
+    raise ValueError("Cannot cache token of type " + str(type(token)))
+
+
+def _token(kind, fields):
+    if kind == TERMINAL:
+        form, pos, edge, morph, lemma = fields
+        return ConstituentTerminal(form, pos, edge, list(morph), lemma)
+    elif kind == CATEGORY:
+        return ConstituentCategory(*fields)
+    elif kind == CONLL:
+        return CoNLLToken(*fields)
+    raise ValueError("Unknown token kind " + str(kind))
+
+
+def encode_corpus(trees):
+    """
+    :param trees: hybrid trees, constituent trees, or hybrid dags
+    :type trees: list[HybridTree]
+    :return: arrays and value table that represent trees, cf. decode_corpus
+    :rtype: dict
+    :raise ValueError: if some tree cannot be represented (e.g., because of unknown token types)
+    """
+    table = ValueTable()
+    tree_classes, sent_labels, tree_offsets = [], [], [0]
+    node_ids, kinds, fields, order = [], [], [], []
+    child_offsets, children = [0], []
+    sec_offsets, sec_children = [0], []
+    root_offsets, roots = [0], []
+
+    for tree in trees:
+        if type(tree) not in TREE_CLASSES:
+            raise ValueError("Cannot cache tree of type " + str(type(tree)))
+        nodes = list(tree.nodes())
+        with_token = set(nodes)
+        full_yield = tree.full_yield()
+        full = set(full_yield)
+        # the ordering is restored from the order of nodes
+        if [node for node in nodes if node in full] != full_yield \
+                or [node for node in full_yield if tree.in_ordering(node)] != tree.id_yield():
+            raise ValueError("Cannot cache tree " + str(tree.sent_label()) + " with irregular ordering")
+        local = {node: i for i, node in enumerate(nodes)}
+        for node in nodes:
+            for child in tree.children(node) + (tree.sec_children(node) if isinstance(tree, HybridDag) else []):
+                if child not in local:
+                    local[child] = len(nodes)
+                    nodes.append(child)
+
+        tree_classes.append(TREE_CLASSES.index(type(tree)))
+        sent_labels.append(table.index(tree.sent_label()))
+        for node in nodes:
+            node_ids.append(table.index(node))
+            if node in with_token:
+                kind, values = _token_fields(tree.node_token(node))
+            else:
+                kind, values = NO_TOKEN, ()
+            kinds.append(kind)
+            fields.append([table.index(value) for value in values] + [-1] * (MAX_FIELDS - len(values)))
+            order.append(UNORDERED if node not in full else ORDERED if tree.in_ordering(node) else DISCONNECTED)
+            children.extend(local[child] for child in tree.children(node))
+            child_offsets.append(len(children))
+            if isinstance(tree, HybridDag):
+                sec_children.extend(local[child] for child in tree.sec_children(node))
+            sec_offsets.append(len(sec_children))
+        roots.extend(local[root] for root in tree.root)
+        root_offsets.append(len(roots))
+        tree_offsets.append(len(node_ids))
+
+    def int_array(values):
+        return np.array(values, dtype=np.int32)
+
+    return {'values': table.values,
+            'tree_classes': np.array(tree_classes, dtype=np.int8),
+            'sent_labels': int_array(sent_labels),
+            'tree_offsets': int_array(tree_offsets),
+            'node_ids': int_array(node_ids),
+            'kinds': np.array(kinds, dtype=np.int8),
+            'fields': int_array(fields).reshape((len(node_ids), MAX_FIELDS)),
+            'order': np.array(order, dtype=np.int8),
+            'child_offsets': int_array(child_offsets),
+            'children': int_array(children),
+            'sec_offsets': int_array(sec_offsets),
+            'sec_children': int_array(sec_children),
+            'root_offsets': int_array(root_offsets),
+            'roots': int_array(roots)}
+
+
+def decode_corpus(encoding):
+    """
+    :param encoding: cf. encode_corpus
+    :type encoding: dict
+    :return: trees
+    :rtype: list[HybridTree]
+    """
+    values = encoding['values']
+    tree_offsets = encoding['tree_offsets'].tolist()
+    node_ids = [values[i] for i in encoding['node_ids'].tolist()]
+    kinds = encoding['kinds'].tolist()
+    fields = encoding['fields'].tolist()
+    order = encoding['order'].tolist()
+    child_offsets = encoding['child_offsets'].tolist()
+    children = encoding['children'].tolist()
+    sec_offsets = encoding['sec_offsets'].tolist()
+    sec_children = encoding['sec_children'].tolist()
+    root_offsets = encoding['root_offsets'].tolist()
+    roots = encoding['roots'].tolist()
+
+    trees = []
+    for t, (tree_class, sent_label) in enumerate(zip(encoding['tree_classes'].tolist(),
+                                                     encoding['sent_labels'].tolist())):
+        tree = TREE_CLASSES[tree_class](values[sent_label])
+        first, last = tree_offsets[t], tree_offsets[t + 1]
+        ids = node_ids[first:last]
+        for root in roots[root_offsets[t]:root_offsets[t + 1]]:
+            tree.add_to_root(ids[root])
+        for n in range(first, last):
+            if kinds[n] != NO_TOKEN:
+                token = _token(kinds[n], [values[i] for i in fields[n] if i >= 0])
+                tree.add_node(node_ids[n], token, order[n] != UNORDERED, order[n] != DISCONNECTED)
+        for n in range(first, last):
+            for child in children[child_offsets[n]:child_offsets[n + 1]]:
+                tree.add_child(node_ids[n], ids[child])
+            for child in sec_children[sec_offsets[n]:sec_offsets[n + 1]]:
+                tree.add_sec_child(node_ids[n], ids[child])
+        trees.append(tree)
+    return trees
+
+
+def _normalize(value):
+    # canonical representation of reader options for hashing
+    if isinstance(value, (set, frozenset)):
+        return sorted(_normalize(v) for v in value)
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, dict):
+        return sorted((k, _normalize(v)) for k, v in value.items())
+    return value
+
+
+def cache_file_name(path, reader, options):
+    """
+    :param path: path of corpus file
+    :type path: str
+    :param reader: name of the reader
+    :type reader: str
+    :param options: reader options
+    :type options: dict
+    :rtype: str
+    """
+    key = hashlib.sha1(repr((FORMAT_VERSION, reader, _normalize(options))).encode('utf-8')).hexdigest()
+    return '%s.%s%s' % (path, key[:16], CACHE_SUFFIX)
+
+
+def content_hash(path):
+    """
+    :param path: path of corpus file
+    :type path: str
+    :rtype: str
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as corpus:
+        for block in iter(lambda: corpus.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_corpus(path, read, reader, options=None, cache=True):
+    """
+    :param path: path of corpus file
+    :type path: str
+    :param read: maps path and reader options (as keyword arguments) to the trees of the corpus
+    :type read: function
+    :param reader: name of the reader, part of the cache key
+    :type reader: str
+    :param options: reader options (e.g., disconnect_punctuation, add_vroot, secedge, mode, or settings of a \
+        normalization that read applies to the file first), part of the cache key
+    :type options: dict
+    :param cache: use the cache (otherwise the corpus is just read)
+    :type cache: bool
+    :return: trees of the corpus (as returned by read, if the cache is not used)
+    :rtype: list[HybridTree]
+    Reads the trees from the cache, if there is a cache for the same reader, options and file content.
+    Otherwise the trees are read and the cache is (re)built, unless some tree cannot be cached or the
+    cache cannot be written.
+    """
+    options = {} if options is None else options
+    if not cache:
+        return read(path, **options)
+    cache_file = cache_file_name(path, reader, options)
+    digest = content_hash(path)
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'rb') as cache_in:
+                version, cached_digest = pickle.load(cache_in)
+                if version == FORMAT_VERSION and cached_digest == digest:
+                    return decode_corpus(pickle.load(cache_in))
+        except (pickle.UnpicklingError, EOFError, ValueError):
+            pass
+
+    trees = list(read(path, **options))
+    try:
+        encoding = encode_corpus(trees)
+    except ValueError:
+        return trees
+    tmp_file = cache_file + '.part'
+    try:
+        with open(tmp_file, 'wb') as cache_out:
+            pickle.dump((FORMAT_VERSION, digest), cache_out, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(encoding, cache_out, protocol=pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_file, cache_file)
+    except (IOError, OSError):
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    return trees
+
+
+__all__ = ["load_corpus", "encode_corpus", "decode_corpus", "cache_file_name"]
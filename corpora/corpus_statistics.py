@@ -0,0 +1,201 @@
+"""Statistics of whole corpora (spans, gaps, fanouts, lengths, labels), computed with numpy"""
+from __future__ import print_function
+# The statistics are computed from the array encoding of a corpus (cf.
+# corpus_cache.encode_corpus) instead of tree by tree. Each tree t gets an
+# additional virtual root with number n_nodes + t. The fringe of every node
+# is obtained by propagating the (node, position) pairs of ordered nodes to
+# all ancestors at once, one level per step. The values agree with
+# HybridTree.n_spans, max_n_spans and n_gaps.
+
+import numpy as np
+
+from corpora.corpus_cache import encode_corpus, NO_TOKEN, TERMINAL, CATEGORY, CONLL, UNORDERED, ORDERED
+
+
+def _segment_ids(offsets):
+    """
+    :param offsets: boundaries of consecutive segments
+    :type offsets: np.ndarray
+    :return: segment number of each element
+    :rtype: np.ndarray
+    """
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+
+def _expand(starts, counts):
+    """
+    :return: pair (i, j) of arrays, where the ranges starts[i] ... starts[i] + counts[i] - 1 are enumerated in j
+    :rtype: tuple[np.ndarray, np.ndarray]
+    """
+    i = np.repeat(np.arange(len(starts)), counts)
+    j = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + starts[i]
+    return i, j
+
+
+def _edges(encoding):
+    """
+    :return: arrays of parents and children (global node numbers, including virtual roots)
+    :rtype: tuple[np.ndarray, np.ndarray]
+    """
+    tree_offsets = encoding['tree_offsets'].astype(np.int64)
+    n_nodes = tree_offsets[-1]
+    node_trees = _segment_ids(tree_offsets)
+    child_parents = _segment_ids(encoding['child_offsets'])
+    children = encoding['children'] + tree_offsets[node_trees[child_parents]]
+    root_trees = _segment_ids(encoding['root_offsets'])
+    roots = encoding['roots'] + tree_offsets[root_trees]
+    return np.concatenate([child_parents, n_nodes + root_trees]), np.concatenate([children, roots])
+
+
+def span_counts(encoding):
+    """
+    :param encoding: array encoding of a corpus, cf. corpus_cache.encode_corpus
+    :type encoding: dict
+    :return: number of contiguous spans of the fringe of each node, followed by the virtual root of each tree
+    :rtype: np.ndarray
+    :raise ValueError: if the parent-child relation is cyclic
+    """
+    tree_offsets = encoding['tree_offsets'].astype(np.int64)
+    n_nodes, n_trees = tree_offsets[-1], len(tree_offsets) - 1
+    node_trees = _segment_ids(tree_offsets)
+
+    ordered = encoding['order'] == ORDERED
+    ordered_before = np.concatenate([[0], np.cumsum(ordered)])
+    nodes = np.flatnonzero(ordered)
+    positions = ordered_before[nodes] - ordered_before[tree_offsets[node_trees[nodes]]]
+    # pairs (node, position) are encoded as node * width + position
+    width = int(positions.max()) + 2 if len(positions) else 2
+
+    parents, children = _edges(encoding)
+    by_child = np.argsort(children, kind='mergesort')
+    children, parents = children[by_child], parents[by_child]
+
+    keys = [nodes * width + positions]
+    for _ in range(n_nodes + n_trees + 1):
+        if not len(nodes):
+            break
+        starts = np.searchsorted(children, nodes, 'left')
+        counts = np.searchsorted(children, nodes, 'right') - starts
+        i, j = _expand(starts, counts)
+        step = np.unique(parents[j] * width + positions[i])
+        nodes, positions = step // width, step % width
+        keys.append(step)
+    else:
+        raise ValueError("Parent-child relation of corpus is cyclic")
+
+    keys = np.unique(np.concatenate(keys))
+    # each span starts at a position whose left neighbour is not in the fringe
+    span_starts = keys[~np.isin(keys - 1, keys, assume_unique=True)]
+    return np.bincount(span_starts // width, minlength=n_nodes + n_trees)
+
+
+def tree_statistics(encoding, spans=None):
+    """
+    :param encoding: array encoding of a corpus, cf. corpus_cache.encode_corpus
+    :type encoding: dict
+    :param spans: result of span_counts (computed if omitted)
+    :type spans: np.ndarray
+    :return: per tree: 'length' (size of ordering), 'full_length' (size of full yield), \
+        'max_n_spans' (cf. HybridTree.max_n_spans), 'n_gaps' (cf. HybridTree.n_gaps)
+    :rtype: dict[str, np.ndarray]
+    """
+    if spans is None:
+        spans = span_counts(encoding)
+    tree_offsets = encoding['tree_offsets'].astype(np.int64)
+    n_nodes, n_trees = tree_offsets[-1], len(tree_offsets) - 1
+    node_trees = _segment_ids(tree_offsets)
+    order = encoding['order']
+
+    with_token = encoding['kinds'] != NO_TOKEN
+    max_n_spans = np.full(n_trees, -1, dtype=np.int64)
+    np.maximum.at(max_n_spans, node_trees[with_token], spans[:n_nodes][with_token])
+    max_n_spans[max_n_spans < 0] = 1
+
+    # n_gaps sums n_spans - 1 over all paths from the virtual root, i.e., nodes are weighted by number of paths
+    parents, children = _edges(encoding)
+    by_parent = np.argsort(parents, kind='mergesort')
+    parents, children = parents[by_parent], children[by_parent]
+    all_trees = np.concatenate([node_trees, np.arange(n_trees)])
+    n_gaps = np.zeros(n_trees, dtype=np.int64)
+    nodes = n_nodes + np.arange(n_trees)
+    weights = np.ones(n_trees, dtype=np.int64)
+    for _ in range(n_nodes + n_trees + 1):
+        if not len(nodes):
+            break
+        n_gaps += np.bincount(all_trees[nodes], weights * (spans[nodes] - 1), minlength=n_trees).astype(np.int64)
+        starts = np.searchsorted(parents, nodes, 'left')
+        counts = np.searchsorted(parents, nodes, 'right') - starts
+        i, j = _expand(starts, counts)
+        step = np.bincount(children[j], weights[i], minlength=n_nodes + n_trees).astype(np.int64)
+        nodes = np.flatnonzero(step)
+        weights = step[nodes]
+    else:
+        raise ValueError("Parent-child relation of corpus is cyclic")
+
+    return {'length': np.bincount(node_trees[order == ORDERED], minlength=n_trees),
+            'full_length': np.bincount(node_trees[order != UNORDERED], minlength=n_trees),
+            'max_n_spans': max_n_spans,
+            'n_gaps': n_gaps}
+
+
+def histogram(values):
+    """
+    :param values: integers
+    :type values: np.ndarray | list[int]
+    :return: maps each occurring value to its number of occurrences
+    :rtype: dict[int, int]
+    """
+    keys, counts = np.unique(values, return_counts=True)
+    return dict(zip(keys.tolist(), counts.tolist()))
+
+
+def label_frequencies(encoding, kind, field):
+    """
+    :param encoding: array encoding of a corpus, cf. corpus_cache.encode_corpus
+    :type encoding: dict
+    :param kind: token kind (TERMINAL, CATEGORY, or CONLL)
+    :type kind: int
+    :param field: index of the token field, cf. corpus_cache (e.g., 1 for the pos of a TERMINAL)
+    :type field: int
+    :return: maps each value of the field to its number of occurrences
+    :rtype: dict
+    """
+    indices = encoding['fields'][encoding['kinds'] == kind, field]
+    values = encoding['values']
+    return dict((values[index], count) for index, count in histogram(indices[indices >= 0]).items())
+
+
+# fields of the usual labels of nodes per token kind
+POS_LABEL = TERMINAL, 1
+CATEGORY_LABEL = CATEGORY, 0
+DEPREL_LABEL = CONLL, 5
+
+
+def corpus_statistics(corpus):
+    """
+    :param corpus: trees, or their array encoding (cf. corpus_cache.encode_corpus)
+    :type corpus: list[HybridTree] | dict
+    :return: 'trees' (number of trees), 'nodes' (number of nodes with token), per tree statistics \
+        (cf. tree_statistics), and the histograms 'fanouts' (n_spans of nodes with token), 'lengths', \
+        'gap_degrees' (max_n_spans - 1), 'gaps' (n_gaps) as well as the label frequencies \
+        'pos', 'categories' and 'deprels'
+    :rtype: dict
+    """
+    encoding = corpus if isinstance(corpus, dict) else encode_corpus(corpus)
+    spans = span_counts(encoding)
+    per_tree = tree_statistics(encoding, spans)
+    with_token = encoding['kinds'] != NO_TOKEN
+    statistics = {'trees': len(encoding['tree_offsets']) - 1,
+                  'nodes': int(with_token.sum()),
+                  'fanouts': histogram(spans[:len(with_token)][with_token]),
+                  'lengths': histogram(per_tree['length']),
+                  'gap_degrees': histogram(per_tree['max_n_spans'] - 1),
+                  'gaps': histogram(per_tree['n_gaps']),
+                  'pos': label_frequencies(encoding, *POS_LABEL),
+                  'categories': label_frequencies(encoding, *CATEGORY_LABEL),
+                  'deprels': label_frequencies(encoding, *DEPREL_LABEL)}
+    statistics.update(per_tree)
+    return statistics
+
+
+__all__ = ["corpus_statistics", "span_counts", "tree_statistics", "label_frequencies", "histogram"]
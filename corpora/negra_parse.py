@@ -10,6 +10,7 @@ import re
 import codecs
 import os
 from util.enumerator import Enumerator
+from corpora.offset_index import load_or_build_index
 
 # Used only by CL experiments
 # Location of Negra corpus.
@@ -47,7 +48,8 @@ def sentence_names_to_hybridtrees(names,
                                   disconnect_punctuation=True,
                                   add_vroot=False,
                                   mode="STANDARD",
-                                  secedge=False):
+                                  secedge=False,
+                                  index=False):
     """
     :param names:  list of sentence identifiers
     :type names: list[str]
@@ -63,32 +65,67 @@ def sentence_names_to_hybridtrees(names,
     :type mode: str
     :param secedge: add secondary edges
     :type secedge: bool
+    :param index: seek to the sentences using the sentence index, which is stored next to the corpus file
+    :type index: bool
     :return: list of constituent structures (HybridTrees or HybridDags) from file_name whose names are in names
     """
-    negra = codecs.open(expanduser(path), encoding=enc)
-    trees = []
+    return list(hybridtrees(path, names, enc=enc, disconnect_punctuation=disconnect_punctuation, add_vroot=add_vroot,
+                            mode=mode, secedge=secedge, index=index))
+
+
+def hybridtrees(path, names=None, enc="utf-8", disconnect_punctuation=True, add_vroot=False, mode="STANDARD",
+                secedge=False, index=False):
+    """
+    :param path: path to corpus
+    :type path: str
+    :param names: sentence identifiers, all sentences are read if None
+    :type names: list[str] | set[str]
+    :param index: seek to the sentences using the sentence index, which is stored next to the corpus file
+    :type index: bool
+    :return: constituent structures in the order of the file, cf. sentence_names_to_hybridtrees
+    :rtype: __generator[ConstituentTree | HybridDag]
+    Reading stops as soon as all sentences in names were found.
+    """
+    path = expanduser(path)
+    if names is not None:
+        names = set(names)
+    if index and names is not None:
+        offsets = sentence_index(path, persist=True)
+        mode = header_mode(path, enc, mode)
+        with open(path, 'rb') as negra:
+            for name, offset in sorted([(name, offsets[name]) for name in names if name in offsets],
+                                       key=lambda pair: pair[1]):
+                negra.seek(offset)
+                for tree in parse_sentences((line.decode(enc) for line in negra), {name},
+                                            disconnect_punctuation, add_vroot, mode, secedge):
+                    yield tree
+    else:
+        with codecs.open(path, encoding=enc) as negra:
+            for tree in parse_sentences(negra, names, disconnect_punctuation, add_vroot, mode, secedge):
+                yield tree
+
+
+def parse_sentences(lines, names=None, disconnect_punctuation=True, add_vroot=False, mode="STANDARD", secedge=False):
+    """
+    :param lines: lines in export format
+    :param names: sentence identifiers, all sentences are read if None
+    :type names: set[str]
+    :return: constituent structures, cf. sentence_names_to_hybridtrees
+    :rtype: __generator[ConstituentTree | HybridDag]
+    Each line is matched against at most one regular expression, which is selected by the prefix of the line.
+    Lines of sentences that are not in names are skipped without matching.
+    """
+    remaining = None if names is None else set(names)
+    if remaining is not None and not remaining:
+        return
     tree = None
     name = ''
     n_leaves = 0
-    for line in negra:
-        match_mode = DISCODOP_HEADER.match(line)
-        if match_mode:
-            mode = "DISCO-DOP"
-            continue
-        match_sent_start = BOS.search(line)
-        match_sent_end = EOS.match(line)
-        if mode == "STANDARD":
-            match_nont = \
-                STANDARD_NONTERMINAL.match(line)
-            match_term = \
-                STANDARD_TERMINAL.match(line)
-        elif mode == "DISCO-DOP":
-            match_nont = DISCODOP_NONTERMINAL.match(line)
-            match_term = DISCODOP_TERMINAL.match(line)
-        if match_sent_start:
-            this_name = match_sent_start.group(1)
-            if this_name in names:
-                name = this_name
+    for line in lines:
+        if line.startswith('#BOS'):
+            match_sent_start = BOS.match(line)
+            if match_sent_start and (remaining is None or match_sent_start.group(1) in remaining):
+                name = match_sent_start.group(1)
                 if secedge:
                     tree = HybridDag(name)
                 else:
@@ -97,23 +134,28 @@ def sentence_names_to_hybridtrees(names,
                 if add_vroot:
                     tree.set_label('0', 'VROOT')
                     tree.add_to_root('0')
-        elif match_sent_end:
-            this_name = match_sent_end.group(1)
-            if name == this_name:
+        elif line.startswith('#EOS'):
+            match_sent_end = EOS.match(line)
+            if tree is not None and match_sent_end and name == match_sent_end.group(1):
                 tree.reorder()
-                trees += [tree]
+                yield tree
                 tree = None
-        elif tree:
+                if remaining is not None:
+                    remaining.discard(name)
+                    if not remaining:
+                        return
+        elif tree is not None:
+            OFFSET = 0 if mode == "STANDARD" else 1
+            if line[:1] == '#' and line[1:2].isdigit():
+                match_nont = STANDARD_NONTERMINAL.match(line) if mode == "STANDARD" \
+                    else DISCODOP_NONTERMINAL.match(line)
+            else:
+                match_nont = None
             if match_nont:
                 id = match_nont.group(1)
-                if mode == "STANDARD":
-                    OFFSET = 0
-                else:
-                    OFFSET = 1
                 nont = match_nont.group(2 + OFFSET)
                 edge = match_nont.group(4 + OFFSET)
                 parent = match_nont.group(5 + OFFSET)
-                # print(match_nont.groups(), len(match_nont.groups()))
                 secedges = [] if not secedge or match_nont.group(6 + OFFSET) is None else \
                     match_nont.group(6 + OFFSET).split()
 
@@ -125,23 +167,18 @@ def sentence_names_to_hybridtrees(names,
                 else:
                     tree.add_child(parent, id)
                 if secedge and secedges:
-                    # print(secedges)
                     for sei in range(0, len(secedges) // 2, 2):
                         # sec_label = secedges[sei]
                         assert secedges[sei] == edge
                         sec_parent = secedges[sei + 1]
                         tree.add_sec_child(sec_parent, id)
-            elif match_term:
-                if mode == "STANDARD":
-                    OFFSET = 0
-                else:
-                    OFFSET = 1
-
+                continue
+            match_term = STANDARD_TERMINAL.match(line) if mode == "STANDARD" else DISCODOP_TERMINAL.match(line)
+            if match_term:
                 word = match_term.group(1)
                 pos = match_term.group(2 + OFFSET)
                 edge = match_term.group(4 + OFFSET)
                 parent = match_term.group(5 + OFFSET)
-                # print(match_term.groups(), len(match_term.groups()))
                 secedges = [] if not secedge or match_term.group(6 + OFFSET) is None else \
                     match_term.group(6 + OFFSET).split()
 
@@ -160,14 +197,62 @@ def sentence_names_to_hybridtrees(names,
 
                     tree.node_token(leaf_id).set_edge_label(edge)
                     if secedge and secedges:
-                        # print(secedges)
                         for sei in range(0, len(secedges) // 2, 2):
                             # sec_label = secedges[sei]
                             assert secedges[sei] == edge
                             sec_parent = secedges[sei + 1]
                             tree.add_sec_child(sec_parent, leaf_id)
-    negra.close()
-    return trees
+        elif line.startswith('%%') and DISCODOP_HEADER.match(line):
+            mode = "DISCO-DOP"
+
+
+def header_mode(path, enc="utf-8", mode="STANDARD"):
+    """
+    :param path: path to corpus
+    :type path: str
+    :param mode: mode if the file has no disco-dop header
+    :type mode: str
+    :return: 'DISCO-DOP' if there is a disco-dop header before the first sentence, and mode otherwise
+    :rtype: str
+    """
+    with codecs.open(path, encoding=enc) as negra:
+        for line in negra:
+            if line.startswith('#BOS'):
+                break
+            if DISCODOP_HEADER.match(line):
+                return "DISCO-DOP"
+    return mode
+
+
+def build_index(path):
+    """
+    :param path: path to corpus
+    :type path: str
+    :return: maps sentence name to byte offset of its #BOS line (in file order)
+    :rtype: dict
+    """
+    index = {}
+    offset = 0
+    with open(path, 'rb') as negra:
+        for line in negra:
+            if line.startswith(b'#BOS'):
+                fields = line.split()
+                if len(fields) > 1:
+                    index[fields[1].decode('ascii')] = offset
+            offset += len(line)
+    return index
+
+
+def sentence_index(path, persist=False):
+    """
+    :param path: path to corpus
+    :type path: str
+    :param persist: store the index next to the corpus file (cf. corpora.offset_index)
+    :type persist: bool
+    :return: maps sentence name to byte offset of its #BOS line
+    :rtype: dict
+    """
+    return load_or_build_index(expanduser(path), build_index, persist=persist)
 
 
 def topological_order(dag):
@@ -445,5 +530,5 @@ def serialize_hybrid_dag_to_negra(dsgs, counter, length, use_sentence_names=Fals
     return sentence_names
 
 
-__all__ = ["sentence_names_to_hybridtrees", "serialize_hybridtrees_to_negra", "hybridtree_to_sentence_name",
+__all__ = ["sentence_names_to_hybridtrees", "hybridtrees", "sentence_index", "serialize_hybridtrees_to_negra", "hybridtree_to_sentence_name",
            "serialize_acyclic_dogs_to_negra", "serialize_hybrid_dag_to_negra"]
@@ -0,0 +1,91 @@
+"""Persisted maps from sentence names to byte offsets in corpus files"""
+from __future__ import print_function
+import io
+import os
+
+# An index of corpus file path is stored in path + INDEX_SUFFIX.
+INDEX_SUFFIX = '.idx'
+
+
+def index_file_name(path):
+    """
+    :param path: path of corpus file
+    :type path: str
+    :return: default path of the index of the corpus file
+    :rtype: str
+    """
+    return path + INDEX_SUFFIX
+
+
+def _signature(path):
+    # An index is stale if size or modification time of the corpus file differ.
+    stat = os.stat(path)
+    return '%d\t%d' % (stat.st_size, int(stat.st_mtime))
+
+
+def save_index(index, path, index_file=None):
+    """
+    :param index: maps sentence name to byte offset (in document order)
+    :type index: dict
+    :param path: path of corpus file
+    :type path: str
+    :param index_file: path of index (default: path + INDEX_SUFFIX)
+    :type index_file: str
+    Writes index as text file: a header line identifying the corpus file, followed by a line
+    'name<TAB>offset' per sentence.
+    """
+    if index_file is None:
+        index_file = index_file_name(path)
+    tmp_file = index_file + '.part'
+    with io.open(tmp_file, 'w', encoding='utf-8') as out:
+        out.write(u'%s\n' % _signature(path))
+        for name, offset in index.items():
+            out.write(u'%s\t%d\n' % (name, offset))
+    os.rename(tmp_file, index_file)
+
+
+def load_index(path, index_file=None):
+    """
+    :param path: path of corpus file
+    :type path: str
+    :param index_file: path of index (default: path + INDEX_SUFFIX)
+    :type index_file: str
+    :return: maps sentence name to byte offset, or None if there is no up-to-date index
+    :rtype: dict
+    """
+    if index_file is None:
+        index_file = index_file_name(path)
+    if not os.path.exists(index_file):
+        return None
+    with io.open(index_file, encoding='utf-8') as index_in:
+        if index_in.readline().rstrip('\n') != _signature(path):
+            return None
+        index = {}
+        for line in index_in:
+            name, offset = line.rstrip('\n').rsplit('\t', 1)
+            index[name] = int(offset)
+        return index
+
+
+def load_or_build_index(path, build, persist=False, index_file=None):
+    """
+    :param path: path of corpus file
+    :type path: str
+    :param build: maps path of corpus file to index
+    :type build: function
+    :param persist: save the index if it had to be built
+    :type persist: bool
+    :param index_file: path of index (default: path + INDEX_SUFFIX)
+    :type index_file: str
+    :return: maps sentence name to byte offset
+    :rtype: dict
+    """
+    index = load_index(path, index_file)
+    if index is None:
+        index = build(path)
+        if persist:
+            save_index(index, path, index_file)
+    return index
+
+
+__all__ = ["load_index", "save_index", "load_or_build_index", "index_file_name"]
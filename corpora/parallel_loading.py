@@ -0,0 +1,192 @@
+"""Loading of corpora (export, TIGER-XML, CoNLL) with a pool of worker processes"""
+from __future__ import print_function
+# The corpus file is split into chunks of about chunk_size bytes whose
+# boundaries are moved to the beginning of the next sentence. Each worker
+# parses the byte range of a chunk. The trees of all chunks are returned in
+# the order of the file.
+
+import io
+import mmap
+import multiprocessing
+import re
+import sys
+from contextlib import closing
+from os.path import expanduser, getsize
+
+from corpora.conll_parse import parse_conll_lines
+from corpora.negra_parse import parse_sentences, header_mode
+from corpora.tiger_parse import SENTENCE_START, SENTENCE_END, sentence_to_hybridtree, cET, xml_encoding
+
+EXPORT = "EXPORT"
+TIGERXML = "TIGERXML"
+CONLL = "CONLL"
+
+DEFAULT_CHUNK_SIZE = 1 << 22
+
+EXPORT_SENTENCE_START = re.compile(br'^#BOS', re.MULTILINE)
+# a sentence starts after an empty line (or at the beginning of the file)
+CONLL_SENTENCE_START = re.compile(br'\n(?:[ \t\r]*\n)+')
+CONLL_FIRST_TOKEN = re.compile(br'^1\s', re.MULTILINE)
+
+
+def _sentence_start(data, position, corpus_type):
+    """
+    :return: offset of the first sentence that starts at or after position, or len(data)
+    :rtype: int
+    """
+    if corpus_type == EXPORT:
+        match = EXPORT_SENTENCE_START.search(data, position)
+        return match.start() if match else len(data)
+    elif corpus_type == TIGERXML:
+        match = SENTENCE_START.search(data, position)
+        return match.start() if match else len(data)
+    elif corpus_type == CONLL:
+        if position == 0:
+            return 0
+        match = CONLL_SENTENCE_START.search(data, position - 1)
+        return match.end() if match else len(data)
+    raise ValueError("Unsupported corpus type " + str(corpus_type))
+
+
+def chunks(path, corpus_type, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    :param path: path of corpus file
+    :type path: str
+    :param corpus_type: EXPORT, TIGERXML, or CONLL
+    :type corpus_type: str
+    :param chunk_size: approximate number of bytes per chunk
+    :type chunk_size: int
+    :return: list of byte ranges (begin, end, number of trees before begin) that start at sentence boundaries; \
+        the number of trees is only counted for CONLL (and 0 otherwise)
+    :rtype: list[tuple[int, int, int]]
+    """
+    size = getsize(path)
+    if size == 0:
+        return []
+    with open(path, 'rb') as corpus:
+        with closing(mmap.mmap(corpus.fileno(), 0, access=mmap.ACCESS_READ)) as data:
+            boundaries = [_sentence_start(data, 0, corpus_type)]
+            while boundaries[-1] < size:
+                boundaries.append(_sentence_start(data, boundaries[-1] + max(chunk_size, 1), corpus_type))
+            ranges = []
+            tree_count = 0
+            for begin, end in zip(boundaries, boundaries[1:]):
+                ranges.append((begin, end, tree_count))
+                if corpus_type == CONLL:
+                    tree_count += len(CONLL_FIRST_TOKEN.findall(data, begin, end))
+            return ranges
+
+
+def _read_range(path, begin, end):
+    with open(path, 'rb') as corpus:
+        corpus.seek(begin)
+        return corpus.read(end - begin)
+
+
+def parse_chunk(path, corpus_type, chunk, options):
+    """
+    :param path: path of corpus file
+    :type path: str
+    :param corpus_type: EXPORT, TIGERXML, or CONLL
+    :type corpus_type: str
+    :param chunk: byte range, cf. chunks
+    :type chunk: tuple[int, int, int]
+    :param options: keyword arguments of the reader, cf. load_corpus
+    :type options: dict
+    :return: trees in the byte range
+    :rtype: list
+    """
+    begin, end, tree_count = chunk
+    data = _read_range(path, begin, end)
+    if corpus_type == EXPORT:
+        lines = io.StringIO(data.decode(options.get('enc', 'utf-8')), newline=None)
+        return list(parse_sentences(lines, options.get('names'),
+                                    options.get('disconnect_punctuation', True), options.get('add_vroot', False),
+                                    options.get('mode', 'STANDARD'), options.get('secedge', False)))
+    elif corpus_type == TIGERXML:
+        names = options.get('names')
+        declaration = b'<?xml version="1.0" encoding="' + options['encoding'] + b'"?>'
+        trees = []
+        for match in SENTENCE_START.finditer(data):
+            name = match.group(1).decode(options['encoding'].decode('ascii'))
+            if names is not None and name not in names:
+                continue
+            sent_end = data.find(SENTENCE_END, match.start()) + len(SENTENCE_END)
+            sent = cET.fromstring(declaration + data[match.start():sent_end])
+            trees.append(sentence_to_hybridtree(sent, name, options.get('disconnect_punctuation', True)))
+        return trees
+    elif corpus_type == CONLL:
+        lines = io.StringIO(data.decode(options.get('enc', 'utf-8')), newline=None)
+        return list(parse_conll_lines(lines, options.get('ignore_punctuation', False),
+                                      options.get('limit', sys.maxsize), options.get('start', 0), tree_count))
+    raise ValueError("Unsupported corpus type " + str(corpus_type))
+
+
+# Path, corpus type and options of a worker process, cf. _init_worker.
+_worker_args = None
+
+
+def _init_worker(path, corpus_type, options):
+    global _worker_args
+    _worker_args = path, corpus_type, options
+
+
+def _parse_chunk(chunk):
+    path, corpus_type, options = _worker_args
+    return parse_chunk(path, corpus_type, chunk, options)
+
+
+def iter_corpus(path, corpus_type, n_workers=None, chunk_size=DEFAULT_CHUNK_SIZE, **options):
+    """
+    :param path: path of corpus file
+    :type path: str
+    :param corpus_type: EXPORT, TIGERXML, or CONLL
+    :type corpus_type: str
+    :param n_workers: number of worker processes (default: number of CPUs); 1 parses in this process
+    :type n_workers: int
+    :param chunk_size: approximate number of bytes that are parsed by a worker at once
+    :type chunk_size: int
+    :param options: for EXPORT: names, enc, disconnect_punctuation, add_vroot, mode, secedge \
+        (cf. negra_parse.hybridtrees); for TIGERXML: names, disconnect_punctuation (cf. tiger_parse.hybridtrees); \
+        for CONLL: ignore_punctuation, limit, start, enc (cf. conll_parse.parse_conll_corpus)
+    :return: trees in the order of the corpus file
+    :rtype: __generator
+    """
+    path = expanduser(path)
+    if options.get('names') is not None:
+        options['names'] = set(options['names'])
+    if corpus_type == EXPORT:
+        options['mode'] = header_mode(path, options.get('enc', 'utf-8'), options.get('mode', 'STANDARD'))
+    elif corpus_type == TIGERXML:
+        options['encoding'] = xml_encoding(path)
+    ranges = chunks(path, corpus_type, chunk_size)
+    if corpus_type == CONLL:
+        ranges = [chunk for chunk in ranges if chunk[2] < options.get('limit', sys.maxsize)]
+    if n_workers is None:
+        n_workers = multiprocessing.cpu_count()
+
+    if n_workers <= 1 or len(ranges) <= 1:
+        for chunk in ranges:
+            for tree in parse_chunk(path, corpus_type, chunk, options):
+                yield tree
+        return
+
+    pool = multiprocessing.get_context('fork').Pool(min(n_workers, len(ranges)), initializer=_init_worker,
+                                                    initargs=(path, corpus_type, options))
+    try:
+        for trees in pool.imap(_parse_chunk, ranges):
+            for tree in trees:
+                yield tree
+    finally:
+        pool.terminate()
+
+
+def load_corpus(path, corpus_type, n_workers=None, chunk_size=DEFAULT_CHUNK_SIZE, **options):
+    """
+    :return: list of trees in the order of the corpus file, cf. iter_corpus
+    :rtype: list
+    """
+    return list(iter_corpus(path, corpus_type, n_workers, chunk_size, **options))
+
+
+__all__ = ["load_corpus", "iter_corpus", "chunks", "EXPORT", "TIGERXML", "CONLL"]
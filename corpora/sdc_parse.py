@@ -2,34 +2,68 @@ from __future__ import print_function
 from graphs.dog import DirectedOrderedGraph, DeepSyntaxGraph
 from collections import defaultdict
 import re
-from itertools import chain
 
 
-def parse_file(path, start_id=None, last_id=None, max_n=None):
-    corpus = []
+SENTENCE_ID = re.compile(r'^#(\d+)$')
+
+
+def sentence_lines(lines, start_id=None, last_id=None, max_n=None):
+    """
+    :param lines: lines of a corpus in SDP format
+    :type lines: iterable[str]
+    :param start_id: id of the first sentence to be returned
+    :type start_id: int
+    :param last_id: id of the last sentence to be returned
+    :type last_id: int
+    :param max_n: maximum number of sentences
+    :type max_n: int
+    :return: pairs of sentence id and the token lines of the sentence
+    :rtype: __generator[tuple[int, list[str]]]
+    The token lines of sentences before start_id are not collected. Reading stops at the first sentence
+    after last_id or after max_n sentences.
+    """
+    if max_n is not None and max_n <= 0:
+        return
+    n = 0
+    sentence = []
+    sentence_id = 0
+    skip = start_id is not None and sentence_id < start_id
+    for line in lines:
+        if line.startswith('#'):
+            match = SENTENCE_ID.match(line)
+            if match:
+                sentence_id = int(match.group(1))
+                if last_id is not None and sentence_id > last_id:
+                    return
+                skip = start_id is not None and sentence_id < start_id
+                sentence = []
+        elif not line.strip():
+            if sentence:
+                yield sentence_id, sentence
+                n += 1
+                if max_n is not None and n >= max_n:
+                    return
+                sentence = []
+        elif not skip:
+            sentence.append(line)
+    if sentence:
+        yield sentence_id, sentence
+
+
+def iter_file(path, start_id=None, last_id=None, max_n=None):
+    """
+    :param path: path of corpus file in SDP format
+    :type path: str
+    :return: the deep syntax graphs of the selected sentences, cf. sentence_lines
+    :rtype: __generator[DeepSyntaxGraph]
+    """
     with open(path) as corpus_file:
-        sentence = []
-        sentence_id = 0
-        for line in corpus_file:
-            if max_n is not None and len(corpus) >= max_n\
-                    or last_id is not None and sentence_id > last_id:
-                break
-            if re.match(r'^\s*$', line) and (start_id is None or sentence_id >= start_id):
-                if sentence != []:
-                    entry = parse_sentence(sentence, sentence_id)
-                    if (start_id is None or entry.label >= start_id)\
-                       and (last_id is None or entry.label <= last_id):
-                        corpus.append(entry)
-                    sentence = []
-            elif line.startswith('#'):
-                if re.match(r'^#\d+$', line):
-                    sentence_id = int(line[1:])
-                    sentence = []
-            else:
-                sentence.append(line)
-        if sentence != []:
-            corpus.append(parse_sentence(sentence, int(sentence_id)))
-    return corpus
+        for sentence_id, lines in sentence_lines(corpus_file, start_id, last_id, max_n):
+            yield parse_sentence(lines, sentence_id)
+
+
+def parse_file(path, start_id=None, last_id=None, max_n=None):
+    return list(iter_file(path, start_id, last_id, max_n))
 
 
 def parse_sentence(lines, label=None):
@@ -48,10 +82,10 @@ def parse_sentence(lines, label=None):
         lemma = contents[2]
         pos = contents[3]
         frame = contents[6]
-        top = contents[4] is '+'
+        top = contents[4] == '+'
         if top:
             dog.add_to_outputs(idx)
-        pred = contents[5] is '+'
+        pred = contents[5] == '+'
         if pred:
             predicates[idx] = (form, lemma, pos, frame)
             predicate_list.append(idx)
@@ -61,7 +95,7 @@ def parse_sentence(lines, label=None):
         sentence.append((form, lemma, pos))
         synchronization.append([idx])
         for i, arg in enumerate(args):
-            if arg is not '_':
+            if arg != '_':
                 arguments[i].append((idx, arg))
 
     # print(predicates)
@@ -79,8 +113,25 @@ def parse_sentence(lines, label=None):
 def export_corpus(dsgs, path, header='#SDP 2015'):
     with open(path, 'w') as file:
         file.write(header + '\n')
-        lines = chain(*map(lambda x: export_sentence(x) + [''], dsgs))
-        file.writelines(map(lambda x: x + '\n', lines))
+        for dsg in dsgs:
+            write_sentence(dsg, file)
+
+
+def write_sentence(dsg, file):
+    """
+    :param dsg: deep syntax graph
+    :type dsg: DeepSyntaxGraph
+    :param file: file (or any object with a write method) to which the sentence is appended
+    """
+    file.write(sentence_string(dsg))
+
+
+def sentence_string(dsg):
+    """
+    :return: the sentence in SDP format, terminated by an empty line
+    :rtype: str
+    """
+    return '\n'.join(export_sentence(dsg)) + '\n\n'
 
 
 def export_sentence(dsg):
@@ -1,7 +1,9 @@
 """Parsing of the Tiger corpus and capture of hybrid trees or deep syntax graphs"""
 from __future__ import print_function
 import re
-from os.path import expanduser, join
+import mmap
+from contextlib import closing
+from os.path import expanduser, join, getsize
 
 try:
     import xml.etree.cElementTree as cET
@@ -12,6 +14,7 @@ from hybridtree.constituent_tree import ConstituentTree
 from graphs.dog import DirectedOrderedGraph, DeepSyntaxGraph
 from util.enumerator import Enumerator
 from hybridtree.monadic_tokens import ConstituentTerminal
+from corpora.offset_index import load_or_build_index
 
 # Location of Tiger corpus.
 TIGER_DIR = 'res/tiger'
@@ -23,25 +26,17 @@ TIGER_DIR = 'res/tiger'
 TIGER = join(TIGER_DIR, '/tiger_release_aug07.corrected.16012013.xml')
 TIGER_TEST = join(TIGER_DIR, '/tiger_8000.xml')
 
+# Maps path of XML file to sentence index (cf. sentence_index). Cached for efficiency.
+indices = {}
 
-# To hold parsed XML file. Cached for efficiency.
-xml_file = None
+# Start tag of a sentence, the id is captured.
+SENTENCE_START = re.compile(br'<s\s[^>]*?\bid\s*=\s*["\']([^"\']*)["\']')
+SENTENCE_END = b'</s>'
+XML_ENCODING = re.compile(br'^<\?xml[^>]*\bencoding\s*=\s*["\']([^"\']*)["\']')
 
 
 def clear():
-    global xml_file
-    xml_file = None
-
-
-def initialize(path):
-    """
-    :type path: str
-    Determine XML file holding data, given file name.
-    file_name: string
-    """
-    global xml_file
-    if xml_file is None:
-        xml_file = cET.parse(path)
+    indices.clear()
 
 
 def num_to_name(num):
@@ -53,24 +48,160 @@ def num_to_name(num):
     return 's' + str(num)
 
 
-def sentence_names_to_hybridtrees(names, path, hold=True, disconnect_punctuation=True):
+def iter_sentences(path):
+    """
+    :param path: path of corpus file
+    :type path: str
+    :return: the s elements of the corpus in document order
+    :rtype: __generator[cET.Element]
+    The file is parsed incrementally. Each element is cleared and detached once the next one is requested,
+    such that the document is never held in memory as a whole.
+    """
+    body = None
+    for event, elem in cET.iterparse(expanduser(path), events=('start', 'end')):
+        if event == 'start':
+            if elem.tag == 'body':
+                body = elem
+        elif elem.tag == 's':
+            yield elem
+            elem.clear()
+            if body is not None:
+                body.remove(elem)
+
+
+def xml_encoding(path):
+    with open(path, 'rb') as corpus:
+        match = XML_ENCODING.match(corpus.read(256))
+    return match.group(1) if match else b'utf-8'
+
+
+def build_index(path):
+    """
+    :param path: path of corpus file
+    :type path: str
+    :return: maps sentence name to byte offset of its s element (in document order)
+    :rtype: dict
+    Scans the raw bytes of the file for sentence start tags (without parsing XML).
+    """
+    index = {}
+    if getsize(path) == 0:
+        return index
+    encoding = xml_encoding(path).decode('ascii')
+    with open(path, 'rb') as corpus:
+        with closing(mmap.mmap(corpus.fileno(), 0, access=mmap.ACCESS_READ)) as data:
+            for match in SENTENCE_START.finditer(data):
+                index[match.group(1).decode(encoding)] = match.start()
+    return index
+
+
+def sentence_index(path, persist=False):
+    """
+    :param path: path of corpus file
+    :type path: str
+    :param persist: store the index next to the corpus file (cf. corpora.offset_index)
+    :type persist: bool
+    :return: maps sentence name to byte offset of its s element
+    :rtype: dict
+    """
+    path = expanduser(path)
+    if path not in indices:
+        indices[path] = load_or_build_index(path, build_index, persist=persist)
+    return indices[path]
+
+
+def read_sentence(corpus, offset, encoding=b'utf-8'):
+    """
+    :param corpus: corpus file opened in binary mode
+    :param offset: byte offset of s element, cf. sentence_index
+    :type offset: int
+    :param encoding: encoding of the corpus file
+    :type encoding: bytes
+    :return: the s element at offset
+    :rtype: cET.Element
+    """
+    corpus.seek(offset)
+    data = b''
+    while True:
+        chunk = corpus.read(1 << 16)
+        if not chunk:
+            break
+        data += chunk
+        end = data.find(SENTENCE_END)
+        if end >= 0:
+            data = data[:end + len(SENTENCE_END)]
+            break
+    return cET.fromstring(b'<?xml version="1.0" encoding="' + encoding + b'"?>' + data)
+
+
+def _sentences_by_name(names, path, persist_index):
+    """
+    :return: pairs of name and s element (or None if not present) for each name
+    :rtype: __generator[tuple[str, cET.Element]]
+    """
+    path = expanduser(path)
+    index = sentence_index(path, persist_index)
+    encoding = xml_encoding(path)
+    with open(path, 'rb') as corpus:
+        for name in names:
+            offset = index.get(name)
+            yield name, None if offset is None else read_sentence(corpus, offset, encoding)
+
+
+def hybridtrees(path, disconnect_punctuation=True, names=None):
+    """
+    :param path: path of corpus file
+    :type path: str
+    :param disconnect_punctuation: separate treatment of punctuation
+    :type disconnect_punctuation: bool
+    :param names: if not None, only trees with these names are read
+    :type names: list[str]
+    :return: trees of the corpus in document order
+    :rtype: __generator[ConstituentTree]
+    """
+    if names is not None:
+        names = set(names)
+    for sent in iter_sentences(path):
+        name = sent.get('id')
+        if names is None or name in names:
+            yield sentence_to_hybridtree(sent, name, disconnect_punctuation)
+
+
+def deep_syntax_graphs(path, reorder_children=False, ignore_punctuation=True, names=None):
+    """
+    :param path: path of corpus file
+    :type path: str
+    :param names: if not None, only graphs of sentences with these names are read
+    :type names: list[str]
+    :return: deep syntax graphs of the corpus in document order, cf. sentence_name_to_deep_syntax_graph
+    :rtype: __generator[DeepSyntaxGraph]
+    """
+    if names is not None:
+        names = set(names)
+    for sent in iter_sentences(path):
+        name = sent.get('id')
+        if names is None or name in names:
+            yield sentence_to_deep_syntax_graph(sent, name, reorder_children, ignore_punctuation)
+
+
+def sentence_names_to_hybridtrees(names, path, hold=True, disconnect_punctuation=True, persist_index=False):
     """
     :param names: list of names
     :type names: list[str]
     :param path: path of corpus file
     :type path: str
-    :param hold: keep xml file opened
+    :param hold: keep sentence index of xml file
     :type hold: bool
     :param disconnect_punctuation: separate treatment of punctuation
     :type disconnect_punctuation: bool
+    :param persist_index: store the sentence index next to the corpus file
+    :type persist_index: bool
     :return: trees from xml corpus with name in names.
     :rtype: list[ConstituentTree]
     """
     trees = []
-    for name in names:
-        tree = sentence_name_to_hybridtree(name, path, disconnect_punctuation)
-        if tree is not None:
-            trees += [tree]
+    for name, sent in _sentences_by_name(names, path, persist_index):
+        if sent is not None:
+            trees += [sentence_to_hybridtree(sent, name, disconnect_punctuation)]
         else:
             print('missing', name)
 
@@ -90,57 +221,69 @@ def sentence_name_to_hybridtree(name, path, disconnect_punctuation=True):
     :rtype: ConstituentTree
     Searches for tree with name in corpus file and returns it or none if not present
     """
-    initialize(expanduser(path))
-    sent = xml_file.find('.//body/s[@id="%s"]' % name)
+    [(_, sent)] = _sentences_by_name([name], path, False)
     if sent is not None:
-        tree = ConstituentTree(name)
-        graph = sent.find('graph')
-        root = graph.get('root')
-        tree.add_to_root(root)
-        for term in graph.iterfind('terminals/t'):
-            ident = term.get('id')
-            word = term.get('word')
-            lemma = term.get('lemma')
-            pos = term.get('pos')
-            case = term.get('case')
-            number = term.get('number')
-            gender = term.get('gender')
-            person = term.get('person')
-            degree = term.get('degree')
-            tense = term.get('tense')
-            mood = term.get('mood')
-            morph_feats = [("case", case), ("number", number), ("gender", gender), ("person", person), ("tense", tense),
-                           ("degree", degree), ("mood", mood)]
-            if is_word(pos, word) or not disconnect_punctuation:
-                tree.add_leaf(ident, pos, word, morph=morph_feats, lemma=lemma)
-            else:
-                tree.add_punct(ident, pos, word)
-        for nont in graph.iterfind('nonterminals/nt'):
-            ident = nont.get('id')
-            cat = nont.get('cat')
-            tree.set_label(ident, cat)
-            for child in nont.iterfind('edge'):
-                child_id = child.get('idref')
-                if not is_punctuation(graph, child_id) or not disconnect_punctuation:
-                    tree.add_child(ident, child_id)
-        for nont in graph.iterfind('nonterminals/nt'):
-            for child in nont.iterfind('edge'):
-                child_id = child.get('idref')
-                edge_label = child.get('label')
-                if (not is_punctuation(graph, child_id) or not disconnect_punctuation) and edge_label is not None:
-                    tree.node_token(child_id).set_edge_label(edge_label)
-        tree.reorder()
-        return tree
+        return sentence_to_hybridtree(sent, name, disconnect_punctuation)
     else:
         return None
 
 
-def sentence_names_to_deep_syntax_graphs(names, file_name, hold=True, reorder_children=False, ignore_puntcuation=True):
+def sentence_to_hybridtree(sent, name, disconnect_punctuation=True):
+    """
+    :param sent: s element of tigerxml
+    :type sent: cET.Element
+    :param name: tree name
+    :type name: str
+    :type disconnect_punctuation: bool
+    :rtype: ConstituentTree
+    """
+    tree = ConstituentTree(name)
+    graph = sent.find('graph')
+    punctuation = punctuation_ids(graph)
+    root = graph.get('root')
+    tree.add_to_root(root)
+    for term in graph.iterfind('terminals/t'):
+        ident = term.get('id')
+        word = term.get('word')
+        lemma = term.get('lemma')
+        pos = term.get('pos')
+        case = term.get('case')
+        number = term.get('number')
+        gender = term.get('gender')
+        person = term.get('person')
+        degree = term.get('degree')
+        tense = term.get('tense')
+        mood = term.get('mood')
+        morph_feats = [("case", case), ("number", number), ("gender", gender), ("person", person), ("tense", tense),
+                       ("degree", degree), ("mood", mood)]
+        if is_word(pos, word) or not disconnect_punctuation:
+            tree.add_leaf(ident, pos, word, morph=morph_feats, lemma=lemma)
+        else:
+            tree.add_punct(ident, pos, word)
+    for nont in graph.iterfind('nonterminals/nt'):
+        ident = nont.get('id')
+        cat = nont.get('cat')
+        tree.set_label(ident, cat)
+        for child in nont.iterfind('edge'):
+            child_id = child.get('idref')
+            if child_id not in punctuation or not disconnect_punctuation:
+                tree.add_child(ident, child_id)
+    for nont in graph.iterfind('nonterminals/nt'):
+        for child in nont.iterfind('edge'):
+            child_id = child.get('idref')
+            edge_label = child.get('label')
+            if (child_id not in punctuation or not disconnect_punctuation) and edge_label is not None:
+                tree.node_token(child_id).set_edge_label(edge_label)
+    tree.reorder()
+    return tree
+
+
+def sentence_names_to_deep_syntax_graphs(names, file_name, hold=True, reorder_children=False, ignore_puntcuation=True,
+                                         persist_index=False):
         dsgs = []
-        for name in names:
-            dsg = sentence_name_to_deep_syntax_graph(name, file_name, reorder_children, ignore_puntcuation)
-            if dsg is not None:
-                dsgs += [dsg]
+        for name, sent in _sentences_by_name(names, file_name, persist_index):
+            if sent is not None:
+                dsgs += [sentence_to_deep_syntax_graph(sent, name, reorder_children, ignore_puntcuation)]
             else:
                 print('missing', name)
         if not hold:
@@ -161,112 +304,125 @@ def sentence_name_to_deep_syntax_graph(name, path, reorder_children=False, ignor
     :rtype: DeepSyntaxGraph
     Searches for graph with name in corpus file and returns it or none if not present
     """
-    initialize(expanduser(path))
-    sent = xml_file.find('.//body/s[@id="%s"]' % name)
+    [(_, sent)] = _sentences_by_name([name], path, False)
     if sent is not None:
-        dog = DirectedOrderedGraph()
-        sync = []
-        sentence = []
-
-        deep_syntax_graph = DeepSyntaxGraph(sentence, dog, sync, label=name)
-
-        node_enum = Enumerator()
-
-        inner_nodes = {}
-        terminal_labels = {}
-        indices = set()
-
-        graph = sent.find('graph')
-
-        for term in graph.iterfind('terminals/t'):
-            ident = term.get('id')
-            word = term.get('word')
-            pos = term.get('pos')
-            case = term.get('case')
-            number = term.get('number')
-            gender = term.get('gender')
-            person = term.get('person')
-            degree = term.get('degree')
-            tense = term.get('tense')
-            mood = term.get('mood')
-            morph_feats = [("case", case), ("number", number), ("gender", gender), ("person", person),
-                           ("tense", tense),
-                           ("degree", degree), ("mood", mood)]
-            if not ignore_punctuation or is_word(pos, word):
-                output_idx = node_enum.object_index(ident)
-                dog.add_node(output_idx)
-                indices.add(output_idx)
-                terminal = ConstituentTerminal(word,  # .encode('utf_8'),
-                                               pos, morph=morph_feats)
-                terminal_labels[output_idx] = ConstituentTerminal(word, pos, morph=morph_feats)
-                # dog.add_terminal_edge([], ConstituentTerminal(word, pos, morph=morph_feats), output_idx)
-                sentence.append(terminal)
-                sync.append([output_idx])
-                # tree.add_leaf(id, pos, word.encode('utf_8'), morph=morph_feats)
-                for parent in term.iterfind('secedge'):
-                    parent_id = parent.get('idref')
-                    edge_label = parent.get('label')
-                    parent_idx = node_enum.object_index(parent_id)
-                    if parent_idx not in inner_nodes:
-                        inner_nodes[parent_idx] = ('_', [(output_idx, 's', edge_label)])
-                    else:
-                        inner_nodes[parent_idx][1].append((output_idx, 's', edge_label))
-            else:
-                # todo: handle punctuation
-                pass
-
-        for nont in graph.iterfind('nonterminals/nt'):
-            ident = nont.get('id')
-            cat = nont.get('cat')
-            idx = node_enum.object_index(ident)
-            indices.add(idx)
-            dog.add_node(idx)
-
-            if idx not in inner_nodes:
-                inner_nodes[idx] = (cat, [])
-            else:
-                inner_nodes[idx] = (cat, inner_nodes[idx][1])
+        return sentence_to_deep_syntax_graph(sent, name, reorder_children, ignore_punctuation)
+    else:
+        return None
+
+
+def sentence_to_deep_syntax_graph(sent, name, reorder_children=False, ignore_punctuation=True):
+    """
+    :param sent: s element of tigerxml
+    :type sent: cET.Element
+    :param name: sentence identifier
+    :type name: str
+    :type reorder_children: bool
+    :type ignore_punctuation: bool
+    :rtype: DeepSyntaxGraph
+    """
+    dog = DirectedOrderedGraph()
+    sync = []
+    sentence = []
+
+    deep_syntax_graph = DeepSyntaxGraph(sentence, dog, sync, label=name)
+
+    node_enum = Enumerator()
 
-            for child in nont.iterfind('edge'):
-                child_id = child.get('idref')
-                child_idx = node_enum.object_index(child_id)
-                edge_label = child.get('label')
-                if not ignore_punctuation or not is_punctuation(graph, child_id):
-                    inner_nodes[idx][1].append((child_idx, 'p', edge_label))
+    inner_nodes = {}
+    terminal_labels = {}
+    indices = set()
 
-            for parent in nont.iterfind('secedge'):
+    graph = sent.find('graph')
+    punctuation = punctuation_ids(graph)
+
+    for term in graph.iterfind('terminals/t'):
+        ident = term.get('id')
+        word = term.get('word')
+        pos = term.get('pos')
+        case = term.get('case')
+        number = term.get('number')
+        gender = term.get('gender')
+        person = term.get('person')
+        degree = term.get('degree')
+        tense = term.get('tense')
+        mood = term.get('mood')
+        morph_feats = [("case", case), ("number", number), ("gender", gender), ("person", person),
+                       ("tense", tense),
+                       ("degree", degree), ("mood", mood)]
+        if not ignore_punctuation or is_word(pos, word):
+            output_idx = node_enum.object_index(ident)
+            dog.add_node(output_idx)
+            indices.add(output_idx)
+            terminal = ConstituentTerminal(word,  # .encode('utf_8'),
+                                           pos, morph=morph_feats)
+            terminal_labels[output_idx] = ConstituentTerminal(word, pos, morph=morph_feats)
+            # dog.add_terminal_edge([], ConstituentTerminal(word, pos, morph=morph_feats), output_idx)
+            sentence.append(terminal)
+            sync.append([output_idx])
+            # tree.add_leaf(id, pos, word.encode('utf_8'), morph=morph_feats)
+            for parent in term.iterfind('secedge'):
                 parent_id = parent.get('idref')
                 edge_label = parent.get('label')
                 parent_idx = node_enum.object_index(parent_id)
                 if parent_idx not in inner_nodes:
-                    inner_nodes[parent_idx] = ('_', [(idx, 's', edge_label)])
+                    inner_nodes[parent_idx] = ('_', [(output_idx, 's', edge_label)])
                 else:
-                    inner_nodes[parent_idx][1].append((idx, 's', edge_label))
-
-        for idx in indices:
-            if idx not in inner_nodes:
-                inputs = []
+                    inner_nodes[parent_idx][1].append((output_idx, 's', edge_label))
+        else:
+            # todo: handle punctuation
+            pass
+
+    for nont in graph.iterfind('nonterminals/nt'):
+        ident = nont.get('id')
+        cat = nont.get('cat')
+        idx = node_enum.object_index(ident)
+        indices.add(idx)
+        dog.add_node(idx)
+
+        if idx not in inner_nodes:
+            inner_nodes[idx] = (cat, [])
+        else:
+            inner_nodes[idx] = (cat, inner_nodes[idx][1])
+
+        for child in nont.iterfind('edge'):
+            child_id = child.get('idref')
+            child_idx = node_enum.object_index(child_id)
+            edge_label = child.get('label')
+            if not ignore_punctuation or child_id not in punctuation:
+                inner_nodes[idx][1].append((child_idx, 'p', edge_label))
+
+        for parent in nont.iterfind('secedge'):
+            parent_id = parent.get('idref')
+            edge_label = parent.get('label')
+            parent_idx = node_enum.object_index(parent_id)
+            if parent_idx not in inner_nodes:
+                inner_nodes[parent_idx] = ('_', [(idx, 's', edge_label)])
             else:
-                if reorder_children:
-                    inputs = sorted(inner_nodes[idx][1], key=lambda x: (x[2], inner_nodes[idx][1].index(x)))
-                else:
-                    inputs = inner_nodes[idx][1]
-            if idx in terminal_labels:
-                label = terminal_labels[idx]
+                inner_nodes[parent_idx][1].append((idx, 's', edge_label))
+
+    for idx in indices:
+        if idx not in inner_nodes:
+            inputs = []
+        else:
+            if reorder_children:
+                inputs = sorted(inner_nodes[idx][1], key=lambda x: (x[2], inner_nodes[idx][1].index(x)))
             else:
-                label = inner_nodes[idx][0]
+                inputs = inner_nodes[idx][1]
+        if idx in terminal_labels:
+            label = terminal_labels[idx]
+        else:
+            label = inner_nodes[idx][0]
 
-            edge = dog.add_terminal_edge(inputs, label, idx)
-            for i, tentacle in enumerate(inputs):
-                edge.set_function(i, inputs[i][2])
+        edge = dog.add_terminal_edge(inputs, label, idx)
+        for i, tentacle in enumerate(inputs):
+            edge.set_function(i, inputs[i][2])
 
-        root = graph.get('root')
-        root_idx = node_enum.object_index(root)
-        dog.add_to_outputs(root_idx)
+    root = graph.get('root')
+    root_idx = node_enum.object_index(root)
+    dog.add_to_outputs(root_idx)
 
-        return deep_syntax_graph
-    else:
-        return None
+    return deep_syntax_graph
 
 
 def is_word(pos, word):
@@ -282,20 +438,14 @@ def is_word(pos, word):
                 (re.search(r'^XY$', pos) and re.search(r'^[a-z]$', word)))
 
 
-def is_punctuation(graph, identifier):
+def punctuation_ids(graph):
     """
-    :param identifier: id in tigerxml graph
-    :type identifier: str
-    :return: In graph, is element specified by id punctuation?
-    :rtype: bool
+    :param graph: graph element of tigerxml
+    :return: ids of the terminals in graph that are punctuation
+    :rtype: set[str]
     """
-    term = graph.find('terminals/t[@id="%s"]' % identifier)
-    if term is not None:
-        word = term.get('word')
-        pos = term.get('pos')
-        return not is_word(pos, word)
-    else:
-        return False
+    return {term.get('id') for term in graph.iterfind('terminals/t') if not is_word(term.get('pos'), term.get('word'))}
 
 
-__all__ = ["sentence_names_to_hybridtrees", "sentence_names_to_deep_syntax_graphs"]
+__all__ = ["sentence_names_to_hybridtrees", "sentence_names_to_deep_syntax_graphs", "hybridtrees", "deep_syntax_graphs",
+           "sentence_index"]
@@ -1,6 +1,7 @@
 __author__ = 'kilian'
 
 import re
+from functools import partial
 from random import seed
 
 from grammar.induction.decomposition import join_spans, fanout_limited_partitioning, left_branching_partitioning, \
@@ -9,13 +10,15 @@ from grammar.induction.decomposition import join_spans, fanout_limited_partition
 from dependency.labeling import AbstractLabeling
 from grammar.dcp import DCP_rule, DCP_term, DCP_var, DCP_index
 from grammar.lcfrs import LCFRS, LCFRS_lhs, LCFRS_var
+from grammar.induction.parallel_induction import induce_in_parallel, DEFAULT_SHARD_SIZE
 from dependency.top_bottom_max import top_max, bottom_max
 
 
 ###################   Top level methods for grammar induction.   ###################
 
 
-def induce_grammar(trees, nont_labelling, term_labelling, recursive_partitioning, start_nont='START'):
+def induce_grammar(trees, nont_labelling, term_labelling, recursive_partitioning, start_nont='START', n_workers=1,
+                   shard_size=DEFAULT_SHARD_SIZE, count_table=None):
     """
     :rtype: LCFRS
     :param trees: corpus of HybridTree (i.e. list (or Generator for lazy IO))
@@ -24,35 +27,71 @@ def induce_grammar(trees, nont_labelling, term_labelling, recursive_partitioning
     :param term_labelling: HybridTree, NodeId -> str
     :param recursive_partitioning: HybridTree -> RecursivePartitioning
     :type start_nont: str
+    :param n_workers: number of processes among which the corpus is sharded (None: number of CPUs)
+    :type n_workers: int
+    :param shard_size: number of trees per shard
+    :type shard_size: int
+    :param count_table: spill rule frequencies of each shard to this table (cf. induce_in_parallel)
+    :type count_table: RuleCountTable
     :rtype: int, LCFRS
 
     Top level method to induce an LCFRS/DCP-hybrid grammar for dependency parsing.
+    Parallel induction yields the same grammar as sequential induction. It is not applied to the 'no_new_nont'
+    partitionings (which depend on the grammar induced so far) and the random partitionings, neither is the
+    count table.
+    """
+    sequential = any([re.search(r'no_new_nont|random', rec_par.__name__) for rec_par in recursive_partitioning])
+    if not sequential and (n_workers is None or n_workers > 1 or count_table is not None):
+        induce = partial(induce_tree_grammar, nont_labelling=nont_labelling, term_labelling=term_labelling,
+                         recursive_partitioning=recursive_partitioning, start_nont=start_nont)
+        n_trees, grammar, _ = induce_in_parallel(trees, induce, start_nont, n_workers, shard_size,
+                                                 count_table=count_table)
+    else:
+        grammar = LCFRS(start_nont)
+        n_trees = 0
+        for tree in trees:
+            n_trees += 1
+            add_tree_to_grammar(tree, grammar, nont_labelling, term_labelling, recursive_partitioning, start_nont)
+
+    grammar.make_proper()
+    return n_trees, grammar
+
+
+def induce_tree_grammar(tree, nont_labelling, term_labelling, recursive_partitioning, start_nont='START'):
+    """
+    :type tree: HybridTree
+    :rtype: LCFRS
+    :return: grammar of a single tree with rule frequencies as weights (cf. induce_grammar)
     """
     grammar = LCFRS(start_nont)
-    n_trees = 0
-    for tree in trees:
-        n_trees += 1
-        for rec_par in recursive_partitioning:
-            match = re.search(r'no_new_nont', rec_par.__name__)
-            if match:
-                rec_par_int = rec_par(tree, grammar.nonts(), nont_labelling)
-            else:
-                rec_par_int = rec_par(tree)
+    add_tree_to_grammar(tree, grammar, nont_labelling, term_labelling, recursive_partitioning, start_nont)
+    return grammar
 
-            rec_par_nodes = tree.node_id_rec_par(rec_par_int)
 
-            (_, _, nont_name) = add_rules_to_grammar_rec(tree, rec_par_nodes, grammar, nont_labelling, term_labelling)
+def add_tree_to_grammar(tree, grammar, nont_labelling, term_labelling, recursive_partitioning, start_nont='START'):
+    """
+    :type tree: HybridTree
+    :type grammar: LCFRS
+    Adds the rules for one tree and each recursive partitioning to grammar (cf. induce_grammar).
+    """
+    for rec_par in recursive_partitioning:
+        match = re.search(r'no_new_nont', rec_par.__name__)
+        if match:
+            rec_par_int = rec_par(tree, grammar.nonts(), nont_labelling)
+        else:
+            rec_par_int = rec_par(tree)
+
+        rec_par_nodes = tree.node_id_rec_par(rec_par_int)
 
-            # Add rule from top start symbol to top most nonterminal for the hybrid tree
-            lhs = LCFRS_lhs(start_nont)
-            lhs.add_arg([LCFRS_var(0, 0)])
-            rhs = [nont_name]
-            dcp_rule = DCP_rule(DCP_var(-1, 0), [DCP_var(0, 0)])
+        (_, _, nont_name) = add_rules_to_grammar_rec(tree, rec_par_nodes, grammar, nont_labelling, term_labelling)
 
-            grammar.add_rule(lhs, rhs, 1.0, [dcp_rule])
+        # Add rule from top start symbol to top most nonterminal for the hybrid tree
+        lhs = LCFRS_lhs(start_nont)
+        lhs.add_arg([LCFRS_var(0, 0)])
+        rhs = [nont_name]
+        dcp_rule = DCP_rule(DCP_var(-1, 0), [DCP_var(0, 0)])
 
-    grammar.make_proper()
-    return n_trees, grammar
+        grammar.add_rule(lhs, rhs, 1.0, [dcp_rule])
 
 
 # Recursive partitioning strategies
@@ -18,7 +18,7 @@ def compute_minimum_risk_tree(trees, probabilities):
                 assert id in tree.root
                 head = 0
             else:
-                head = tree.id_yield().index(parent_id) + 1
+                head = tree.node_index(parent_id) + 1
             heads[position + 1][head, tree.node_token(id).deprel()] += probability
 
     cleaned_tokens = copy.deepcopy(trees[0].token_yield())
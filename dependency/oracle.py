@@ -17,7 +17,7 @@ def compute_oracle_tree(trees, gold_tree):
             assert id in gold_tree.root
             gold_heads[position] = 0
         else:
-            gold_heads[position] = gold_tree.id_yield().index(parent_id) + 1
+            gold_heads[position] = gold_tree.node_index(parent_id) + 1
 
     best_hypothesis = None
     correct_labeled_attachments = -1
@@ -32,7 +32,7 @@ def compute_oracle_tree(trees, gold_tree):
                 assert id in tree.root
                 head = 0
             else:
-                head = tree.id_yield().index(parent_id) + 1
+                head = tree.node_index(parent_id) + 1
             label = tree.node_token(id).deprel()
 
             if gold_heads[position] == head:
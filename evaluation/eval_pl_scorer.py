@@ -49,6 +49,7 @@ def eval_pl_scores(connection, corpus, experiment, filter=None, filter_descr = "
             pass
 
     CoNLL_strings = []
+    results = experiment_database.query_result_trees(connection, experiment, corpus)
 
     for tree in trees:
         tree_name = tree.sent_label()
@@ -56,7 +57,7 @@ def eval_pl_scores(connection, corpus, experiment, filter=None, filter_descr = "
         if not tree_id:
             tree_id = experiment_database.add_tree(connection, tree, corpus)
         if not filter or tree_id in filter:
-            CoNLL_strings.append(CoNLL_string_for_tree(connection, tree_id, experiment))
+            CoNLL_strings.append(CoNLL_string_for_tree(connection, tree_id, experiment, results))
             if filter:
                 gold_CoNLL_strings.append(corpora.conll_parse.tree_to_conll_str(tree))
 
@@ -105,16 +106,21 @@ def hypothesis_test_path(prefix, corpus, experiment, filter_descr):
     return '{:s}-{:s}-{:d}-{:s}.conll'.format(prefix, corpus.split('/')[-1], experiment, filter_descr)
 
 
-def CoNLL_string_for_tree(connection, tree_id_in_db, experiment):
+def CoNLL_string_for_tree(connection, tree_id_in_db, experiment, results=None):
     """
     :param connection: database connection
+    :param results: results of the experiment, cf. experiment_database.query_result_trees
+    :type results: dict
     :return: (multiline) string with system output for tree in CoNLL format
     Retrieves the system output for a test tree in some experiment in the database.
     If none exists, a fallback strategy is used (hidden in the database module).
     """
     assert tree_id_in_db
 
-    flag, hypothesis_tree = experiment_database.query_result_tree(connection, experiment, tree_id_in_db)
+    if results is not None and tree_id_in_db in results:
+        flag, hypothesis_tree = results[tree_id_in_db]
+    else:
+        flag, hypothesis_tree = experiment_database.query_result_tree(connection, experiment, tree_id_in_db)
 
     # if hypothesis_tree.sent_label() == 'tree1':
     #      print hypothesis_tree
@@ -4,17 +4,69 @@ import sqlite3
 import re
 import time
 import sys
+from collections import defaultdict
 
 from hybridtree.general_hybrid_tree import HybridTree
 from hybridtree.monadic_tokens import CoNLLToken
 from grammar.lcfrs import LCFRS
 from corpora import conll_parse
+from corpora.corpus_statistics import histogram
 
 dbfile = 'examples/example.db'
 test_file = 'examples/Dependency_Corpus.conll'
 test_file_modified = 'examples/Dependency_Corpus_modified.conll'
 sampledb = '/home/kilian/sampledb.db'
 
+# number of trees (or parse results) that are inserted in one transaction
+DEFAULT_BATCH_SIZE = 200
+
+
+class ExperimentConnection(sqlite3.Connection):
+    """
+    Connection to an experiment database (cf. openDatabase).
+    Trees and parse results are committed in batches of batch_size, the remaining ones on commit or close.
+    Tree ids are cached per corpus.
+    """
+    def __init__(self, *args, **kwargs):
+        super(ExperimentConnection, self).__init__(*args, **kwargs)
+        self.batch_size = DEFAULT_BATCH_SIZE
+        self.uncommitted_trees = 0
+        # maps corpus to a dict that maps tree names to tree ids
+        self.tree_ids = {}
+
+    def tree_added(self):
+        self.uncommitted_trees += 1
+        if self.uncommitted_trees >= self.batch_size:
+            self.commit()
+
+    def commit(self):
+        super(ExperimentConnection, self).commit()
+        self.uncommitted_trees = 0
+
+    def close(self):
+        self.commit()
+        super(ExperimentConnection, self).close()
+
+
+def _tree_added(connection):
+    if isinstance(connection, ExperimentConnection):
+        connection.tree_added()
+    else:
+        connection.commit()
+
+
+def _cached_tree_ids(connection, corpus):
+    """
+    :return: cached tree ids of corpus (loaded at first access), or None if connection does not cache
+    :rtype: dict
+    """
+    if not isinstance(connection, ExperimentConnection):
+        return None
+    if corpus not in connection.tree_ids:
+        connection.tree_ids[corpus] = dict(
+            connection.cursor().execute('''SELECT name, t_id FROM trees WHERE corpus = ?''', (corpus,)))
+    return connection.tree_ids[corpus]
+
 
 def create_experiment_table(connection):
     # Create Table
@@ -55,7 +107,8 @@ def create_result_tree_table(connection):
                                                               , parse_time time
                                                               , status TEXT
                                                               , UNIQUE(t_id, exp_id, k_best))''')
-    # cursor.execute('''CREATE UNIQUE INDEX IF NOT EXISTS tree_node_idx ON tree_nodes(t_id, sent_position)''')
+    # results are retrieved per experiment
+    cursor.execute('''CREATE INDEX IF NOT EXISTS result_tree_exp_idx ON result_trees(exp_id, t_id)''')
     connection.commit()
 
 
@@ -119,11 +172,7 @@ def add_grammar(connection, grammar, experiment):
     cursor.execute('''INSERT INTO grammar VALUES (?, ?, ?, ?, ?)''', (None, experiment, nont, rules, size))
     g_id = cursor.lastrowid
 
-    fanout_nonterminals = {}
-    for nont in grammar.nonts():
-        fanout = grammar.fanout(nont)
-        fanout_nonterminals[fanout] = fanout_nonterminals.get(fanout, 0) + 1
-    connection.commit()
+    fanout_nonterminals = histogram([grammar.fanout(nont) for nont in grammar.nonts()])
 
     for fanout in fanout_nonterminals.keys():
         nont = fanout_nonterminals[fanout]
@@ -169,13 +218,13 @@ def add_tree(connection, tree, corpus):
     :type corpus: str
     :return: tree_id
     :rtype: int
+    Inserts the tree unless the corpus already contains a tree of the same name.
     """
+    tree_id = query_tree_id(connection, corpus, tree.sent_label())
+    if tree_id is not None:
+        return tree_id
 
     cursor = connection.cursor()
-    for row in cursor.execute('''SELECT EXISTS (SELECT * FROM trees WHERE corpus = ? AND name = ?)''',
-                              (corpus, tree.sent_label())):
-        if row[0]:
-            return
     cursor.execute('''INSERT OR IGNORE INTO trees VALUES (?, ?, ?, ?, ?)''', (None
                                                                               , corpus
                                                                               , tree.sent_label()
@@ -183,22 +232,27 @@ def add_tree(connection, tree, corpus):
                                                                               , tree.n_gaps()
                                                                               ))
 
-    # unique tree key
-    tree_id = cursor.lastrowid
-    for id in tree.full_yield():
-        if id in tree.root:
-            head = 0
-        else:
-            head = tree.node_index_full(tree.parent(id)) + 1
-        token = tree.node_token(id)
-        cursor.execute('''INSERT INTO tree_nodes VALUES (?, ?, ?, ?, ?, ?)''', (tree_id
-                                                                                , tree.node_index_full(id) + 1
-                                                                                , token.form()
-                                                                                , token.pos()
-                                                                                , token.deprel()
-                                                                                , head))
-
-    connection.commit()
+    if cursor.rowcount == 0:
+        # inserted by another connection in the meantime
+        tree_id = cursor.execute('''SELECT t_id FROM trees WHERE corpus = ? AND name = ?''',
+                                 (corpus, tree.sent_label())).fetchone()[0]
+    else:
+        # unique tree key
+        tree_id = cursor.lastrowid
+        rows = []
+        for id in tree.full_yield():
+            if id in tree.root:
+                head = 0
+            else:
+                head = tree.node_index_full(tree.parent(id)) + 1
+            token = tree.node_token(id)
+            rows.append((tree_id, tree.node_index_full(id) + 1, token.form(), token.pos(), token.deprel(), head))
+        cursor.executemany('''INSERT INTO tree_nodes VALUES (?, ?, ?, ?, ?, ?)''', rows)
+        _tree_added(connection)
+
+    tree_ids = _cached_tree_ids(connection, corpus)
+    if tree_ids is not None:
+        tree_ids[tree.sent_label()] = tree_id
     return tree_id
 
 
@@ -219,9 +273,7 @@ def add_result_tree(connection, tree, corpus, experiment, k_best, score, parse_t
     """
 
     cursor = connection.cursor()
-    tree_id = None
-    for row in cursor.execute('''SELECT t_id FROM trees WHERE corpus = ? AND name = ?''', (corpus, tree.sent_label())):
-        tree_id = row[0]
+    tree_id = query_tree_id(connection, corpus, tree.sent_label())
     if tree_id is None:
         assert "tree not found"
 
@@ -235,6 +287,7 @@ def add_result_tree(connection, tree, corpus, experiment, k_best, score, parse_t
                                                                              , status))
     result_tree_id = cursor.lastrowid
 
+    rows = []
     for id in tree.full_yield():
         # set root head
         if id in tree.root:
@@ -253,11 +306,9 @@ def add_result_tree(connection, tree, corpus, experiment, k_best, score, parse_t
         else:
             head = tree.node_index_full(tree.parent(id)) + 1
             deprel = tree.node_token(id).deprel()
-        cursor.execute('''INSERT INTO result_tree_nodes VALUES (?, ?, ?, ?)''', (result_tree_id
-                                                                                 , tree.node_index_full(id) + 1
-                                                                                 , deprel
-                                                                                 , head))
-    connection.commit()
+        rows.append((result_tree_id, tree.node_index_full(id) + 1, deprel, head))
+    cursor.executemany('''INSERT INTO result_tree_nodes VALUES (?, ?, ?, ?)''', rows)
+    _tree_added(connection)
 
 
 def list_experiments(connection):
@@ -267,6 +318,9 @@ def list_experiments(connection):
 
 
 def query_tree_id(connection, corpus, name):
+    tree_ids = _cached_tree_ids(connection, corpus)
+    if tree_ids is not None:
+        return tree_ids.get(name)
     cursor = connection.cursor()
 
     rows = cursor.execute('''SELECT t_id FROM trees WHERE corpus = ? AND name = ?''', (corpus, name)).fetchall()
@@ -308,27 +362,90 @@ def query_result_tree(connection, exp, tree_id):
                     '                  AND result_tree_nodes.sent_position = tree_nodes.sent_position\n'
                     '                WHERE result_tree_nodes.rt_id = ?'
                 ), (result_tree_id,))
-            tree = HybridTree(name)
-            for i, label, pos, head, deprel in tree_nodes:
-                if deprel is None:
-                    deprel = 'UNKNOWN'
-                token = CoNLLToken(label, '_', pos, pos, '_', deprel)
-                tree.add_node(str(i), token, True, True)
-                if head == 0:
-                    tree.add_to_root(str(i))
-                else:
-                    tree.add_child(str(head), str(i))
-            assert tree.root is not []
-            return status, tree
+            return status, _result_tree(name, tree_nodes)
     # legacy: no entry found
     else:
         status = "simple_fallback"
 
-    # Create a left branching tree without labels as default strategy
     tree_nodes = cursor.execute(
         ''' SELECT tree_nodes.sent_position, label, pos FROM tree_nodes
         WHERE tree_nodes.t_id = ?''', (tree_id,)).fetchall()
+    return status, _fallback_tree(tree_nodes)
+
+
+def query_result_trees(connection, exp, corpus):
+    """
+    :param connection:
+    :param exp: experiment id
+    :type exp: int
+    :param corpus: corpus path
+    :type corpus: str
+    :return: maps the id of every tree of the corpus to its status and result tree, cf. query_result_tree
+    :rtype: dict[int, tuple[str, HybridTree]]
+    Retrieves the results of the experiment for the whole corpus with a single join.
+    """
+    cursor = connection.cursor()
+    nodes = defaultdict(list)
+    results = {}
+    for t_id, name, rt_id, status, position, label, pos, result_rt_id, head, deprel in cursor.execute('''
+        SELECT trees.t_id, trees.name, result_trees.rt_id, result_trees.status, tree_nodes.sent_position,
+               tree_nodes.label, tree_nodes.pos, result_tree_nodes.rt_id, result_tree_nodes.head,
+               result_tree_nodes.deprel
+        FROM trees
+          LEFT JOIN result_trees
+            ON trees.t_id = result_trees.t_id
+            AND result_trees.exp_id = ?
+          LEFT JOIN tree_nodes
+            ON trees.t_id = tree_nodes.t_id
+          LEFT JOIN result_tree_nodes
+            ON result_trees.rt_id = result_tree_nodes.rt_id
+            AND tree_nodes.sent_position = result_tree_nodes.sent_position
+        WHERE trees.corpus = ?
+        ORDER BY trees.t_id, result_trees.rt_id, tree_nodes.sent_position''', (exp, corpus)):
+        if t_id not in results:
+            results[t_id] = name, rt_id, status
+        # There should be at most one result for every tree and experiment.
+        assert results[t_id][1] == rt_id
+        if position is not None:
+            nodes[t_id].append((position, label, pos, result_rt_id, head, deprel))
+
+    trees = {}
+    for t_id, (name, rt_id, status) in results.items():
+        if rt_id is not None and status in ["parse", "fallback"]:
+            trees[t_id] = status, _result_tree(name, [(position, label, pos, head, deprel)
+                                                      for position, label, pos, result_rt_id, head, deprel
+                                                      in nodes[t_id] if result_rt_id is not None])
+        else:
+            trees[t_id] = (status if rt_id is not None else "simple_fallback"), \
+                          _fallback_tree([(position, label, pos) for position, label, pos, _, _, _ in nodes[t_id]])
+    return trees
+
 
+def _result_tree(name, tree_nodes):
+    """
+    :param tree_nodes: rows (sent_position, label, pos, head, deprel)
+    :rtype: HybridTree
+    """
+    tree = HybridTree(name)
+    for i, label, pos, head, deprel in tree_nodes:
+        if deprel is None:
+            deprel = 'UNKNOWN'
+        token = CoNLLToken(label, '_', pos, pos, '_', deprel)
+        tree.add_node(str(i), token, True, True)
+        if head == 0:
+            tree.add_to_root(str(i))
+        else:
+            tree.add_child(str(head), str(i))
+    assert tree.root is not []
+    return tree
+
+
+def _fallback_tree(tree_nodes):
+    """
+    :param tree_nodes: rows (sent_position, label, pos)
+    :rtype: HybridTree
+    Create a left branching tree without labels as default strategy
+    """
     left_branch = lambda x: x - 1
     right_branch = lambda x: x + 1
     strategy = left_branch
@@ -344,11 +461,11 @@ def query_result_tree(connection, exp, tree_id):
         else:
             tree.add_child(str(parent), str(i))
     assert tree.root is not []
-    return status, tree
+    return tree
 
 
 def openDatabase(file):
-    connection = sqlite3.connect(file)
+    connection = sqlite3.connect(file, factory=ExperimentConnection)
     return connection
 
 
@@ -417,6 +534,8 @@ def initialize_database(dbfile):
     connection.text_factory = str
     # Faster concurrent read/write access
     connection.cursor().execute('PRAGMA journal_mode=WAL')
+    # in WAL mode, the database stays consistent if commits are not synced to disk
+    connection.cursor().execute('PRAGMA synchronous=NORMAL')
 
     create_experiment_table(connection)
     create_tree_table(connection)
@@ -714,9 +833,7 @@ def finalize_database(connection):
 def no_parse_result(connection, tree_name, corpus, experiment, parse_time, message):
     cursor = connection.cursor()
 
-    tree_id = None
-    for row in cursor.execute('''SELECT t_id FROM trees WHERE corpus = ? AND name = ?''', (corpus, tree_name)):
-        tree_id = row[0]
+    tree_id = query_tree_id(connection, corpus, tree_name)
     if tree_id is None:
         assert "tree not found"
 
@@ -728,4 +845,4 @@ def no_parse_result(connection, tree_name, corpus, experiment, parse_time, messa
                                                                              , None
                                                                              , parse_time
                                                                              , message))
-    connection.commit()
+    _tree_added(connection)
@@ -2,6 +2,9 @@ from __future__ import print_function
 
 from experiment.resources import TRAINING, TESTING, RESULT, Logger
 from grammar.lcfrs import LCFRS
+from grammar.lcfrs_image import is_grammar_image
+from grammar.induction.count_table import RuleCountTable
+from grammar.induction.parallel_induction import induce_in_parallel, DEFAULT_SHARD_SIZE
 import tempfile
 import multiprocessing
 import os
@@ -28,6 +31,12 @@ class Experiment(object):
         self.max_score = None
         self.purge_rule_freq = None
         self.feature_log = None
+        # Induction: number of worker processes, number of objects per worker
+        # task, and whether rule frequencies are spilled to an on-disk table
+        # instead of being kept in memory.
+        self.induction_workers = 1
+        self.induction_shard_size = DEFAULT_SHARD_SIZE
+        self.spill_rule_counts = False
         self.__stage_path = os.path.join(self.directory, "STAGEFILE")
         self.max_sentence_length_for_parsing = None
 
@@ -41,29 +50,46 @@ class Experiment(object):
                 self.stage_dict = json.load(f)
 
                 if "base_grammar" in self.stage_dict:
-                    self.base_grammar = pickle.load(open(self.stage_dict["base_grammar"], 'rb'))
+                    self.base_grammar = self.load_grammar(self.stage_dict["base_grammar"])
+
+    @staticmethod
+    def load_grammar(path):
+        """
+        :param path: grammar image (cf. LCFRS.save) or pickled grammar of an older stage file
+        :rtype: LCFRS
+        """
+        if is_grammar_image(path):
+            return LCFRS.load(path)
+        with open(path, 'rb') as f:
+            return pickle.load(f)
 
     def write_stage_file(self):
         with open(self.__stage_path, "w") as f:
             json.dump(self.stage_dict, f)
 
     def induce_grammar(self, corpus, start="START"):
-        grammar = LCFRS(start=start)
-        for obj in corpus:
-            obj = self.preprocess_before_induction(obj)
-            obj_grammar, features = self.induce_from(obj)
-            if obj_grammar is None:
-                continue
-            if features is None:
-                grammar.add_gram(obj_grammar, None)
-            else:
-                grammar.add_gram(obj_grammar, (self.feature_log, features))
+        # The corpus is consumed lazily and each object is discarded after its rules were extracted.
+        def induce(obj):
+            return self.induce_from(self.preprocess_before_induction(obj))
+
+        count_table = None
+        if self.spill_rule_counts:
+            count_table = RuleCountTable(directory=self.directory)
+        try:
+            _, grammar, features = induce_in_parallel(corpus, induce, start, self.induction_workers,
+                                                      self.induction_shard_size, feature_logging=True,
+                                                      count_table=count_table)
+        finally:
+            if count_table is not None:
+                count_table.close()
+        if self.feature_log is not None:
+            for key, count in features.items():
+                self.feature_log[key] += count
         self.postprocess_grammar(grammar)
         self.base_grammar = grammar
         _, path = tempfile.mkstemp(suffix=".base.grammar", dir=self.directory)
-        with open(path, 'wb') as f:
-            pickle.dump(self.base_grammar, f)
-            self.stage_dict["base_grammar"] = path
+        self.base_grammar.save(path)
+        self.stage_dict["base_grammar"] = path
 
     def postprocess_grammar(self, grammar):
         if self.purge_rule_freq is not None:
@@ -142,8 +168,7 @@ class Experiment(object):
 
         # induction
         if self.stage[0] <= 1:
-            training_corpus = self.read_corpus(self.resources[TRAINING])
-            self.induce_grammar(training_corpus)
+            self.induce_grammar(self.read_corpus_lazily(self.resources[TRAINING]))
 
         # weight training
         # omitted
@@ -165,6 +190,11 @@ class Experiment(object):
     def read_corpus(self, resource):
         assert False
 
+    def read_corpus_lazily(self, resource):
+        # The corpus is iterated over only once (e.g., by induce_grammar), so subclasses
+        # may read its objects one at a time. By default, the corpus is read as a whole.
+        return self.read_corpus(resource)
+
     def evaluate(self, result_resource, gold_resource):
         assert False
 
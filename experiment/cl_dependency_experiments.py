@@ -18,6 +18,7 @@ from parser.parser_factory import the_parser_factory
 from corpora.conll_parse import parse_conll_corpus, score_cmp_dep_trees
 from evaluation import experiment_database
 from grammar.linearization import linearize
+from grammar.induction.count_table import RuleCountTable
 from grammar.induction.recursive_partitioning import the_recursive_partitioning_factory
 from grammar.induction.terminal_labeling import the_terminal_labeling_factory
 
@@ -52,6 +53,7 @@ def induce_grammar_from_file(path
                              , quiet=False
                              , start='START'
                              , ignore_punctuation=True
+                             , spill_rule_counts=False
                              ):
     """
     :param path: path to dependency corpus in CoNLL format
@@ -72,6 +74,8 @@ def induce_grammar_from_file(path
     :type start: str
     :param ignore_punctuation: include punctuation into grammar
     :type ignore_punctuation: bool
+    :param spill_rule_counts: keep rule frequencies in an on-disk table during induction
+    :type spill_rule_counts: bool
     :rtype: LCFRS, int
     Extract an LCFRS/sDCP-Hybrid Grammar from a dependency corpus in CoNLL format.
     """
@@ -100,8 +104,13 @@ def induce_grammar_from_file(path
     trees = add_trees_to_db(path, connection, trees)
     if ignore_punctuation:
         trees = disconnect_punctuation(trees)
-    (n_trees, grammar) = d_i.induce_grammar(trees, nont_labelling, term_labelling.token_label, recursive_partitioning,
-                                            start)
+    count_table = RuleCountTable(directory='.tmp') if spill_rule_counts else None
+    try:
+        (n_trees, grammar) = d_i.induce_grammar(trees, nont_labelling, term_labelling.token_label,
+                                                recursive_partitioning, start, count_table=count_table)
+    finally:
+        if count_table is not None:
+            count_table.close()
 
     end_clock = time.clock()
     if not quiet:
@@ -13,6 +13,7 @@ import subprocess
 import tempfile
 import itertools
 from hybridtree.general_hybrid_tree import HybridTree
+from hybridtree.frozen_hybrid_tree import FrozenHybridTree
 from parser.discodop_parser.parser import DiscodopKbestParser
 try:
     from parser.gf_parser.gf_interface import GFParser_k_best
@@ -35,6 +36,8 @@ from constituent.dummy_tree import flat_dummy_constituent_tree
 from constituent.parse_accuracy import ParseAccuracyPenalizeFailures
 import corpora.tiger_parse as tp
 import corpora.negra_parse as np
+import corpora.parallel_loading as parallel_loading
+import corpora.corpus_cache as corpus_cache
 import corpora.tagged_parse as tagged_parse
 from hybridtree.constituent_tree import ConstituentTree
 from hybridtree.monadic_tokens import construct_constituent_token
@@ -370,6 +373,12 @@ class ConstituentExperiment(ScoringExperiment):
         self.use_output_counter = False
         self.output_counter = 0
         self.strip_vroot = False
+        # read corpus resources via sentence indices that are stored next to the corpus files
+        self.corpus_index = False
+        # number of processes that parse corpus resources (cf. corpora.parallel_loading)
+        self.corpus_loading_workers = 1
+        # keep parsed corpus resources in binary caches next to the corpus files (cf. corpora.corpus_cache)
+        self.corpus_cache = False
         self.terminal_labeling = None
         self.eval_postprocess_options = None
 
@@ -380,7 +389,7 @@ class ConstituentExperiment(ScoringExperiment):
         self.backoff_factor = 10.0
 
     def obtain_sentence(self, obj):
-        if isinstance(obj, HybridTree):
+        if isinstance(obj, (HybridTree, FrozenHybridTree)):
             sentence = obj.full_yield(), obj.id_yield(), \
                        obj.full_token_yield(), obj.token_yield()
             return sentence
@@ -404,25 +413,28 @@ class ConstituentExperiment(ScoringExperiment):
                 self.terminal_labeling = deserialize_labeling(json.load(tlf))
                 self.induction_settings.terminal_labeling = self.terminal_labeling
 
-    def read_corpus(self, resource):
+    def read_corpus(self, resource, lazy=False):
         if resource.type == "TIGERXML":
-            return self.read_corpus_tigerxml(resource)
+            return self.read_corpus_tigerxml(resource, lazy=lazy)
         elif resource.type == "EXPORT":
-            return self.read_corpus_export(resource)
+            return self.read_corpus_export(resource, lazy=lazy)
         elif resource.type == "WORD/POS":
             return self.read_corpus_tagged(resource)
         else:
             raise ValueError("Unsupport resource type " + resource.type)
 
-    def read_corpus_tigerxml(self, resource):
+    def read_corpus_lazily(self, resource):
+        return self.read_corpus(resource, lazy=True)
+
+    def read_corpus_tigerxml(self, resource, lazy=False):
         """
         :type resource: CorpusFile
+        :param lazy: parse the trees one at a time while they are consumed (without corpus cache)
+        :type lazy: bool
         :return: corpus of constituent trees
         """
-        path = resource.path
         prefix = 's'
         if self.induction_settings.normalize:
-            path = self.normalize_corpus(path, src='tigerxml', dest='tigerxml', renumber=False)
             prefix = ''
 
         if resource.filter is None:
@@ -431,20 +443,40 @@ class ConstituentExperiment(ScoringExperiment):
         else:
             sentence_filter = resource.filter
 
-        return tp.sentence_names_to_hybridtrees(
-            [prefix + str(i) for i in range(resource.start, resource.end + 1)
-             if i not in resource.exclude and sentence_filter(i)]
-            , path
-            , hold=False
-            , disconnect_punctuation=self.induction_settings.disconnect_punctuation)
-
-    def read_corpus_export(self, resource, mode="STANDARD", skip_normalization=False):
+        names = [prefix + str(i) for i in range(resource.start, resource.end + 1)
+                 if i not in resource.exclude and sentence_filter(i)]
+        options = {'names': names, 'disconnect_punctuation': self.induction_settings.disconnect_punctuation}
+        if self.induction_settings.normalize:
+            options['normalize'] = {'src': 'tigerxml', 'dest': 'tigerxml', 'renumber': False}
+
+        def read(corpus_path, normalize=None, **kwargs):
+            # the corpus is only normalized if it is not read from the cache
+            if normalize is not None:
+                corpus_path = self.normalize_corpus(corpus_path, **normalize)
+            if lazy:
+                return parallel_loading.iter_corpus(corpus_path, parallel_loading.TIGERXML,
+                                                    n_workers=self.corpus_loading_workers, **kwargs)
+            if self.corpus_loading_workers > 1:
+                return parallel_loading.load_corpus(corpus_path, parallel_loading.TIGERXML,
+                                                    n_workers=self.corpus_loading_workers, **kwargs)
+            return tp.sentence_names_to_hybridtrees(
+                kwargs['names']
+                , corpus_path
+                , hold=False
+                , disconnect_punctuation=kwargs['disconnect_punctuation']
+                , persist_index=self.corpus_index)
+
+        return corpus_cache.load_corpus(resource.path, read, 'tigerxml', options, cache=self.corpus_cache and not lazy)
+
+    def read_corpus_export(self, resource, mode="STANDARD", skip_normalization=False, lazy=False):
         """
         :type resource: CorpusFile
         :param mode: either STANDARD or DISCO-DOP (handles variation in NEGRA format)
         :type mode: str
         :param skip_normalization: If normalization is skipped even if set in induction settings.
         :type skip_normalization: bool
+        :param lazy: parse the trees one at a time while they are consumed (without corpus cache)
+        :type lazy: bool
         :return: corpus of constituent trees
         """
         if resource.filter is None:
@@ -452,17 +484,29 @@ class ConstituentExperiment(ScoringExperiment):
                 return True
         else:
             sentence_filter = resource.filter
-        path = resource.path
-        if not skip_normalization and self.induction_settings.normalize:
-            path = self.normalize_corpus(path, src='export', dest='export', renumber=False)
         # encoding = "iso-8859-1"
         encoding = "utf-8"
-        return np.sentence_names_to_hybridtrees(
-            {str(i) for i in range(resource.start, resource.end + 1)
-             if i not in resource.exclude and sentence_filter(i)},
-            path,
-            enc=encoding, disconnect_punctuation=self.induction_settings.disconnect_punctuation, add_vroot=True,
-            mode=mode)
+        names = {str(i) for i in range(resource.start, resource.end + 1)
+                 if i not in resource.exclude and sentence_filter(i)}
+        options = {'names': names, 'enc': encoding, 'add_vroot': True, 'mode': mode,
+                   'disconnect_punctuation': self.induction_settings.disconnect_punctuation}
+        if not skip_normalization and self.induction_settings.normalize:
+            options['normalize'] = {'src': 'export', 'dest': 'export', 'renumber': False}
+
+        def read(corpus_path, normalize=None, **kwargs):
+            # the corpus is only normalized if it is not read from the cache
+            if normalize is not None:
+                corpus_path = self.normalize_corpus(corpus_path, **normalize)
+            if lazy:
+                return parallel_loading.iter_corpus(corpus_path, parallel_loading.EXPORT,
+                                                    n_workers=self.corpus_loading_workers, **kwargs)
+            if self.corpus_loading_workers > 1:
+                return parallel_loading.load_corpus(corpus_path, parallel_loading.EXPORT,
+                                                    n_workers=self.corpus_loading_workers, **kwargs)
+            return np.sentence_names_to_hybridtrees(kwargs.pop('names'), corpus_path, index=self.corpus_index,
+                                                    **kwargs)
+
+        return corpus_cache.load_corpus(resource.path, read, 'export', options, cache=self.corpus_cache and not lazy)
 
     def read_corpus_tagged(self, resource):
         return itertools.islice(tagged_parse.parse_tagged_sentences(resource.path), resource.start, resource.limit)
@@ -474,6 +518,9 @@ class ConstituentExperiment(ScoringExperiment):
             parser_input = self.terminal_labeling.prepare_parser_input(obj.token_yield())
             # print(parser_input)
             return parser_input
+        elif isinstance(obj, FrozenHybridTree):
+            # frozen trees are read-only, the virtual root does not occur in the token yield anyway
+            return self.terminal_labeling.prepare_parser_input(obj.token_yield())
         else:
             return self.terminal_labeling.prepare_parser_input(obj)
 
@@ -845,10 +892,9 @@ class ConstituentSMExperiment(ConstituentExperiment, SplitMergeExperiment):
             # self.base_grammar_backup = self.base_grammar
             self.stage_dict["backup_grammar"] = self.stage_dict["base_grammar"]
             self.base_grammar = grammar_fine
-            _, path = tempfile.mkstemp(suffix="basegram.pkl", dir=self.directory)
-            with open(path, 'wb') as file:
-                pickle.dump(self.base_grammar, file)
-                self.stage_dict["base_grammar"] = path
+            _, path = tempfile.mkstemp(suffix=".base.grammar", dir=self.directory)
+            self.base_grammar.save(path)
+            self.stage_dict["base_grammar"] = path
 
             self.organizer.grammarInfo = grammar_fine_info
             self.organizer.nonterminal_map = grammar_fine_nonterminal_map
@@ -915,8 +961,8 @@ class ConstituentSMExperiment(ConstituentExperiment, SplitMergeExperiment):
                 self.other = other
                 self.lookup = lookup
 
-            def token_label(self, token):
-                other_label = self.other.token_label(token)
+            def token_label(self, token, _loc=None):
+                other_label = self.other.token_label(token, _loc)
                 feat_list = token_to_features(token)
                 features = this_class.induction_settings.feat_function([feat_list])
                 feature_set = frozenset(features[0])
@@ -929,8 +975,8 @@ class ConstituentSMExperiment(ConstituentExperiment, SplitMergeExperiment):
                 self.other = other
                 self.lookup = lookup
 
-            def token_label(self, token):
-                other_label = self.other.token_label(token)
+            def token_label(self, token, _loc=None):
+                other_label = self.other.token_label(token, _loc)
                 feat_list = token_to_features(token)
                 features = this_class.induction_settings.feat_function([feat_list])
                 feature_set = frozenset(features[0])
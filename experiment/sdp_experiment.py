@@ -1,5 +1,5 @@
 from __future__ import print_function
-from corpora.sdc_parse import parse_file, export_corpus, build_dummy_dsg, export_sentence
+from corpora.sdc_parse import parse_file, iter_file, export_corpus, build_dummy_dsg, sentence_string, write_sentence
 from parser.gf_parser.gf_interface import GFParser
 from graphs.graph_decomposition import induce_grammar_from, compute_decomposition, dog_evaluation, consecutive_spans
 from graphs.dog import DeepSyntaxGraph
@@ -79,14 +79,17 @@ class SDPExperiment(Experiment):
         return parse_file(resource.path, start_id=resource.start, last_id=resource.end, max_n=resource.limit)
 
     def serialize(self, obj):
-        lines = export_sentence(obj) + ['', '']
-        return '\n'.join(lines)
+        return sentence_string(obj)
+
+    def post_parsing_action(self, gold, system, result_resource):
+        write_sentence(system, result_resource)
 
     def evaluate(self, result_resource, gold_resource):
         if gold_resource.end is not None \
                 or gold_resource.limit is not None\
                 or gold_resource.length_limit is not None:
-            corpus_gold_selection = self.read_corpus(gold_resource)
+            corpus_gold_selection = iter_file(gold_resource.path, start_id=gold_resource.start,
+                                              last_id=gold_resource.end, max_n=gold_resource.limit)
             gold_selection_resource = CorpusFile()
             gold_selection_resource.init()
             gold_selection_resource.finalize()
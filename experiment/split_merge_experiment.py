@@ -278,6 +278,8 @@ class SplitMergeExperiment(Experiment):
 
     def prepare_sm_parser(self):
         last_la = self.organizer.latent_annotations[self.organizer.last_sm_cycle]
+        # compiled forms of the base grammar are shared by the parsers of all modes
+        self.base_grammar.set_compiled_cache_dir(self.directory)
         if self.parsing_mode == "discodop-multi-method":
             if self.organizer.project_weights_before_parsing:
                 self.project_weights()
@@ -388,8 +390,7 @@ class SplitMergeExperiment(Experiment):
 
         # induction
         if self.stage[0] <= 1:
-            training_corpus = self.read_corpus(self.resources[TRAINING])
-            self.induce_grammar(training_corpus)
+            self.induce_grammar(self.read_corpus_lazily(self.resources[TRAINING]))
 
         if self.stage[0] <= 2:
             # prepare reducts
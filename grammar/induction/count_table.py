@@ -0,0 +1,108 @@
+from __future__ import print_function
+# On-disk table of rule frequencies for the induction on large corpora.
+#
+# Partial grammars (e.g., of a shard of the corpus, cf. parallel_induction)
+# are added to the table and can be discarded afterwards. Rules are stored
+# in an SQLite database and identified by their key (cf. LCFRS_rule.key).
+# Their frequencies are summed up, and their order of first occurrence is
+# kept, such that the grammar built from the table equals the grammar
+# obtained by merging all partial grammars in memory (cf. LCFRS.add_gram).
+
+from collections import defaultdict
+import os
+import pickle
+import sqlite3
+import tempfile
+from grammar.lcfrs import LCFRS
+
+
+class RuleCountTable:
+    def __init__(self, path=None, directory=None):
+        """
+        :param path: database file; a temporary file that is removed by close() if None
+        :type path: str
+        :param directory: directory of the temporary file
+        :type directory: str
+        """
+        self.__temporary = path is None
+        if path is None:
+            handle, path = tempfile.mkstemp(suffix='.counts', dir=directory)
+            os.close(handle)
+        self.__path = path
+        self.__connection = sqlite3.connect(path)
+        self.__connection.execute('CREATE TABLE IF NOT EXISTS rules ('
+                                  'id INTEGER PRIMARY KEY, '
+                                  'key TEXT UNIQUE NOT NULL, '
+                                  'rule BLOB NOT NULL, '
+                                  'count REAL NOT NULL)')
+        self.__connection.commit()
+        # Rule features, keys that start with a rule idx refer to the id of the
+        # rule in the table instead.
+        self.__features = defaultdict(lambda: 0)
+
+    def path(self):
+        return self.__path
+
+    def add_grammar(self, grammar, feature_log=None):
+        """
+        Adds the rule weights of grammar to the frequencies in the table.
+
+        :type grammar: LCFRS
+        :param feature_log: feature log of grammar, added like in LCFRS.add_gram
+        :type feature_log: dict
+        """
+        cursor = self.__connection.cursor()
+        ids = {}
+        for rule in grammar.rules():
+            key = rule.key()
+            cursor.execute('SELECT id FROM rules WHERE key = ?', (key,))
+            row = cursor.fetchone()
+            if row is None:
+                blob = pickle.dumps((rule.lhs(), rule.rhs(), rule.dcp()), protocol=pickle.HIGHEST_PROTOCOL)
+                cursor.execute('INSERT INTO rules (key, rule, count) VALUES (?, ?, ?)', (key, blob, rule.weight()))
+                ids[rule.get_idx()] = cursor.lastrowid
+            else:
+                cursor.execute('UPDATE rules SET count = count + ? WHERE id = ?', (rule.weight(), row[0]))
+                ids[rule.get_idx()] = row[0]
+        self.__connection.commit()
+
+        if feature_log is not None:
+            rule_features = defaultdict(list)
+            for key, count in feature_log.items():
+                if isinstance(key[0], int):
+                    rule_features[key[0]].append((key, count))
+            for rule in grammar.rules():
+                nont = rule.lhs().nont()
+                for key, count in rule_features[rule.get_idx()]:
+                    self.__features[(ids[key[0]],) + key[1:]] += count
+                    self.__features[(nont, key[1])] += count
+
+    def __len__(self):
+        return self.__connection.execute('SELECT COUNT(*) FROM rules').fetchone()[0]
+
+    def build(self, start='START'):
+        """
+        :type start: str
+        :return: grammar with the rule frequencies as weights, feature log with rule idx of that grammar
+        :rtype: tuple[LCFRS, defaultdict]
+        """
+        grammar = LCFRS(start=start)
+        idx = {}
+        for rule_id, blob, count in self.__connection.execute('SELECT id, rule, count FROM rules ORDER BY id'):
+            lhs, rhs, dcp = pickle.loads(blob)
+            idx[rule_id] = grammar.add_rule(lhs, rhs, count, dcp).get_idx()
+        feature_log = defaultdict(lambda: 0)
+        for key, count in self.__features.items():
+            if isinstance(key[0], int):
+                feature_log[(idx[key[0]],) + key[1:]] = count
+            else:
+                feature_log[key] = count
+        return grammar, feature_log
+
+    def close(self):
+        self.__connection.close()
+        if self.__temporary and os.path.exists(self.__path):
+            os.remove(self.__path)
+
+
+__all__ = ["RuleCountTable"]
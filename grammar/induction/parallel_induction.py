@@ -0,0 +1,145 @@
+from __future__ import print_function
+# Grammar induction on a corpus with a pool of worker processes.
+#
+# The corpus is split into shards of consecutive objects. Each worker
+# induces a partial grammar for its shard whose rule weights are the
+# (unnormalized) rule frequencies. The partial grammars are merged in shard
+# order by summing frequencies (cf. LCFRS.add_gram). Thus, the rules of the
+# resulting grammar occur in order of their first occurrence in the corpus,
+# i.e., rule indices and frequencies are the same as for sequential induction.
+# The corpus is read lazily, only a few shards are held in memory at a time.
+# Optionally, the partial grammars are spilled to a RuleCountTable.
+
+from collections import defaultdict, deque
+from itertools import islice
+import multiprocessing
+from grammar.lcfrs import LCFRS
+
+DEFAULT_SHARD_SIZE = 100
+
+# Induction function, start symbol and feature logging flag of a worker
+# process, cf. _init_worker.
+_worker_args = None
+
+
+def induce_shard(shard, induce, start, feature_logging=False):
+    """
+    :param shard: objects of the corpus
+    :param induce: maps object to its grammar, or to a pair of grammar and feature log if feature_logging; \
+        the grammar may be None if the object is to be skipped
+    :type start: str
+    :type feature_logging: bool
+    :return: number of objects, grammar with summed rule frequencies, feature log (or None)
+    :rtype: tuple[int, LCFRS, dict]
+    """
+    grammar = LCFRS(start=start)
+    feature_log = defaultdict(lambda: 0) if feature_logging else None
+    n_objects = 0
+    for obj in shard:
+        n_objects += 1
+        if feature_logging:
+            obj_grammar, features = induce(obj)
+        else:
+            obj_grammar, features = induce(obj), None
+        if obj_grammar is None:
+            continue
+        grammar.add_gram(obj_grammar, None if features is None else (feature_log, features))
+    return n_objects, grammar, None if feature_log is None else dict(feature_log)
+
+
+def _init_worker(induce, start, feature_logging):
+    # Workers are forked, hence induce does not need to be picklable.
+    global _worker_args
+    _worker_args = induce, start, feature_logging
+
+
+def _induce_shard(shard):
+    induce, start, feature_logging = _worker_args
+    return induce_shard(shard, induce, start, feature_logging)
+
+
+def shards(corpus, shard_size):
+    """
+    :param corpus: list or generator of objects
+    :type shard_size: int
+    :return: lists of consecutive objects of the corpus
+    """
+    corpus = iter(corpus)
+    while True:
+        shard = list(islice(corpus, shard_size))
+        if not shard:
+            return
+        yield shard
+
+
+def _ordered_results(pool, function, arguments, window):
+    # Like pool.imap, but at most window arguments are taken from the
+    # (lazy) argument iterable ahead of the results that were consumed.
+    pending = deque()
+    for argument in arguments:
+        pending.append(pool.apply_async(function, (argument,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def induce_in_parallel(corpus, induce, start='START', n_workers=None, shard_size=DEFAULT_SHARD_SIZE,
+                       feature_logging=False, count_table=None):
+    """
+    Induces the grammar of each object in the corpus and merges them by summing rule frequencies. The grammar
+    is not made proper. The corpus is consumed lazily; objects are discarded after their grammar was merged.
+
+    :param corpus: list or generator of objects
+    :param induce: maps object to its grammar, or to a pair of grammar and feature log if feature_logging; \
+        the grammar may be None if the object is to be skipped
+    :type start: str
+    :param n_workers: number of worker processes (default: number of CPUs); 1 induces in this process
+    :type n_workers: int
+    :param shard_size: number of objects that are passed to a worker at once
+    :type shard_size: int
+    :type feature_logging: bool
+    :param count_table: the grammar of each shard is added to this table instead of an in-memory grammar, \
+        such that only the final grammar is constructed in memory
+    :type count_table: RuleCountTable
+    :return: number of objects, grammar, feature log (or None)
+    :rtype: tuple[int, LCFRS, defaultdict]
+    """
+    if n_workers is None:
+        n_workers = multiprocessing.cpu_count()
+    if n_workers <= 1 and count_table is None:
+        n_objects, grammar, features = induce_shard(corpus, induce, start, feature_logging)
+        if features is None:
+            return n_objects, grammar, None
+        feature_log = defaultdict(lambda: 0)
+        feature_log.update(features)
+        return n_objects, grammar, feature_log
+
+    n_objects = 0
+    grammar = LCFRS(start=start)
+    feature_log = defaultdict(lambda: 0) if feature_logging else None
+    pool = None
+    if n_workers <= 1:
+        results = (induce_shard(shard, induce, start, feature_logging) for shard in shards(corpus, shard_size))
+    else:
+        pool = multiprocessing.get_context('fork').Pool(n_workers, initializer=_init_worker,
+                                                        initargs=(induce, start, feature_logging))
+        results = _ordered_results(pool, _induce_shard, shards(corpus, shard_size), 2 * n_workers)
+    try:
+        for shard_objects, shard_grammar, shard_features in results:
+            n_objects += shard_objects
+            if count_table is not None:
+                count_table.add_grammar(shard_grammar, shard_features)
+            else:
+                grammar.add_gram(shard_grammar, None if shard_features is None else (feature_log, shard_features))
+    finally:
+        if pool is not None:
+            pool.terminate()
+    if count_table is not None:
+        grammar, table_features = count_table.build(start)
+        if feature_logging:
+            feature_log = table_features
+    return n_objects, grammar, feature_log
+
+
+__all__ = ["induce_in_parallel", "induce_shard"]
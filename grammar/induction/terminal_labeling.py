@@ -1,11 +1,56 @@
 from abc import ABCMeta, abstractmethod
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+import hashlib
+import itertools
+import json
 from hybridtree.monadic_tokens import MonadicToken
 from discodop.lexicon import getunknownwordmodel, unknownword4, replaceraretestwords, YEARRE, NUMBERRE, UNK
 
 
+# maximum number of labels cached per terminal labeling
+DEFAULT_LABEL_CACHE_SIZE = 100000
+
+# numbers of labelings whose cache key cannot be derived from their serialization, cf. cache_key
+_cache_numbers = itertools.count()
+
+
+class LabelCache:
+    """
+    Maps keys (e.g., form, pos and position class of a token) to labels.
+    If there are more than max_size entries, the least recently used one is evicted.
+    """
+    def __init__(self, max_size=DEFAULT_LABEL_CACHE_SIZE):
+        self.max_size = max_size
+        self.__labels = OrderedDict()
+
+    def get(self, key):
+        """
+        :return: cached label or None
+        """
+        label = self.__labels.get(key)
+        if label is not None:
+            self.__labels.move_to_end(key)
+        return label
+
+    def put(self, key, label):
+        self.__labels[key] = label
+        if len(self.__labels) > self.max_size:
+            self.__labels.popitem(last=False)
+
+    def clear(self):
+        self.__labels.clear()
+
+    def __len__(self):
+        return len(self.__labels)
+
+
 class TerminalLabeling:
     __metaclass__ = ABCMeta
+    # cf. label_cache
+    __label_cache = None
+    # cf. cache_key
+    __cache_number = None
+    label_cache_size = DEFAULT_LABEL_CACHE_SIZE
 
     @abstractmethod
     def token_label(self, token, _loc=None):
@@ -23,12 +68,53 @@ class TerminalLabeling:
         else:
             return self.token_label(token) + " : " + token.edge()
 
+    def label_sentence(self, tokens):
+        """
+        :param tokens: tokens of a sentence
+        :type tokens: list[MonadicToken]
+        :return: labels of the tokens, where the position of each token is passed as _loc
+        :rtype: list[str]
+        Labels for parser input; grammar induction and training trees label tokens without position.
+        """
+        token_label = self.token_label
+        return [token_label(token, _loc) for _loc, token in enumerate(tokens)]
+
     def prepare_parser_input(self, tokens):
-        return [self.token_label(token, _loc) for _loc, token in enumerate(tokens)]
+        return self.label_sentence(tokens)
+
+    def label_cache(self):
+        """
+        :return: LRU cache for labelings whose labels are expensive to compute (created on first use)
+        :rtype: LabelCache
+        """
+        if self.__label_cache is None:
+            self.__label_cache = LabelCache(self.label_cache_size)
+        return self.__label_cache
 
     def serialize(self):
         return {'type': self.__class__.__name__}
 
+    def serialization_complete(self):
+        """
+        :return: whether serialize covers all the state the labels depend on
+        :rtype: bool
+        """
+        return True
+
+    def cache_key(self):
+        """
+        :return: key that identifies the labeling by its description and serialization (e.g., for compiled \
+            grammars, cf. LCFRS.compiled); unlike the id of the labeling, it is not reused by other labelings
+        :rtype: str
+        If the serialization is not complete, the key identifies this instance by a number instead.
+        """
+        if not self.serialization_complete():
+            if self.__cache_number is None:
+                self.__cache_number = next(_cache_numbers)
+            return str(self) + '|#' + str(self.__cache_number)
+        serialization = json.dumps(self.serialize(), sort_keys=True, default=sorted)
+        return str(self) + '|' + hashlib.sha1(serialization.encode('utf-8')).hexdigest()
+
     @staticmethod
     @abstractmethod
     def deserialize(json_object):
@@ -59,6 +145,10 @@ class FeatureTerminals(TerminalLabeling):
     def __str__(self):
         return "feature-terminals"
 
+    def serialization_complete(self):
+        # the features are given by functions
+        return False
+
 
 class FrequencyBiasedTerminalLabeling(TerminalLabeling):
     def __init__(self, fine_labeling, fall_back, corpus=None, threshold=4, fine_label_count=None):
@@ -97,6 +187,9 @@ class FrequencyBiasedTerminalLabeling(TerminalLabeling):
                 'fine labeling': self.fine_labeling.serialize(),
                 'fallback labeling': self.fall_back.serialize()}
 
+    def serialization_complete(self):
+        return self.fine_labeling.serialization_complete() and self.fall_back.serialization_complete()
+
     @staticmethod
     def deserialize(json_object):
         fine = deserialize_labeling(json_object['fine labeling'])
@@ -131,6 +224,9 @@ class CompositionalTerminalLabeling(TerminalLabeling):
             'binding string': self.binding_string
         }
 
+    def serialization_complete(self):
+        return self.first_labeling.serialization_complete() and self.second_labeling.serialization_complete()
+
     @staticmethod
     def deserialize(json_object):
         first = deserialize_labeling(json_object['first'])
@@ -195,7 +291,7 @@ class CPOS_KON_APPR(TerminalLabeling):
 
 
 class FormTerminalsUnk(TerminalLabeling):
-    def __init__(self, trees, threshold, UNK="UNKNOWN", filter=[]):
+    def __init__(self, trees, threshold, UNK="UNKNOWN", filter=[], lexicon=None):
         """
         :param trees: corpus of trees
         :param threshold: UNK words below the threshold
@@ -204,10 +300,15 @@ class FormTerminalsUnk(TerminalLabeling):
         :type UNK: str
         :param filter: a list of POS tags which are always UNKed
         :type filter: list[str]
+        :param lexicon: words that are not UNKed (used instead of the counts in trees, cf. serialize)
+        :type lexicon: list[str]
         """
         self.__terminal_counts = {}
         self.__UNK = UNK
         self.__threshold = threshold
+        if lexicon is not None:
+            self.__terminal_counts = {form: threshold for form in lexicon}
+            trees = []
         for tree in trees:
             for token in tree.token_yield():
                 if token.pos() not in filter:
@@ -226,9 +327,21 @@ class FormTerminalsUnk(TerminalLabeling):
             form = self.__UNK
         return form
 
+    def serialize(self):
+        return {'type': self.__class__.__name__,
+                'threshold': self.__threshold,
+                'UNK': self.__UNK,
+                'lexicon': sorted(form for form, count in self.__terminal_counts.items()
+                                  if count >= self.__threshold)}
+
+    @staticmethod
+    def deserialize(json_object):
+        assert json_object['type'] == 'FormTerminalsUnk'
+        return FormTerminalsUnk([], json_object['threshold'], UNK=json_object['UNK'], lexicon=json_object['lexicon'])
+
 
 class FormTerminalsPOS(TerminalLabeling):
-    def __init__(self, trees, threshold, filter=[]):
+    def __init__(self, trees, threshold, filter=[], lexicon=None):
         """
         :param trees: corpus of trees
         :param threshold: UNK words below the threshold
@@ -237,9 +350,14 @@ class FormTerminalsPOS(TerminalLabeling):
         :type UNK: str
         :param filter: a list of POS tags which are always UNKed
         :type filter: list[str]
+        :param lexicon: words that are not UNKed (used instead of the counts in trees, cf. serialize)
+        :type lexicon: list[str]
         """
         self.__terminal_counts = {}
         self.__threshold = threshold
+        if lexicon is not None:
+            self.__terminal_counts = {form: threshold for form in lexicon}
+            trees = []
         for tree in trees:
             for token in tree.token_yield():
                 if token.pos() not in filter:
@@ -258,9 +376,20 @@ class FormTerminalsPOS(TerminalLabeling):
             form = token.pos()
         return form
 
+    def serialize(self):
+        return {'type': self.__class__.__name__,
+                'threshold': self.__threshold,
+                'lexicon': sorted(form for form, count in self.__terminal_counts.items()
+                                  if count >= self.__threshold)}
+
+    @staticmethod
+    def deserialize(json_object):
+        assert json_object['type'] == 'FormTerminalsPOS'
+        return FormTerminalsPOS([], json_object['threshold'], lexicon=json_object['lexicon'])
+
 
 class FormPosTerminalsUnk(TerminalLabeling):
-    def __init__(self, trees, threshold, UNK="UNKNOWN", filter=[]):
+    def __init__(self, trees, threshold, UNK="UNKNOWN", filter=[], lexicon=None):
         """
         :param trees: corpus of trees
         :param threshold: UNK words below the threshold
@@ -269,10 +398,16 @@ class FormPosTerminalsUnk(TerminalLabeling):
         :type UNK: str
         :param filter: a list of POS tags which are always UNKed
         :type filter: list[str]
+        :param lexicon: pairs of word and POS tag that are not UNKed (used instead of the counts in trees, \
+            cf. serialize)
+        :type lexicon: list[(str, str)]
         """
         self.__terminal_counts = {}
         self.__UNK = UNK
         self.__threshold = threshold
+        if lexicon is not None:
+            self.__terminal_counts = {tuple(pair): threshold for pair in lexicon}
+            trees = []
         for tree in trees:
             for token in tree.token_yield():
                 if token.pos() not in filter:
@@ -292,13 +427,30 @@ class FormPosTerminalsUnk(TerminalLabeling):
             form = self.__UNK
         return form + '-:-' + pos
 
+    def serialize(self):
+        return {'type': self.__class__.__name__,
+                'threshold': self.__threshold,
+                'UNK': self.__UNK,
+                'lexicon': sorted(pair for pair, count in self.__terminal_counts.items()
+                                  if count >= self.__threshold)}
+
+    @staticmethod
+    def deserialize(json_object):
+        assert json_object['type'] == 'FormPosTerminalsUnk'
+        return FormPosTerminalsUnk([], json_object['threshold'], UNK=json_object['UNK'],
+                                   lexicon=json_object['lexicon'])
+
 
 class FormPosTerminalsUnkMorph(TerminalLabeling):
-    def __init__(self, trees, threshold, UNK="UNKNOWN", filter=[], add_morph={}):
+    def __init__(self, trees, threshold, UNK="UNKNOWN", filter=[], add_morph={}, lexicon=None):
         self.__terminal_counts = defaultdict(lambda: 0)
         self.__UNK = UNK
         self.__threshold = threshold
         self.__add_morph = add_morph
+        if lexicon is not None:
+            # pairs of word and POS tag that are not UNKed, cf. serialize
+            self.__terminal_counts.update((tuple(pair), threshold) for pair in lexicon)
+            trees = []
         for tree in trees:
             for token in tree.token_yield():
                 if token.pos() not in filter:
@@ -309,15 +461,35 @@ class FormPosTerminalsUnkMorph(TerminalLabeling):
 
     def token_label(self, token, _loc=None):
         pos = token.pos()
-        form = token.form().lower()
-        if self.__terminal_counts.get((form, pos)) < self.__threshold:
-            form = self.__UNK
-            if pos in self.__add_morph:
-                feats = map(lambda x: tuple(x.split('=')), token.feats().split('|'))
-                for feat in feats:
-                    if feat[0] in self.__add_morph[pos]:
-                        form += '#' + feat[0] + ':' + feat[1]
-        return form + '-:-' + pos
+        key = token.form(), pos, token.feats() if pos in self.__add_morph else None
+        cache = self.label_cache()
+        label = cache.get(key)
+        if label is None:
+            form = token.form().lower()
+            if self.__terminal_counts.get((form, pos), 0) < self.__threshold:
+                form = self.__UNK
+                if pos in self.__add_morph:
+                    feats = map(lambda x: tuple(x.split('=')), token.feats().split('|'))
+                    for feat in feats:
+                        if feat[0] in self.__add_morph[pos]:
+                            form += '#' + feat[0] + ':' + feat[1]
+            label = form + '-:-' + pos
+            cache.put(key, label)
+        return label
+
+    def serialize(self):
+        return {'type': self.__class__.__name__,
+                'threshold': self.__threshold,
+                'UNK': self.__UNK,
+                'add morph': {pos: sorted(feats) for pos, feats in self.__add_morph.items()},
+                'lexicon': sorted(pair for pair, count in self.__terminal_counts.items()
+                                  if count >= self.__threshold)}
+
+    @staticmethod
+    def deserialize(json_object):
+        assert json_object['type'] == 'FormPosTerminalsUnkMorph'
+        return FormPosTerminalsUnkMorph([], json_object['threshold'], UNK=json_object['UNK'],
+                                        add_morph=json_object['add morph'], lexicon=json_object['lexicon'])
 
 
 class StanfordUNKing(TerminalLabeling):
@@ -342,6 +514,10 @@ class StanfordUNKing(TerminalLabeling):
             self.sigs = sigs
             self.words = words
             self.lexicon = lexicon
+        # constant time lookup, also if the model was deserialized from lists
+        self.__openclasswords = frozenset(self.openclasswords)
+        self.__sigs = frozenset(self.sigs)
+        self.__lexicon = frozenset(self.lexicon)
 
     def __str__(self):
         return "stanford-unk-" + str(self.unknown_threshold) \
@@ -349,31 +525,41 @@ class StanfordUNKing(TerminalLabeling):
 
     def token_label(self, token, _loc=None):
         word = token.form()
-
+        # unknownword4 only distinguishes the first position of a sentence from the others
+        key = word, _loc == 0, self.backoff_mode
+        cache = self.label_cache()
+        label = cache.get(key)
+        if label is None:
+            label = self.__word_label(word, _loc)
+            cache.put(key, label)
+        return label
+
+    def __word_label(self, word, _loc):
+        lexicon = self.__lexicon
         # adapted from discodop
         if YEARRE.match(word):
             return '1970'
         elif NUMBERRE.match(word):
             return '000'
         if not self.backoff_mode:
-            if word in self.lexicon:
+            if word in lexicon:
                 return word
-            elif word.lower() in self.lexicon:
+            elif word.lower() in lexicon:
                 return word.lower()
             else:
-                sig = unknownword4(word, _loc, self.lexicon)
-                if sig in self.sigs:
+                sig = unknownword4(word, _loc, lexicon)
+                if sig in self.__sigs:
                     return sig
                 else:
                     return UNK
         else:
-            if word in self.lexicon and word not in self.openclasswords:
+            if word in lexicon and word not in self.__openclasswords:
                 return word
-            elif word.lower() in self.lexicon and word not in self.openclasswords:
+            elif word.lower() in lexicon and word not in self.__openclasswords:
                 return word.lower()
             else:
-                sig = unknownword4(word, _loc, self.lexicon)
-                if sig in self.sigs:
+                sig = unknownword4(word, _loc, lexicon)
+                if sig in self.__sigs:
                     return sig
                 else:
                     return UNK
@@ -2,9 +2,20 @@
 # Rules are augmented with DCP rules.
 # Together this forms LCFRS/DCP hybrid grammars.
 
+from array import array
 from collections import defaultdict, namedtuple
+import hashlib
+import os
+import pickle
+import numpy as np
+try:
+    from collections.abc import Mapping, Sequence
+except ImportError:
+    from collections import Mapping, Sequence
 from grammar.dcp import dcp_rules_to_str, dcp_rules_to_key
+from grammar.lcfrs_image import GrammarImage, write_grammar_image
 from grammar.rtg import RTG_like, RTG
+from util.enumerator import Enumerator
 
 # ##########################################################################
 # Parts of the grammar.
@@ -134,6 +145,57 @@ cdef class LCFRS_lhs:
         return s
 
 
+# Contiguous storage of the rule weights of a grammar; the weight of the
+# rule with idx i is stored at position i. The buffer grows by doubling and
+# is reallocated rather than resized in place, hence views obtained by
+# view() stay valid memory, but are detached from the store once it grows.
+# The revision counts the changes of weights, cf. LCFRS.fingerprint.
+cdef class WeightStore:
+    cdef object _array
+    cdef double[::1] _data
+    cdef Py_ssize_t _size
+    cdef readonly unsigned long revision
+
+    # Constructor.
+    # weights: iterable of real (initial content)
+    def __init__(self, weights=()):
+        array = np.array(weights, dtype=np.double)
+        self._size = len(array)
+        if self._size < 16:
+            array = np.concatenate([array, np.zeros(16 - self._size)])
+        self._array = array
+        self._data = array
+
+    # Append weight.
+    # weight: real
+    # return: int (position of weight)
+    cdef Py_ssize_t append(self, double weight):
+        if self._size == self._data.shape[0]:
+            array = np.zeros(2 * self._size)
+            array[:self._size] = self._array[:self._size]
+            self._array = array
+            self._data = array
+        self._data[self._size] = weight
+        self._size += 1
+        self.revision += 1
+        return self._size - 1
+
+    # Record change of weights by writing to view().
+    def modified(self):
+        self.revision += 1
+
+    # NumPy view on weights (no copy).
+    # return: numpy.ndarray of float64
+    def view(self):
+        return self._array[:self._size]
+
+    def __len__(self):
+        return self._size
+
+    def __reduce__(self):
+        return WeightStore, (self._array[:self._size].copy(),)
+
+
 # LCFRS rule, optionally with DCP rules.
 cdef class LCFRS_rule:
     cdef double __weight
@@ -141,6 +203,9 @@ cdef class LCFRS_rule:
     cdef list __rhs
     cdef list __dcp
     cdef int __idx
+    # Weight store of the grammar that contains the rule, if any.
+    # The weight of the rule is then kept at position idx of the store.
+    cdef WeightStore __weights
 
     cpdef int get_idx(self):
         return self.__idx
@@ -167,7 +232,11 @@ cdef class LCFRS_rule:
     # Increase weight.
     # weight: real
     cpdef void add_weight(self, double weight):
-        self.__weight += weight
+        if self.__weights is None:
+            self.__weight += weight
+        else:
+            self.__weights._data[self.__idx] += weight
+            self.__weights.revision += 1
 
     # Set DCP.
     # dcp: list of DCP_rule
@@ -177,12 +246,44 @@ cdef class LCFRS_rule:
     # Set weight.
     # weight: real
     cpdef void set_weight(self, double weight):
-        self.__weight = weight
+        if self.__weights is None:
+            self.__weight = weight
+        else:
+            self.__weights._data[self.__idx] = weight
+            self.__weights.revision += 1
 
     # Get weight.
     # return: real
     cpdef double weight(self):
-        return self.__weight
+        if self.__weights is None:
+            return self.__weight
+        return self.__weights._data[self.__idx]
+
+    # Pickling. The weight store is shared by the rules of a grammar (cf.
+    # LCFRS.__getstate__).
+    def __reduce__(self):
+        return LCFRS_rule, (self.__lhs, self.weight(), self.__dcp, self.__idx), (self.__rhs, self.__weights)
+
+    # Restore state of __reduce__, or the state (dcp, idx, lhs, rhs, weight)
+    # of rules pickled before weights were kept in a store.
+    # state: tuple
+    def __setstate__(self, state):
+        if len(state) == 5:
+            self.__dcp, self.__idx, self.__lhs, self.__rhs, self.__weight = state
+            self.__weights = None
+        else:
+            self.__rhs, self.__weights = state
+
+    # Move weight into store (or back into the rule if store is None).
+    # The position in the store becomes the idx of the rule.
+    # store: WeightStore
+    cdef void bind_weight(self, WeightStore store):
+        cdef double weight = self.weight()
+        self.__weights = store
+        if store is None:
+            self.__weight = weight
+        else:
+            self.__idx = store.append(weight)
 
     # Get DCP.
     # return: list of DCP_rule
@@ -307,6 +408,140 @@ cdef class LCFRS_rule:
         #     return hash(self.key())
 
 
+# Pickles of rules written before weights were kept in a store refer to the
+# unpickling function that Cython generates for classes without __reduce__.
+def unpickle_rule_state(cls, checksum, state):
+    rule = cls.__new__(cls)
+    if state is not None:
+        rule.__setstate__(state)
+    return rule
+
+globals()['__pyx_unpickle_LCFRS_rule'] = unpickle_rule_state
+
+
+###########################################################################
+# Integer identity of rules.
+
+# Encoding of variable <mem,arg> in an interned rule key. Terminals are
+# encoded by their (non-negative) index, hence variables are negative.
+cdef inline long interned_var(LCFRS_var var):
+    return -1 - ((<long> var._mem) << 16 | var._arg)
+
+
+# Identity of a rule as (nested) tuple of integers.
+# Interns all occurring symbols as a side effect.
+# lhs: LCFRS_lhs
+# nonts: list of string
+# dcp: list of DCP_rule or None
+# return: tuple (lhs nont id, tuple of args, tuple of rhs nont ids, dcp id)
+cdef tuple interned_rule_key(LCFRS_lhs lhs, nonts, dcp, nont_enum, term_enum, dcp_enum):
+    cdef list args = []
+    cdef list arg_key
+    for arg in lhs.args():
+        arg_key = []
+        for elem in arg:
+            if isinstance(elem, LCFRS_var):
+                arg_key.append(interned_var(elem))
+            else:
+                arg_key.append(term_enum.object_index(elem))
+        args.append(tuple(arg_key))
+    return (nont_enum.object_index(lhs.nont()),
+            tuple(args),
+            tuple([nont_enum.object_index(nont) for nont in nonts]),
+            -1 if dcp is None else dcp_enum.object_index(dcp_rules_to_key(dcp)))
+
+
+# Translate symbol id of one enumerator to the id of the same symbol in
+# another enumerator, the translation is memoized in cache.
+cdef long translate_id(dict cache, long i, source, target):
+    if i not in cache:
+        cache[i] = target.object_index(source.index_object(i))
+    return cache[i]
+
+
+# Translate interned rule key (cf. interned_rule_key) between grammars.
+# key: tuple
+# nont_map, term_map, dcp_map: dict (memoized translations)
+# return: tuple
+cdef tuple translate_interned_key(tuple key, dict nont_map, dict term_map, dict dcp_map,
+                                  nont_source, term_source, dcp_source, nont_target, term_target, dcp_target):
+    return (translate_id(nont_map, key[0], nont_source, nont_target),
+            tuple([tuple([elem if elem < 0 else translate_id(term_map, elem, term_source, term_target)
+                          for elem in arg]) for arg in key[1]]),
+            tuple([translate_id(nont_map, nont, nont_source, nont_target) for nont in key[2]]),
+            -1 if key[3] < 0 else translate_id(dcp_map, key[3], dcp_source, dcp_target))
+
+
+###########################################################################
+# Lazy access to rules of a grammar image, cf. LCFRS.load.
+
+# Construct i-th rule of image.
+# image: GrammarImage
+# i: int
+# return: LCFRS_rule
+cdef LCFRS_rule image_rule(image, int i):
+    cdef int a
+    cdef int j
+    cdef int code
+    cdef list arg
+    cdef LCFRS_lhs lhs = LCFRS_lhs(image.nonts[image.rule_lhs[i]])
+    for a in range(image.rule_arg_offsets[i], image.rule_arg_offsets[i + 1]):
+        arg = []
+        for j in range(image.arg_offsets[a], image.arg_offsets[a + 1]):
+            code = image.arg_elems[j]
+            if code >= 0:
+                arg.append(image.terms[code])
+            else:
+                code = -1 - code
+                arg.append(LCFRS_var(code >> 16, code & 0xFFFF))
+        lhs.add_arg(arg)
+    cdef LCFRS_rule rule = LCFRS_rule(lhs, weight=image.weights[i], dcp=image.dcp(image.rule_dcp[i]), idx=i)
+    for j in range(image.rule_rhs_offsets[i], image.rule_rhs_offsets[i + 1]):
+        rule.add_rhs_nont(image.nonts[image.rule_rhs[j]])
+    return rule
+
+
+# Read-only sequence of rules, which are constructed when accessed.
+class LazyRules(Sequence):
+    # rule: function from rule idx to LCFRS_rule
+    # ids: sequence of rule idx
+    def __init__(self, rule, ids):
+        self.__rule = rule
+        self.__ids = ids
+
+    def __len__(self):
+        return len(self.__ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.__rule(idx) for idx in self.__ids[i]]
+        return self.__rule(self.__ids[i])
+
+    def __iter__(self):
+        for idx in self.__ids:
+            yield self.__rule(idx)
+
+
+# Read-only mapping from rule idx to rule, which is constructed when accessed.
+class LazyRuleIndex(Mapping):
+    # rule: function from rule idx to LCFRS_rule
+    # n: int (number of rules)
+    def __init__(self, rule, n):
+        self.__rule = rule
+        self.__n = n
+
+    def __len__(self):
+        return self.__n
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.__n:
+            raise KeyError(i)
+        return self.__rule(i)
+
+    def __iter__(self):
+        return iter(range(self.__n))
+
+
 ###########################################################################
 # The grammar.
 
@@ -332,12 +567,20 @@ class LCFRS(RTG_like):
     # Constructor.
     # start: string
     # unit: real 
-    def __init__(self, start=None, unit=1):
+    # interned: bool (identify rules by integer keys instead of strings;
+    #           this does not change how rules are stored or indexed)
+    def __init__(self, start=None, unit=1, interned=False):
         # Unit weight; the 1 value of the (plus-times) semiring;
         # used as default weight of rules.
         self.__unit = unit
         # Mapping from nonterminal to (fixed) fanout.
         self.__nont_to_fanout = {}
+        # Weights of rules, in order of rule idx (cf. weights).
+        self.__weights = WeightStore()
+        # LHS group of each rule, in order of rule idx, and mapping from
+        # LHS nonterminal to its group (cf. lhs_groups).
+        self.__rule_lhs_group = array('i')
+        self.__lhs_group = {}
         # Start symbol.
         self.__start = None
         # Rules, in order in which they were added.
@@ -357,6 +600,38 @@ class LCFRS(RTG_like):
         # Mapping from nonterminal to rules where nonterminal occurs as
         # first element in RHS.
         self.__nont_corner_of = defaultdict(list)
+        # Interned backend: nonterminals, terminals and sDCP rules are
+        # enumerated and a rule is identified by a tuple of ints, cf.
+        # interned_rule_key. The symbols of the rules are stored column-wise:
+        # the LHS nonterminal id of the rule with idx i is rule_lhs[i], its
+        # RHS nonterminal ids are rule_rhs[rule_rhs_offsets[i]:rule_rhs_offsets[i+1]].
+        # Interning only replaces the string keys (and the cost of building and
+        # hashing them in add_rule); the rules themselves and the indexes above
+        # (lhs_nont_to_rules, lex_rules, rule_index, ...) remain Python objects
+        # keyed by the symbols, exactly as in the non-interned backend.
+        self.__interned = interned
+        if interned:
+            self.__nont_enum = Enumerator()
+            self.__term_enum = Enumerator()
+            self.__dcp_enum = Enumerator()
+            self.__rule_lhs = array('i')
+            self.__rule_rhs_offsets = array('i', [0])
+            self.__rule_rhs = array('i')
+        # Grammar image from which rules are constructed on access, cf. load.
+        # It is replaced by the regular structures before the grammar is
+        # modified (cf. __thaw).
+        self.__image = None
+        self.__rule_cache = None
+        # Compiled forms of the grammar for parser backends (cf. compiled),
+        # mapping from backend to pair of fingerprint and compiled form.
+        self.__compiled = {}
+        self.__compiled_dir = None
+        # Number of structural modifications and digest of the rules at a
+        # given revision, cf. fingerprint.
+        self.__revision = 0
+        self.__rules_digest = None
+        # Fingerprint at given revision and revision of weights.
+        self.__fingerprint = None
         if start:
             self.__start = start
             self.__nont_to_fanout[start] = 1
@@ -373,15 +648,27 @@ class LCFRS(RTG_like):
         :type nonts: list
         :type weight: double
         """
+        self.__thaw()
+        self.__modified()
         if weight is None:
             weight = self.__unit
+        if self.__interned:
+            key = interned_rule_key(lhs, nonts, dcp, self.__nont_enum, self.__term_enum, self.__dcp_enum)
+        else:
+            key = None
+        if key is not None and key in self.__key_to_rule:
+            rule = self.__key_to_rule[key]
+            rule.add_weight(weight)
+            return rule
         rule = LCFRS_rule(lhs, weight=weight, dcp=dcp, idx=len(self.__idx_to_rule))
         for nont in nonts:
             rule.add_rhs_nont(nont)
-        if rule.key() in self.__key_to_rule:
-            rule = self.__key_to_rule[rule.key()]
-            rule.add_weight(weight)
-            return rule
+        if key is None:
+            key = rule.key()
+            if key in self.__key_to_rule:
+                rule = self.__key_to_rule[key]
+                rule.add_weight(weight)
+                return rule
         if not lhs.nont() in self.__nont_to_fanout or \
                         self.__nont_to_fanout[lhs.nont()] == lhs.fanout():
             self.__nont_to_fanout[lhs.nont()] = lhs.fanout()
@@ -400,9 +687,32 @@ class LCFRS(RTG_like):
                 self.__nont_to_fanout[nont] = fanout_i
             else:
                 raise Exception('unexpected fanout in ' + str(rule))
+        self.__store_rule(rule, key)
+        if self.__start is None:
+            self.__start = lhs.nont()
+            if lhs.fanout() != 1:
+                raise Exception('start symbol should have fanout 1')
+        return rule
+
+    # Append new rule to grammar.
+    # rule: LCFRS_rule
+    # key: string or tuple of int (cf. interned_rule_key)
+    def __store_rule(self, LCFRS_rule rule, key):
+        rule.bind_weight(self.__weights)
         self.__rules += [rule]
-        self.__key_to_rule[rule.key()] = rule
-        self.__lhs_nont_to_rules[rule.lhs().nont()] += [rule]
+        self.__key_to_rule[key] = rule
+        if self.__interned:
+            self.__rule_lhs.append(key[0])
+            self.__rule_rhs.extend(key[2])
+            self.__rule_rhs_offsets.append(len(self.__rule_rhs))
+        self.__index_rule(rule)
+
+    # Register rule in rule index and auxiliary structures.
+    # rule: LCFRS_rule
+    def __index_rule(self, rule):
+        nont = rule.lhs().nont()
+        self.__lhs_nont_to_rules[nont] += [rule]
+        self.__rule_lhs_group.append(self.__lhs_group.setdefault(nont, len(self.__lhs_group)))
         if rule.rank() == 0:
             terms = rule.terms()
             if len(terms) > 0:
@@ -411,12 +721,7 @@ class LCFRS(RTG_like):
                 self.__epsilon_rules += [rule]
         else:
             self.__nont_corner_of[rule.rhs_nont(0)] += [rule]
-        if self.__start is None:
-            self.__start = lhs.nont()
-            if lhs.fanout() != 1:
-                raise Exception('start symbol should have fanout 1')
         self.__idx_to_rule[rule.get_idx()] = rule
-        return rule
 
     # Get unit element.
     # return: real
@@ -433,14 +738,211 @@ class LCFRS(RTG_like):
         :rtype: list[LCFRS_rule]
         :return: Get all rules in grammar.
         """
+        if self.__image is not None:
+            return LazyRules(self.__image_rule, range(len(self.__rule_cache)))
         return self.__rules
 
     def rule_index(self, i=None):
+        if self.__image is not None:
+            if i is None:
+                return LazyRuleIndex(self.__image_rule, len(self.__rule_cache))
+            return self.__image_rule(i)
         if i is None:
             return self.__idx_to_rule
         else:
             return self.__idx_to_rule[i]
 
+    # Write grammar to binary image (cf. grammar.lcfrs_image).
+    # path: string
+    def save(self, path):
+        write_grammar_image(self, path)
+
+    # Load grammar from binary image. The file is memory mapped and
+    # rules are only constructed when accessed.
+    # path: string
+    # return: LCFRS
+    @staticmethod
+    def load(path):
+        image = GrammarImage(path)
+        grammar = LCFRS(start=image.start(), unit=image.unit(), interned=image.interned())
+        grammar.__attach_image(image)
+        return grammar
+
+    def __attach_image(self, image):
+        self.__image = image
+        self.__rule_cache = [None] * image.n_rules()
+        for i, nont in enumerate(image.nonts):
+            self.__nont_to_fanout[nont] = image.nont_fanout[i]
+
+    # Get (and cache) i-th rule of attached image.
+    # i: int
+    # return: LCFRS_rule
+    def __image_rule(self, int i):
+        rule = self.__rule_cache[i]
+        if rule is None:
+            rule = image_rule(self.__image, i)
+            self.__rule_cache[i] = rule
+        return rule
+
+    # Construct all rules of attached image and detach it.
+    def __thaw(self):
+        if self.__image is None:
+            return
+        rules = [self.__image_rule(i) for i in range(len(self.__rule_cache))]
+        self.__image = None
+        self.__rule_cache = None
+        for rule in rules:
+            if self.__interned:
+                key = interned_rule_key(rule.lhs(), rule.rhs(), rule.dcp(),
+                                        self.__nont_enum, self.__term_enum, self.__dcp_enum)
+            else:
+                key = rule.key()
+            self.__store_rule(rule, key)
+
+    def __getstate__(self):
+        self.__thaw()
+        state = dict(self.__dict__)
+        state['_LCFRS__compiled'] = {}
+        state['_LCFRS__rules_digest'] = None
+        state['_LCFRS__fingerprint'] = None
+        return state
+
+    def __setstate__(self, state):
+        cdef LCFRS_rule rule
+        # grammars pickled by older versions lack some attributes
+        self.__dict__.update(LCFRS().__dict__)
+        self.__dict__.update(state)
+        if '_LCFRS__weights' not in state:
+            # rules of grammars pickled before the weight store keep their weights
+            for rule in self.__rules:
+                rule.bind_weight(self.__weights)
+                nont = rule.lhs().nont()
+                self.__rule_lhs_group.append(self.__lhs_group.setdefault(nont, len(self.__lhs_group)))
+
+    # Invalidate compiled forms after structural modification.
+    def __modified(self):
+        self.__revision += 1
+        self.__compiled.clear()
+
+    def fingerprint(self):
+        """
+        :return: content hash of the grammar, i.e., of its start symbol, rules (incl. sDCP rules) and weights
+        :rtype: str
+        """
+        weights = self.weights()
+        revisions = self.__revision, self.__weights.revision
+        if self.__fingerprint is not None and self.__fingerprint[0] == revisions:
+            return self.__fingerprint[1]
+        if self.__rules_digest is None or self.__rules_digest[0] != self.__revision:
+            digest = hashlib.sha1(str(self.__start).encode('utf-8'))
+            for rule in self.rules():
+                digest.update(rule.key().encode('utf-8'))
+                digest.update(b'\n')
+            self.__rules_digest = self.__revision, digest
+        digest = self.__rules_digest[1].copy()
+        digest.update(weights)
+        self.__fingerprint = revisions, digest.hexdigest()
+        return self.__fingerprint[1]
+
+    def set_compiled_cache_dir(self, directory):
+        """
+        :param directory: directory in which persistent compiled forms are stored (cf. compiled), None to disable
+        :type directory: str
+        """
+        self.__compiled_dir = directory
+
+    def compiled(self, backend, compile, persistent=False):
+        """
+        Memoizes the compiled form of the grammar for some parser backend, e.g., the converted grammar together
+        with its symbol maps. The compiled form is recomputed if the grammar changed since, i.e., after add_rule,
+        purge_rules or a change of some rule weight.
+
+        :param backend: identifies the backend and all options the compiled form depends on
+        :type backend: hashable
+        :param compile: function that maps the grammar to its compiled form
+        :param persistent: also store the (picklable) compiled form in the directory set by set_compiled_cache_dir \
+            and reuse it from there across runs; requires backend to be a string
+        :type persistent: bool
+        :return: compiled form
+        """
+        fingerprint = self.fingerprint()
+        path = None
+        if persistent and self.__compiled_dir is not None:
+            path = os.path.join(self.__compiled_dir, backend + '-' + fingerprint + '.compiled')
+        entry = self.__compiled.get(backend)
+        if entry is not None and entry[0] == fingerprint:
+            compiled_form = entry[1]
+        elif path is not None and os.path.isfile(path):
+            with open(path, 'rb') as f:
+                compiled_form = pickle.load(f)
+        else:
+            compiled_form = compile(self)
+        if path is not None and not os.path.isfile(path):
+            with open(path, 'wb') as f:
+                pickle.dump(compiled_form, f)
+        self.__compiled[backend] = fingerprint, compiled_form
+        return compiled_form
+
+    # Read-only NumPy view on the weights of all rules in order of rule idx
+    # (cf. set_weights). The view reflects later changes of weights until
+    # the next add_rule or purge_rules.
+    # return: numpy.ndarray of float64
+    def weights(self):
+        self.__thaw()
+        view = self.__weights.view()
+        view.flags.writeable = False
+        return view
+
+    # Set the weights of all rules at once.
+    # weights: sequence of real in order of rule idx
+    def set_weights(self, weights):
+        self.__thaw()
+        view = self.__weights.view()
+        if len(weights) != len(view):
+            raise ValueError('expected ' + str(len(view)) + ' weights, got ' + str(len(weights)))
+        view[:] = weights
+        self.__weights.modified()
+
+    # LHS group of each rule in order of rule idx. Rules are grouped by
+    # their LHS nonterminal; groups are numbered by first occurrence.
+    # return: numpy.ndarray of int
+    def lhs_groups(self):
+        self.__thaw()
+        return np.array(self.__rule_lhs_group, dtype=np.intc)
+
+    # Whether rules are identified by interned integer keys.
+    # Only the rule keys are interned; rules and the per-rule indexes are the
+    # same Python objects as in non-interned grammars.
+    # return: bool
+    def interned(self):
+        return self.__interned
+
+    # Enumerator of nonterminals (interned grammars only).
+    # return: Enumerator
+    def nont_enumerator(self):
+        self.__thaw()
+        return self.__nont_enum
+
+    # Enumerator of terminals (interned grammars only).
+    # return: Enumerator
+    def terminal_enumerator(self):
+        self.__thaw()
+        return self.__term_enum
+
+    # LHS nonterminal id of each rule in order of rule idx
+    # (interned grammars only).
+    # return: array of int
+    def rule_lhs_ids(self):
+        self.__thaw()
+        return self.__rule_lhs
+
+    # RHS nonterminal ids of i-th rule (interned grammars only).
+    # i: int
+    # return: array of int
+    def rule_rhs_ids(self, int i):
+        self.__thaw()
+        return self.__rule_rhs[self.__rule_rhs_offsets[i]:self.__rule_rhs_offsets[i + 1]]
+
     # Get all nonterminals in grammar (LHS of rules).
     # return: list of LCFRS_rule
     def nonts(self):
@@ -462,6 +964,8 @@ class LCFRS(RTG_like):
     # nont: string
     # return: list of LCFRS_rule
     def nont_corner_of(self, str nont):
+        if self.__image is not None:
+            return LazyRules(self.__image_rule, self.__image.corner_group(nont))
         return self.__nont_corner_of[nont]
 
     # Return problems with grammar is any.
@@ -483,91 +987,165 @@ class LCFRS(RTG_like):
     # term: string
     # return: list of LCFRS_rule
     def lex_rules(self, str term):
+        if self.__image is not None:
+            return LazyRules(self.__image_rule, self.__image.lex_group(term))
         return self.__first_term_of[term]
 
     # Get epsilon rules.
     # return: list of LCFRS_rule
     def epsilon_rules(self):
+        if self.__image is not None:
+            return LazyRules(self.__image_rule, self.__image.epsilon_rules)
         return self.__epsilon_rules
 
     def purge_rules(self, threshold, feature_log=None):
         """
+        Removes all such rules at once and rebuilds the rule index and the auxiliary structures in a single pass.
+        The remaining rules keep their relative order and are re-indexed contiguously.
+
         :param threshold: remove rules with probability <= threshold from grammar
         :type threshold: float
+        :param feature_log: feature counts, keys that start with a rule idx are translated to the new rule idx \
+            (or dropped together with their rule) in place
+        :type feature_log: dict
+        :return: mapping from old rule idx to new rule idx of the remaining rules
+        :rtype: dict[int, int]
         """
+        cdef LCFRS_rule rule
+        idx_map = {}
+        self.__thaw()
+        self.__modified()
+        keep = np.logical_not(self.weights() <= threshold).tolist()
+        self.__key_to_rule = {key: rule for key, rule in self.__key_to_rule.items() if keep[rule.get_idx()]}
+        old_rules = self.__rules
+        self.__weights = WeightStore()
+        self.__rule_lhs_group = array('i')
+        self.__lhs_group = {}
+        if self.__interned:
+            old_lhs, old_rhs, old_offsets = self.__rule_lhs, self.__rule_rhs, self.__rule_rhs_offsets
+            self.__rule_lhs = array('i')
+            self.__rule_rhs_offsets = array('i', [0])
+            self.__rule_rhs = array('i')
+        self.__rules = []
+        self.__idx_to_rule = {}
+        self.__lhs_nont_to_rules = defaultdict(list)
+        self.__epsilon_rules = []
+        self.__first_term_of = defaultdict(list)
+        self.__nont_corner_of = defaultdict(list)
+
+        for rule in old_rules:
+            old_idx = rule.get_idx()
+            if not keep[old_idx]:
+                rule.bind_weight(None)
+                continue
+            rule.bind_weight(self.__weights)
+            idx_map[old_idx] = rule.get_idx()
+            self.__rules.append(rule)
+            self.__index_rule(rule)
+            if self.__interned:
+                self.__rule_lhs.append(old_lhs[old_idx])
+                self.__rule_rhs.extend(old_rhs[old_offsets[old_idx]:old_offsets[old_idx + 1]])
+                self.__rule_rhs_offsets.append(len(self.__rule_rhs))
+
         if feature_log is not None:
-            assert False
-        to_remove = []
-        i = 0
-        while i < len(self.__rules):
-            rule = self.__rules[i]
-            if rule.weight() <= threshold:
-                to_remove.append(rule)
-                self.__rules = self.__rules[:i] + self.__rules[i+1:]
-            else:
-                i += 1
-
-        # remove rule from auxiliary structures
-        for rule in to_remove:
-            del self.__idx_to_rule[rule.get_idx()]
-            self.__lhs_nont_to_rules[rule.lhs().nont()].remove(rule)
-            if rule.rank() > 0:
-                self.__nont_corner_of[rule.rhs_nont(0)].remove(rule)
-            elif rule.rank() == 0:
-                terms = rule.terms()
-                if terms:
-                    self.__first_term_of[terms[0]].remove(rule)
-
-        # rebuild rule index
-        new_index = {}
-        next_idx = 0
-        for idx in self.__idx_to_rule:
-            new_index[next_idx] = self.__idx_to_rule[idx]
-            new_index[next_idx].set_idx(next_idx)
-            next_idx += 1
-        self.__idx_to_rule = new_index
-        # TODO: handle features by building a translation dict: old idx -> new idx
+            rule_features = [(key, feature_log.pop(key)) for key in list(feature_log) if isinstance(key[0], int)]
+            for key, count in rule_features:
+                if key[0] in idx_map:
+                    feature_log[(idx_map[key[0]],) + key[1:]] = count
 
+        return idx_map
 
     # Adjust weights to make grammar proper.
     def make_proper(self):
-        for nont in self.__lhs_nont_to_rules:
-            rules = self.__lhs_nont_to_rules[nont]
-            if len(rules) > 0:
-                total = sum([rule.weight() for rule in rules])
-                for rule in rules:
-                    rule.set_weight(1.0 * rule.weight() / total)
-
-    # Join grammar into this.
-    # other: LCFRS
+        self.__thaw()
+        weights = self.__weights.view()
+        if len(weights) == 0:
+            return
+        groups = self.lhs_groups()
+        totals = np.bincount(groups, weights=weights)
+        if np.any(totals == 0.0):
+            raise ZeroDivisionError('rules of some nonterminal have total weight 0')
+        weights /= totals[groups]
+        self.__weights.modified()
+
     def add_gram(self, other, feature_logging=None):
-        if feature_logging is not None:
-            selfLog = feature_logging[0]
-            otherLog = feature_logging[1]
+        """
+        Joins the rules of the other grammar into this grammar; the weights of rules that occur in both grammars
+        are added. Rules are identified by the keys under which the other grammar stores them, hence no rule key
+        is recomputed (if both grammars are interned, the keys are translated to the symbol ids of this grammar).
+
+        :type other: LCFRS
+        :param feature_logging: pair of feature logs of this and the other grammar; the counts of the rule \
+            features of the other grammar are added to this feature log for the corresponding rules and their LHS
+        :type feature_logging: tuple
+        :return: mapping from rule idx in other grammar to rule idx in this grammar
+        :rtype: dict[int, int]
+        """
+        cdef LCFRS_rule other_rule
+        cdef LCFRS_rule rule
+        cdef dict nont_map = {}
+        cdef dict term_map = {}
+        cdef dict dcp_map = {}
+        self.__thaw()
+        other.__thaw()
+        self.__modified()
+        for nont, fanout in other.__nont_to_fanout.items():
+            if self.__nont_to_fanout.setdefault(nont, fanout) != fanout:
+                raise Exception('unexpected fanout of ' + nont)
+        translate = self.__interned and other.__interned
+        other_keys = {rule.get_idx(): key for key, rule in other.__key_to_rule.items()}
+
+        idx_map = {}
         for other_rule in other.__rules:
-            lhs = other_rule.lhs()
-            nonts = other_rule.rhs()
-            weight = other_rule.weight()
-            dcp = other_rule.dcp()
-            self_rule = self.add_rule(lhs, nonts, weight=weight, dcp=dcp)
-
-            if feature_logging is not None:
-                for key in otherLog:
-                    if key[0] == other_rule.get_idx():
-                        selfLog[(self_rule.get_idx(),) + key[1:]] += otherLog[key]
-                        selfLog[(lhs.nont(), key[1])] += otherLog[key]
-                        # for entry in zip(nonts, list(key[2])):
-                        #    selfLog[(entry[0],) + entry[1]] += 1
+            if translate:
+                key = translate_interned_key(other_keys[other_rule.get_idx()], nont_map, term_map, dcp_map,
+                                             other.__nont_enum, other.__term_enum, other.__dcp_enum,
+                                             self.__nont_enum, self.__term_enum, self.__dcp_enum)
+            elif self.__interned:
+                key = interned_rule_key(other_rule.lhs(), other_rule.rhs(), other_rule.dcp(),
+                                        self.__nont_enum, self.__term_enum, self.__dcp_enum)
+            elif other.__interned:
+                key = other_rule.key()
+            else:
+                key = other_keys[other_rule.get_idx()]
+            rule = self.__key_to_rule.get(key)
+            if rule is None:
+                rule = LCFRS_rule(other_rule.lhs(), weight=other_rule.weight(), dcp=other_rule.dcp())
+                for nont in other_rule.rhs():
+                    rule.add_rhs_nont(nont)
+                self.__store_rule(rule, key)
+            else:
+                rule.add_weight(other_rule.weight())
+            idx_map[other_rule.get_idx()] = rule.get_idx()
+
+        if self.__start is None and len(other.__rules) > 0:
+            self.__start = other.__rules[0].lhs().nont()
+            if self.__nont_to_fanout[self.__start] != 1:
+                raise Exception('start symbol should have fanout 1')
+
+        if feature_logging is not None:
+            self_log, other_log = feature_logging
+            rule_features = defaultdict(list)
+            for key, count in other_log.items():
+                if isinstance(key[0], int):
+                    rule_features[key[0]].append((key, count))
+            for other_rule in other.__rules:
+                nont = other_rule.lhs().nont()
+                for key, count in rule_features[other_rule.get_idx()]:
+                    self_log[(idx_map[key[0]],) + key[1:]] += count
+                    self_log[(nont, key[1])] += count
+
+        return idx_map
 
     # String representation. First print rules for start symbol.
     # Otherwise leave order unchanged.
     # return: string
     def __str__(self):
         s = ''
-        for rule in self.__lhs_nont_to_rules[self.start()]:
+        for rule in self.lhs_nont_to_rules(self.start()):
             if rule.lhs().nont() == self.start():
                 s += str(rule) + '\n'
-        for rule in self.__rules:
+        for rule in self.rules():
             if rule.lhs().nont() != self.start():
                 s += str(rule) + '\n'
         return s
@@ -577,6 +1155,8 @@ class LCFRS(RTG_like):
         :param nont:
         :rtype: list[LCFRS_rule]
         """
+        if self.__image is not None:
+            return LazyRules(self.__image_rule, self.__image.lhs_group(nont))
         return self.__lhs_nont_to_rules[nont]
 
 
@@ -0,0 +1,374 @@
+# Binary image of an LCFRS/sDCP hybrid grammar.
+#
+# An image is a single file that is loaded through mmap. It starts with the
+# magic bytes, a format version, and the length of a JSON header. The header
+# holds the scalar properties of the grammar (start symbol, unit, ...) and
+# the location of each section. A section is a flat array of int32 ('i'),
+# float64 ('d') or bytes ('B') in native byte order, aligned to 8 bytes.
+#
+# Symbol tables (nonterminals, terminals, sDCP labels) are stored as a
+# utf-8 blob plus offsets. Rule i consists of
+#   weight      weights[i]
+#   lhs         rule_lhs[i] (nonterminal id)
+#   rhs         rule_rhs[rule_rhs_offsets[i]:rule_rhs_offsets[i+1]]
+#   components  arg_offsets[rule_arg_offsets[i]:rule_arg_offsets[i+1]+1]
+#               are the boundaries of its LHS arguments in arg_elems,
+#               where an element is a terminal id (>= 0) or a variable
+#               <mem,arg> encoded as -1 - (mem << 16 | arg)
+#   sDCP        rule_dcp[i] is an index into dcp_offsets/dcp_code or -1
+# The LHS, first-terminal and corner indices of the grammar are stored as
+# rule ids grouped by nonterminal/terminal, so that none of them has to be
+# recomputed when loading.
+
+from __future__ import print_function
+from array import array
+import json
+import mmap
+import struct
+import sys
+from grammar.dcp import DCP_rule, DCP_var, DCP_index, DCP_string, DCP_term, dcp_rules_to_key
+
+MAGIC = b'LCFRSIMG'
+VERSION = 1
+_PREAMBLE = struct.Struct('<8sII')
+_ALIGNMENT = 8
+
+# Tags of the sDCP term encoding.
+DCP_VAR = 0
+DCP_INDEX = 1
+DCP_STRING = 2
+DCP_TERM = 3
+
+
+def encode_var(mem, arg):
+    return -1 - (mem << 16 | arg)
+
+
+def decode_var(code):
+    code = -1 - code
+    return code >> 16, code & 0xFFFF
+
+
+def is_grammar_image(path):
+    """
+    :param path: path to a file
+    :type path: str
+    :return: whether the file starts with the magic bytes of a grammar image
+    :rtype: bool
+    """
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class _SymbolTable(object):
+    def __init__(self):
+        self.index = {}
+        self.symbols = []
+
+    def __call__(self, symbol):
+        if symbol not in self.index:
+            self.index[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return self.index[symbol]
+
+    def arrays(self):
+        blob = bytearray()
+        offsets = array('i', [0])
+        for symbol in self.symbols:
+            blob += symbol.encode('utf-8')
+            offsets.append(len(blob))
+        return array('B', bytes(blob)), offsets
+
+
+def _encode_dcp_object(obj, labels, code):
+    if isinstance(obj, DCP_var):
+        code.extend([DCP_VAR, obj.mem(), obj.arg()])
+    elif isinstance(obj, DCP_index):
+        code.extend([DCP_INDEX, obj.index(), -1 if obj.edge_label() is None else labels(obj.edge_label())])
+    elif isinstance(obj, DCP_string):
+        code.extend([DCP_STRING, labels(obj.get_string()),
+                     -1 if obj.edge_label() is None else labels(obj.edge_label())])
+    elif isinstance(obj, DCP_term):
+        code.append(DCP_TERM)
+        _encode_dcp_object(obj.head(), labels, code)
+        code.append(len(obj.arg()))
+        for child in obj.arg():
+            _encode_dcp_object(child, labels, code)
+    else:
+        raise TypeError('cannot encode sDCP object ' + str(obj))
+
+
+def encode_dcp(dcp, labels, code):
+    """
+    Appends the integer encoding of a list of sDCP rules to code.
+    :type dcp: list[DCP_rule]
+    :param labels: symbol table for strings and edge labels
+    :type code: array
+    """
+    code.append(len(dcp))
+    for dcp_rule in dcp:
+        code.extend([dcp_rule.lhs().mem(), dcp_rule.lhs().arg(), len(dcp_rule.rhs())])
+        for obj in dcp_rule.rhs():
+            _encode_dcp_object(obj, labels, code)
+
+
+def _decode_dcp_object(code, pos, label):
+    tag = code[pos]
+    if tag == DCP_VAR:
+        return DCP_var(code[pos + 1], code[pos + 2]), pos + 3
+    elif tag == DCP_INDEX:
+        return DCP_index(code[pos + 1], label(code[pos + 2])), pos + 3
+    elif tag == DCP_STRING:
+        return DCP_string(label(code[pos + 1]), label(code[pos + 2])), pos + 3
+    elif tag == DCP_TERM:
+        head, pos = _decode_dcp_object(code, pos + 1, label)
+        children = []
+        n_children = code[pos]
+        pos += 1
+        for _ in range(n_children):
+            child, pos = _decode_dcp_object(code, pos, label)
+            children.append(child)
+        return DCP_term(head, children), pos
+    else:
+        raise ValueError('corrupt sDCP encoding: unknown tag ' + str(tag))
+
+
+def decode_dcp(code, pos, label):
+    """
+    Inverse of encode_dcp.
+    :param code: integer encoding
+    :param pos: start of the encoded list in code
+    :param label: maps label id to string (or None for -1)
+    :rtype: list[DCP_rule]
+    """
+    dcp = []
+    n_rules = code[pos]
+    pos += 1
+    for _ in range(n_rules):
+        lhs = DCP_var(code[pos], code[pos + 1])
+        n_rhs = code[pos + 2]
+        pos += 3
+        rhs = []
+        for _ in range(n_rhs):
+            obj, pos = _decode_dcp_object(code, pos, label)
+            rhs.append(obj)
+        dcp.append(DCP_rule(lhs, rhs))
+    return dcp
+
+
+def _group(keys, n_groups):
+    # rule ids grouped by key (counting sort, stable)
+    offsets = array('i', [0]) * (n_groups + 1)
+    for key in keys:
+        offsets[key + 1] += 1
+    for i in range(n_groups):
+        offsets[i + 1] += offsets[i]
+    ids = array('i', [0]) * offsets[n_groups]
+    fill = array('i', offsets[:n_groups])
+    for rule_id, key in enumerate(keys):
+        ids[fill[key]] = rule_id
+        fill[key] += 1
+    return offsets, ids
+
+
+def write_grammar_image(grammar, path):
+    """
+    Writes grammar as binary image to path.
+    :type grammar: LCFRS
+    :type path: str
+    """
+    nonts = _SymbolTable()
+    terms = _SymbolTable()
+    labels = _SymbolTable()
+    dcps = {}
+
+    start = -1 if grammar.start() is None else nonts(grammar.start())
+    for nont in grammar.nonts():
+        nonts(nont)
+
+    weights = array('d')
+    rule_lhs = array('i')
+    rule_rhs_offsets = array('i', [0])
+    rule_rhs = array('i')
+    rule_arg_offsets = array('i', [0])
+    arg_offsets = array('i', [0])
+    arg_elems = array('i')
+    rule_dcp = array('i')
+    dcp_offsets = array('i', [0])
+    dcp_code = array('i')
+    first_terms = []
+    corners = []
+    epsilon_rules = array('i')
+
+    for i, rule in enumerate(grammar.rules()):
+        if rule.get_idx() != i:
+            raise ValueError('rule idx ' + str(rule.get_idx()) + ' at position ' + str(i))
+        weights.append(rule.weight())
+        rule_lhs.append(nonts(rule.lhs().nont()))
+        for nont in rule.rhs():
+            rule_rhs.append(nonts(nont))
+        rule_rhs_offsets.append(len(rule_rhs))
+        first_term = -1
+        for arg in rule.lhs().args():
+            for elem in arg:
+                if isinstance(elem, str):
+                    arg_elems.append(terms(elem))
+                    if first_term < 0:
+                        first_term = arg_elems[-1]
+                else:
+                    arg_elems.append(encode_var(elem.mem, elem.arg))
+            arg_offsets.append(len(arg_elems))
+        rule_arg_offsets.append(len(arg_offsets) - 1)
+        if rule.dcp() is None:
+            rule_dcp.append(-1)
+        else:
+            key = dcp_rules_to_key(rule.dcp())
+            if key not in dcps:
+                dcps[key] = len(dcps)
+                encode_dcp(rule.dcp(), labels, dcp_code)
+                dcp_offsets.append(len(dcp_code))
+            rule_dcp.append(dcps[key])
+        if rule.rank() == 0:
+            first_terms.append(first_term)
+            corners.append(-1)
+            if first_term < 0:
+                epsilon_rules.append(i)
+        else:
+            first_terms.append(-1)
+            corners.append(rule_rhs[rule_rhs_offsets[i]])
+
+    lhs_offsets, lhs_rules = _group(rule_lhs, len(nonts.symbols))
+    lex_offsets, lex_rules = _group([t if t >= 0 else len(terms.symbols) for t in first_terms],
+                                    len(terms.symbols) + 1)
+    corner_offsets, corner_rules = _group([c if c >= 0 else len(nonts.symbols) for c in corners],
+                                          len(nonts.symbols) + 1)
+    nont_blob, nont_offsets = nonts.arrays()
+    term_blob, term_offsets = terms.arrays()
+    label_blob, label_offsets = labels.arrays()
+    nont_fanout = array('i', [grammar.fanout(nont) for nont in nonts.symbols])
+
+    sections = [('nont_blob', nont_blob), ('nont_offsets', nont_offsets), ('nont_fanout', nont_fanout),
+                ('term_blob', term_blob), ('term_offsets', term_offsets),
+                ('label_blob', label_blob), ('label_offsets', label_offsets),
+                ('weights', weights), ('rule_lhs', rule_lhs),
+                ('rule_rhs_offsets', rule_rhs_offsets), ('rule_rhs', rule_rhs),
+                ('rule_arg_offsets', rule_arg_offsets), ('arg_offsets', arg_offsets), ('arg_elems', arg_elems),
+                ('rule_dcp', rule_dcp), ('dcp_offsets', dcp_offsets), ('dcp_code', dcp_code),
+                ('lhs_offsets', lhs_offsets), ('lhs_rules', lhs_rules),
+                ('lex_offsets', lex_offsets), ('lex_rules', lex_rules),
+                ('corner_offsets', corner_offsets), ('corner_rules', corner_rules),
+                ('epsilon_rules', epsilon_rules)]
+
+    header = {'byteorder': sys.byteorder,
+              'start': start,
+              'unit': grammar.unit(),
+              'interned': grammar.interned(),
+              'rules': len(weights),
+              'sections': {}}
+    # section offsets are relative to the (aligned) end of the header
+    position = 0
+    for name, data in sections:
+        header['sections'][name] = [position, data.typecode, len(data)]
+        position += len(data) * data.itemsize
+        position += -position % _ALIGNMENT
+    header_bytes = json.dumps(header).encode('utf-8')
+
+    with open(path, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b'\0' * (-f.tell() % _ALIGNMENT))
+        base = f.tell()
+        for name, data in sections:
+            assert f.tell() - base == header['sections'][name][0]
+            data.tofile(f)
+            f.write(b'\0' * (-f.tell() % _ALIGNMENT))
+
+
+class GrammarImage(object):
+    """
+    Read-only view of a grammar image. Sections are exposed as memoryviews of
+    the mapped file, i.e., nothing but the symbol tables is decoded on loading.
+    """
+    def __init__(self, path):
+        self.__file = open(path, 'rb')
+        self.__mmap = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_length = _PREAMBLE.unpack_from(self.__mmap, 0)
+        if magic != MAGIC:
+            raise IOError(path + ' is not a grammar image')
+        if version != VERSION:
+            raise IOError('unsupported grammar image version ' + str(version) + ' in ' + path)
+        header_end = _PREAMBLE.size + header_length
+        self.__header = json.loads(self.__mmap[_PREAMBLE.size:header_end].decode('utf-8'))
+        if self.__header['byteorder'] != sys.byteorder:
+            raise IOError(path + ' was written with byte order ' + self.__header['byteorder'])
+        base = header_end + (-header_end % _ALIGNMENT)
+        buffer = memoryview(self.__mmap)
+        for name, (offset, typecode, length) in self.__header['sections'].items():
+            size = length * array(typecode).itemsize
+            setattr(self, name, buffer[base + offset:base + offset + size].cast(typecode))
+
+        self.nonts = self.__decode_table(self.nont_blob, self.nont_offsets)
+        self.terms = self.__decode_table(self.term_blob, self.term_offsets)
+        self.labels = self.__decode_table(self.label_blob, self.label_offsets)
+        self.nont_index = {nont: i for i, nont in enumerate(self.nonts)}
+        self.term_index = {term: i for i, term in enumerate(self.terms)}
+
+    @staticmethod
+    def __decode_table(blob, offsets):
+        data = blob.tobytes()
+        return [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+    def start(self):
+        start = self.__header['start']
+        return None if start < 0 else self.nonts[start]
+
+    def unit(self):
+        return self.__header['unit']
+
+    def interned(self):
+        return self.__header['interned']
+
+    def n_rules(self):
+        return self.__header['rules']
+
+    def label(self, i):
+        return None if i < 0 else self.labels[i]
+
+    def dcp(self, i):
+        """
+        :param i: sDCP id of a rule (cf. rule_dcp)
+        :rtype: list[DCP_rule] | None
+        """
+        if i < 0:
+            return None
+        return decode_dcp(self.dcp_code, self.dcp_offsets[i], self.label)
+
+    def lhs_group(self, nont):
+        """
+        :return: ids of the rules with nont on the LHS
+        """
+        i = self.nont_index.get(nont)
+        if i is None:
+            return []
+        return self.lhs_rules[self.lhs_offsets[i]:self.lhs_offsets[i + 1]]
+
+    def lex_group(self, term):
+        """
+        :return: ids of the rank-0 rules whose first terminal is term
+        """
+        i = self.term_index.get(term)
+        if i is None:
+            return []
+        return self.lex_rules[self.lex_offsets[i]:self.lex_offsets[i + 1]]
+
+    def corner_group(self, nont):
+        """
+        :return: ids of the rules with nont as first RHS nonterminal
+        """
+        i = self.nont_index.get(nont)
+        if i is None:
+            return []
+        return self.corner_rules[self.corner_offsets[i]:self.corner_offsets[i + 1]]
+
+
+__all__ = ["write_grammar_image", "GrammarImage", "is_grammar_image"]
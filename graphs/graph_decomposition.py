@@ -3,7 +3,9 @@ from graphs.dog import DirectedOrderedGraph, DeepSyntaxGraph
 from grammar.lcfrs import LCFRS, LCFRS_lhs, LCFRS_var
 from grammar.lcfrs_derivation import LCFRSDerivation
 from grammar.induction.decomposition import join_spans
+from grammar.induction.parallel_induction import induce_in_parallel, DEFAULT_SHARD_SIZE
 from copy import deepcopy
+from functools import partial
 
 
 def upward_closure(dog, nodes):
@@ -69,20 +71,33 @@ def compute_decomposition(dsg, recursive_partitioning):
 
 
 def induction_on_a_corpus(dsgs, rec_part_strategy, nonterminal_labeling, terminal_labeling, start="START",
-                          normalize=True):
-    grammar = LCFRS(start=start)
-    for dsg in dsgs:
-        rec_part = rec_part_strategy(dsg)
-        # if calc_fanout(rec_part) > 1 or calc_rank(rec_part) > 2:
-        #     rec_part = rec_part_strategy(dsg)
-        #     assert False
-        decomp = compute_decomposition(dsg, rec_part)
-        dsg_grammar = induce_grammar_from(dsg, rec_part, decomp, nonterminal_labeling, terminal_labeling, terminal_labeling, start,
-                                          normalize)
-        grammar.add_gram(dsg_grammar)
+                          normalize=True, n_workers=1, shard_size=DEFAULT_SHARD_SIZE):
+    """
+    :param n_workers: number of processes among which the corpus is sharded (None: number of CPUs); \
+        the induced grammar does not depend on it
+    :type n_workers: int
+    :param shard_size: number of graphs per shard
+    :type shard_size: int
+    :rtype: LCFRS
+    """
+    induce = partial(induce_dsg_grammar, rec_part_strategy=rec_part_strategy,
+                     nonterminal_labeling=nonterminal_labeling, terminal_labeling=terminal_labeling, start=start,
+                     normalize=normalize)
+    _, grammar, _ = induce_in_parallel(dsgs, induce, start, n_workers, shard_size)
     return grammar
 
 
+def induce_dsg_grammar(dsg, rec_part_strategy, nonterminal_labeling, terminal_labeling, start="START",
+                       normalize=True):
+    rec_part = rec_part_strategy(dsg)
+    # if calc_fanout(rec_part) > 1 or calc_rank(rec_part) > 2:
+    #     rec_part = rec_part_strategy(dsg)
+    #     assert False
+    decomp = compute_decomposition(dsg, rec_part)
+    return induce_grammar_from(dsg, rec_part, decomp, nonterminal_labeling, terminal_labeling, terminal_labeling,
+                               start, normalize)
+
+
 def consecutive_spans(positions):
     if len(positions) == 0:
         return 0
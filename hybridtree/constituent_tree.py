@@ -115,8 +115,13 @@ class ConstituentTree(HybridTree):
                       #                      [y[1]] + [-y[2]] + y[3:] + [y[0]])
                       key=lambda x: [tuple(x[1:]), x[0]])
 
+    def freeze(self):
+        from hybridtree.frozen_hybrid_tree import FrozenConstituentTree
+        return FrozenConstituentTree(self)
+
     def strip_vroot(self):
         if (len(self.root) == 1) and self.node_token(self.root[0]).type() == "CONSTITUENT-CATEGORY" and self.node_token(self.root[0]).category() == "VROOT":
+            self._invalidate_caches()
             old_root = self.root[0]
             new_roots = self.children(old_root)
             self._id_to_child_ids[self.virtual_root] = new_roots
@@ -0,0 +1,572 @@
+#-*- coding: utf-8 -*-
+# Immutable, array-backed hybrid trees for read-only corpus processing.
+#
+# A FrozenHybridTree is obtained by HybridTree.freeze(). Nodes are numbered
+# consecutively, where 0 is the virtual root. The parent-child relation is
+# kept in integer arrays (child lists of node i are children[child_offsets[i]:
+# child_offsets[i + 1]]), tokens in a table indexed by node number. Positions
+# in the ordering and the number of spans are precomputed, such that the
+# corresponding queries are O(1). The read API is that of HybridTree; node
+# ids passed to or returned from it are the ids of the original tree.
+
+from array import array
+from hybridtree.general_hybrid_tree import HybridTree, YieldView
+from hybridtree.monadic_tokens import MonadicToken
+from grammar.induction.decomposition import join_spans
+
+
+class FrozenHybridTree(object):
+    """
+    Read-only counterpart of HybridTree, cf. HybridTree.freeze().
+    """
+    __slots__ = ('_sent_label', '_ids', '_numbers', '_tokens', '_nodes', '_parents', '_child_offsets',
+                 '_children', '_ordered', '_full', '_order_index', '_full_index', '_n_spans', '_token_yield',
+                 '_full_token_yield')
+
+    virtual_root = 'VROOT'
+
+    def __init__(self, tree):
+        """
+        :param tree: hybrid tree to be copied
+        :type tree: HybridTree
+        """
+        self._sent_label = tree.sent_label()
+        self._nodes = tuple(tree.nodes())
+
+        # node number -> node id (original), and inverse
+        ids = [self.virtual_root]
+        numbers = {self.virtual_root: 0}
+
+        def number(id):
+            if id not in numbers:
+                numbers[id] = len(ids)
+                ids.append(id)
+            return numbers[id]
+
+        for id in self._nodes:
+            number(id)
+        stack = [self.virtual_root]
+        while stack:
+            for child in tree.children(stack.pop()):
+                if child not in numbers:
+                    stack.append(child)
+                number(child)
+        for id in tree.full_yield():
+            number(id)
+        self._ids = ids
+        self._numbers = numbers
+        n = len(ids)
+
+        token_map = dict((id, tree.node_token(id)) for id in self._nodes)
+        self._tokens = [token_map.get(id) for id in ids]
+
+        self._parents = array('i', [-1]) * n
+        self._child_offsets = array('i', [0])
+        self._children = array('i')
+        for i, id in enumerate(ids):
+            self._children.extend(numbers[child] for child in tree.children(id))
+            self._child_offsets.append(len(self._children))
+        for i, id in enumerate(ids):
+            parent = tree.parent(id)
+            if parent is not None:
+                self._parents[i] = numbers[parent]
+            elif id in tree.root:
+                self._parents[i] = 0
+
+        self._ordered = array('i', (numbers[id] for id in tree.id_yield()))
+        self._full = array('i', (numbers[id] for id in tree.full_yield()))
+        self._order_index = self.__index_array(self._ordered, n)
+        self._full_index = self.__index_array(self._full, n)
+        self._token_yield = YieldView([self._tokens[i] for i in self._ordered])
+        self._full_token_yield = YieldView([self._tokens[i] for i in self._full])
+
+        # fringes as bitsets (bit i is set iff i is in fringe), computed bottom-up
+        masks = [None] * n
+
+        def mask(i):
+            if masks[i] is None:
+                m = 0
+                if self._order_index[i] >= 0:
+                    m = 1 << self._order_index[i]
+                for child in self._child_range(i):
+                    m |= mask(child)
+                masks[i] = m
+            return masks[i]
+
+        self._n_spans = array('i', [0]) * n
+        for i in range(n):
+            m = mask(i)
+            # each span corresponds to a set bit whose lower neighbour is not set
+            self._n_spans[i] = bin(m & ~(m << 1)).count('1')
+
+    @staticmethod
+    def __index_array(positions, n):
+        indices = array('i', [-1]) * n
+        for index in range(len(positions) - 1, -1, -1):
+            indices[positions[index]] = index
+        return indices
+
+    def freeze(self):
+        return self
+
+    def _number(self, id):
+        """
+        :param id: node id
+        :return: number of node, or -1 if there is no such node
+        :rtype: int
+        """
+        return self._numbers.get(id, -1)
+
+    def _child_range(self, i):
+        return self._children[self._child_offsets[i]:self._child_offsets[i + 1]]
+
+    def _fringe(self, i):
+        """
+        :param i: node number
+        :type i: int
+        :return: indices (w.r.t. ordering) of the nodes of the subtree at i in pre-order
+        :rtype: list[int]
+        """
+        fringe = []
+        stack = [i]
+        while stack:
+            j = stack.pop()
+            if self._order_index[j] >= 0:
+                fringe.append(self._order_index[j])
+            stack.extend(reversed(self._child_range(j)))
+        return fringe
+
+    def sent_label(self):
+        """
+        :rtype: str
+        :return: name of the sentence
+        """
+        return self._sent_label
+
+    @property
+    def root(self):
+        """
+        :rtype: list of str
+        :return: Id of root.
+        """
+        return self.children(self.virtual_root)
+
+    def parent(self, id):
+        """
+        :rtype: str
+        :param id: node id
+        :type id: str
+        :return: id of parent node, or None.
+        """
+        i = self._number(id)
+        if i < 0 or self._parents[i] <= 0:
+            return None
+        return self._ids[self._parents[i]]
+
+    def reentrant(self):
+        """
+        :rtype: bool
+        :return: Is there node that is child of two nodes?
+        """
+        return len(set(self._children)) < len(self._children)
+
+    def children(self, id):
+        """
+        :rtype: list[str]
+        :param id: str
+        :return: Get the list of node ids of child nodes, or the empty list.
+        """
+        i = self._number(id)
+        if i < 0:
+            return []
+        return [self._ids[child] for child in self._child_range(i)]
+
+    def descendants(self, id):
+        """
+        :param id: node id
+        :type id: str
+        :return: the list of node ids of all "transitive" children (in pre-order)
+        :rtype: list[str]
+        """
+        i = self._number(id)
+        if i < 0:
+            return []
+        des = []
+        stack = list(reversed(self._child_range(i)))
+        while stack:
+            j = stack.pop()
+            des.append(self._ids[j])
+            stack.extend(reversed(self._child_range(j)))
+        return des
+
+    def in_ordering(self, id):
+        """
+        :param id: node id
+        :type id: str
+        :return: Is the node in the ordering?
+        :rtype: bool
+        """
+        i = self._number(id)
+        return i >= 0 and self._order_index[i] >= 0
+
+    def disconnected(self, id):
+        """
+        :param id: node id
+        :type id: str
+        :return: Is the node in the yield, but not connected to the root?
+        :rtype: bool
+        """
+        i = self._number(id)
+        return i >= 0 and self._full_index[i] >= 0 and self._order_index[i] < 0
+
+    def index_node(self, index):
+        """
+        :param index: index in ordering
+        :type index: int
+        :return: node id at index in ordering
+        :rtype: str
+        """
+        return self._ids[self._ordered[index - 1]]
+
+    def node_index(self, id):
+        """
+        :param id: node id
+        :type id: str
+        :return: index of node in ordering
+        :rtype: int
+        """
+        i = self._number(id)
+        if i < 0 or self._order_index[i] < 0:
+            raise ValueError(str(id) + ' is not in ordering')
+        return self._order_index[i]
+
+    def node_index_full(self, id):
+        """
+        :param id: node id
+        :type id: str
+        :return: index of node in full_yield
+        :rtype: int
+        """
+        i = self._number(id)
+        if i < 0 or self._full_index[i] < 0:
+            raise ValueError(str(id) + ' is not in full yield')
+        return self._full_index[i]
+
+    def fringe(self, id):
+        """
+        :param id: node id
+        :type id: str
+        :return: indices (w.r.t. ordering) of all nodes under some node, cf. \Pi^{-1} in paper
+        :rtype: list[int]
+        List of indices (w.r.t. ordering) obtained by pre-order traversal over the subtree starting at id.
+        """
+        i = self._number(id)
+        if i < 0:
+            return []
+        return self._fringe(i)
+
+    def n_spans(self, id):
+        """
+        :param id: node id
+        :type id: str
+        :return: Number of contiguous spans of node.
+        :rtype : int
+        """
+        i = self._number(id)
+        return 0 if i < 0 else self._n_spans[i]
+
+    def max_n_spans(self):
+        """
+        :return: Maximum number of spans of any node.
+        :rtype: int
+        """
+        nums = [self.n_spans(id) for id in self._nodes]
+        if len(nums) > 0:
+            return max(nums)
+        else:
+            return 1
+
+    def n_gaps(self):
+        """
+        :return: Total number of gaps in any node.
+        :rtype: int
+        """
+        n_gaps = 0
+        stack = [0]
+        while stack:
+            i = stack.pop()
+            n_gaps += self._n_spans[i] - 1
+            stack.extend(self._child_range(i))
+        return n_gaps
+
+    def unlabelled_structure(self):
+        """
+        :return: pair consisting of (root and list of child nodes)
+        :rtype: tuple[list[str], list]
+        Create unlabelled structure, only in terms of breakup of yield
+        """
+        return self.__unlabelled_structure_rec(0)
+
+    def unlabelled_structure_recur(self, id):
+        return self.__unlabelled_structure_rec(self._numbers[id])
+
+    def __unlabelled_structure_rec(self, i):
+        head = set(self._fringe(i))
+        tail = [self.__unlabelled_structure_rec(child) for child in self._child_range(i)]
+        # remove useless step
+        if len(tail) == 1 and head == tail[0][0]:
+            return tail[0]
+        else:
+            return head, tail
+
+    def recursive_partitioning(self):
+        return self.__recursive_partitioning_rec(0)
+
+    def recursive_partitioning_rec(self, id):
+        return self.__recursive_partitioning_rec(self._numbers[id])
+
+    def __recursive_partitioning_rec(self, i):
+        head = set(self._fringe(i))
+        if self._order_index[i] >= 0:
+            tail = [({self._order_index[i]}, [])]
+        else:
+            tail = []
+        tail += [self.__recursive_partitioning_rec(child) for child in self._child_range(i)]
+        if len(tail) == 1 and head == tail[0][0]:
+            return tail[0]
+        else:
+            tail.sort(key=lambda elem: min(elem[0]))
+            return head, tail
+
+    def node_id_rec_par(self, rec_par):
+        (head, tail) = rec_par
+        head = [self.index_node(x + 1) for x in head]
+        tail = [self.node_id_rec_par(child) for child in tail]
+        return head, tail
+
+    def id_yield(self):
+        """
+        :return: list of node ids that are in the ordering and connected to root
+        :rtype: list[str]
+        """
+        return [self._ids[i] for i in self._ordered]
+
+    def full_yield(self):
+        """
+        :return: list of node ids that are in the ordering (including disconnected nodes)
+        :rtype: list[str]
+        """
+        return [self._ids[i] for i in self._full]
+
+    def token_yield(self):
+        """
+        :return: Get yield as list of all labels of nodes, that are in the ordering and connected to the root.
+        :rtype: YieldView
+        """
+        return self._token_yield
+
+    def full_token_yield(self):
+        """
+        :return: Get yield as list of labels of nodes, that are in the ordering (including disconnected nodes).
+        :rtype: YieldView
+        """
+        return self._full_token_yield
+
+    def nodes(self):
+        """
+        :return: ids of all nodes.
+        :rtype: tuple[str]
+        """
+        return self._nodes
+
+    def node_token(self, id):
+        """
+        :param id: node id
+        :type id: str
+        :return: token at node id
+        :rtype: MonadicToken
+        Query the token of node id.
+        """
+        i = self._number(id)
+        if i < 0 or self._tokens[i] is None:
+            raise KeyError(id)
+        return self._tokens[i]
+
+    def complete(self):
+        """
+        :return: Does yield cover whole string?
+        :rtype: bool
+        """
+        return len(self._fringe(0)) == len(self._ordered)
+
+    def n_nodes(self):
+        """
+        :return: Number of nodes in tree that are connected to the root (or the root itself).
+        :rtype: int
+        """
+        n = 0
+        stack = [0]
+        while stack:
+            children = self._child_range(stack.pop())
+            n += len(children)
+            stack.extend(children)
+        return n
+
+    def empty_fringe(self):
+        """
+        :rtype: bool
+        Is there any non-ordered node without children?
+        Includes the case the root has no children.
+        """
+        for id in self._nodes:
+            i = self._numbers[id]
+            if self._child_offsets[i] == self._child_offsets[i + 1] and self._full_index[i] < 0:
+                return True
+        return len(self._fringe(0)) == 0
+
+    def siblings(self, id):
+        """
+        :param id: node id
+        :type id: str
+        :return: list of node ids
+        :rtype: list[str]
+        The siblings of id, i.e. the children of id's parent (including id),
+        ordered from left to right. If id is the root, then [root] is returned
+        """
+        root = self.root
+        if id in root:
+            return root
+        parent = self.parent(id)
+        if not parent:
+            raise Exception('non-root node has no parent!')
+        return self.children(parent)
+
+    def __hybrid_tree_str(self, i, level):
+        s = level * ' ' + str(self._tokens[i]) + '\n'
+        for child in self._child_range(i):
+            s += self.__hybrid_tree_str(child, level + 1)
+        return s
+
+    def __str__(self):
+        return ''.join([self.__hybrid_tree_str(i, 0) for i in self._child_range(0)])
+
+    def __eq__(self, other):
+        if not isinstance(other, (HybridTree, FrozenHybridTree)):
+            return False
+        return all([self.compare_recursive(other, self_node, other_node) for self_node, other_node in
+                    zip(self.root, other.root)])
+
+    def __hash__(self):
+        return hash((tuple(self.token_yield()), tuple([self.__hash_recursive(i) for i in self._child_range(0)])))
+
+    def __hash_recursive(self, i):
+        return hash((self._tokens[i], tuple([self.__hash_recursive(child) for child in self._child_range(i)])))
+
+    def compare_recursive(self, other, self_node, other_node):
+        """
+        Synchronously traverses two hybrid trees and compares the labels, pos-tags, deprels, position in ordering and
+        number of children at each position, cf. HybridTree.compare_recursive.
+
+        :type other: HybridTree | FrozenHybridTree
+        :rtype: bool
+        """
+        if not self.node_token(self_node).__eq__(other.node_token(other_node)):
+            return False
+        if self.in_ordering(self_node):
+            if other.in_ordering(other_node):
+                if self.node_index_full(self_node) != other.node_index(other_node):
+                    return False
+            else:
+                return False
+        elif other.in_ordering(other_node):
+            return False
+
+        if not len(self.children(self_node)) == len(other.children(other_node)):
+            return False
+
+        return all([self.compare_recursive(other, self_child, other_child) for
+                    self_child, other_child in zip(self.children(self_node), other.children(other_node))])
+
+
+class FrozenConstituentTree(FrozenHybridTree):
+    """
+    Read-only counterpart of ConstituentTree, cf. ConstituentTree.freeze().
+    """
+    __slots__ = ()
+
+    # All leaves of tree.
+    # return: list of triples.
+    def leaves(self):
+        return [(id, self.leaf_pos(id), self.leaf_word(id)) for id in self.full_yield()]
+
+    # Is leaf? (This is, the id occurs in the list of leaves.)
+    # id: string
+    # return: bool
+    def is_leaf(self, id):
+        i = self._number(id)
+        return i >= 0 and self._full_index[i] >= 0
+
+    # Get leaf for index.
+    # index: int
+    # return: triple
+    def index_leaf(self, index):
+        return self.index_node(index)
+
+    # Get index for id of leaf.
+    # id: string
+    # return: int
+    def leaf_index(self, id):
+        return self.node_index(id)
+
+    # Get part of speech of node.
+    # id: string
+    # return: string
+    def leaf_pos(self, id):
+        return self.node_token(id).pos()
+
+    # Get word of node.
+    # id: string
+    # return: string
+    def leaf_word(self, id):
+        return self.node_token(id).form()
+
+    # Get yield as list of words, omitting punctuation.
+    # return: list of string
+    def word_yield(self):
+        return [token.form() for token in self.token_yield()]
+
+    # Get yield as list of pos, omitting punctuation.
+    # return: list of string
+    def pos_yield(self):
+        return [token.pos() for token in self.token_yield()]
+
+    # Get label of (non-leaf) node.
+    # id: string
+    # return: string
+    def label(self, id):
+        return str(self.node_token(id))
+
+    # Get ids of all internal nodes.
+    # return: list of string
+    def ids(self):
+        return [n for n in self._nodes if not self.is_leaf(n)]
+
+    def n_nodes(self):
+        return FrozenHybridTree.n_nodes(self) + 1
+
+    def labelled_spans(self):
+        """
+        :return: list of spans (each of which is string plus an even number of (integer) positions)
+        Labelled spans, cf. ConstituentTree.labelled_spans.
+        """
+        spans = []
+        for id in self.ids():
+            span = [self.node_token(id).category()]
+            for (low, high) in join_spans(self.fringe(id)):
+                span += [low, high]
+            if len(span) >= 3:
+                spans += [span]
+        return sorted(spans, key=lambda x: [tuple(x[1:]), x[0]])
+
+
+__all__ = ["FrozenHybridTree", "FrozenConstituentTree"]
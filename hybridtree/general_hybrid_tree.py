@@ -2,14 +2,40 @@
 __author__ = 'kilian'
 
 from collections import defaultdict
-from grammar.induction.decomposition import join_spans
 from hybridtree.monadic_tokens import MonadicToken
 
 
+class YieldView(list):
+    """
+    Read-only list, as returned by HybridTree.token_yield and HybridTree.full_token_yield.
+    The tree caches the view until it is modified. Copies (copy.copy, copy.deepcopy, pickle) are ordinary lists.
+    """
+    def __read_only(self, *args, **kwargs):
+        raise TypeError("Yield of hybrid tree is read-only. Use list(...) to obtain a modifiable copy.")
+
+    __setitem__ = __delitem__ = __setslice__ = __delslice__ = __iadd__ = __imul__ = __read_only
+    append = extend = insert = pop = remove = reverse = sort = clear = __read_only
+
+    def __reduce_ex__(self, protocol):
+        return list, (list(self),)
+
+
 class HybridTree:
     """
     A directed acyclic graph, where a (not necessarily strict) subset of the nodes is linearly ordered.
     """
+    # Caches of derived data, computed on demand and reset by every mutation (cf. _invalidate_caches).
+    # maps node id to position in the ordering
+    __node_indices = None
+    # maps node id to position in the full yield
+    __full_indices = None
+    # maps node id to its fringe (as list in pre-order)
+    __fringes = None
+    # maps node id to its fringe (as bitset, i.e., bit i is set iff i is in fringe)
+    __fringe_masks = None
+    # tokens of the ordering and of the full yield (as YieldView)
+    __token_yield = None
+    __full_token_yield = None
     @property
     def virtual_root(self):
         return 'VROOT'
@@ -41,6 +67,18 @@ class HybridTree:
         # store dependency labels (DEPREL in ConLL)
         # self.__id_to_dep_label = {}
 
+    def _invalidate_caches(self):
+        """
+        Reset cached node indices, fringes and token yields. To be called whenever nodes, the ordering or the
+        parent-child relation are modified.
+        """
+        self.__node_indices = None
+        self.__full_indices = None
+        self.__fringes = None
+        self.__fringe_masks = None
+        self.__token_yield = None
+        self.__full_token_yield = None
+
     def sent_label(self):
         """
         :rtype: str
@@ -78,6 +116,7 @@ class HybridTree:
         Set order = True and connected = False to include some token (e.g. punctuation)
         that appears in the yield but shall be ignored during tree operations.
         """
+        self._invalidate_caches()
         self._id_to_token[id] = token
         if order is True:
             if connected is True:
@@ -95,6 +134,7 @@ class HybridTree:
         :type child: str
         Add a pair of node ids in the tree's parent-child relation.
         """
+        self._invalidate_caches()
         if parent not in self._id_to_child_ids:
             self._id_to_child_ids[parent] = [child]
         else:
@@ -178,7 +218,7 @@ class HybridTree:
         :return: Is the node in the ordering?
         :rtype: bool
         """
-        return id in self.__ordered_ids
+        return id in self.__node_index_map()
 
     def disconnected(self, id):
         """
@@ -187,7 +227,7 @@ class HybridTree:
         :return: Is the node in the yield, but not connected to the root?
         :rtype: bool
         """
-        return id in self.__full_yield and id not in self.__ordered_ids
+        return id in self.__full_index_map() and id not in self.__node_index_map()
 
     def index_node(self, index):
         """
@@ -206,8 +246,10 @@ class HybridTree:
         :return: index of node in ordering
         :rtype: int
         """
-        return self.__ordered_ids.index(id)
-        # return self.__id_to_node_index[id]
+        try:
+            return self.__node_index_map()[id]
+        except KeyError:
+            raise ValueError(str(id) + ' is not in ordering')
 
     def node_index_full(self, id):
         """
@@ -216,12 +258,42 @@ class HybridTree:
         :return: index of node in full_yield
         :rtype: int
         """
-        return self.__full_yield.index(id)
+        try:
+            return self.__full_index_map()[id]
+        except KeyError:
+            raise ValueError(str(id) + ' is not in full yield')
+
+    def __node_index_map(self):
+        """
+        :return: maps node id to (first) index in ordering
+        :rtype: dict
+        """
+        if self.__node_indices is None:
+            self.__node_indices = self.__index_map(self.__ordered_ids)
+        return self.__node_indices
+
+    def __full_index_map(self):
+        """
+        :return: maps node id to (first) index in full yield
+        :rtype: dict
+        """
+        if self.__full_indices is None:
+            self.__full_indices = self.__index_map(self.__full_yield)
+        return self.__full_indices
+
+    @staticmethod
+    def __index_map(ids):
+        indices = {}
+        for index, id in enumerate(ids):
+            if id not in indices:
+                indices[id] = index
+        return indices
 
     def reorder(self):
         """
         Reorder children according to smallest node (w.r.t. ordering) in subtree.
         """
+        self._invalidate_caches()
         self.__reorder(self.virtual_root)
 
     def __reorder(self, id):
@@ -252,11 +324,32 @@ class HybridTree:
         :rtype: list[int]
         List of indices (w.r.t. ordering) obtained by pre-order traversal over the subtree starting at id.
         """
-        y = []
-        if self.in_ordering(id):
-            y = [self.node_index(id)]
-        for child in self.children(id):
-            y += self.fringe(child)
+        return list(self.__fringe(id))
+
+    def __fringe(self, id):
+        """
+        :param id: node id
+        :type id: str
+        :return: cached fringe of node (not to be modified)
+        :rtype: list[int]
+        The fringes of all nodes in the subtree are computed bottom-up and cached together with their bitsets.
+        """
+        if self.__fringes is None:
+            self.__fringes = {}
+            self.__fringe_masks = {}
+        y = self.__fringes.get(id)
+        if y is None:
+            y = []
+            mask = 0
+            node_indices = self.__node_index_map()
+            if id in node_indices:
+                y.append(node_indices[id])
+                mask = 1 << node_indices[id]
+            for child in self.children(id):
+                y += self.__fringe(child)
+                mask |= self.__fringe_masks[child]
+            self.__fringes[id] = y
+            self.__fringe_masks[id] = mask
         return y
 
     def n_spans(self, id):
@@ -266,7 +359,10 @@ class HybridTree:
         :return: Number of contiguous spans of node.
         :rtype : int
         """
-        return len(join_spans(self.fringe(id)))
+        self.__fringe(id)
+        mask = self.__fringe_masks[id]
+        # each span corresponds to a set bit whose lower neighbour is not set
+        return bin(mask & ~(mask << 1)).count('1')
 
     def max_n_spans(self):
         """
@@ -307,7 +403,7 @@ class HybridTree:
         return self.unlabelled_structure_recur(self.virtual_root)
 
     def unlabelled_structure_recur(self, id):
-        head = set(self.fringe(id))
+        head = set(self.__fringe(id))
         tail = [self.unlabelled_structure_recur(child) for child in self.children(id)]
         # remove useless step
         if len(tail) == 1 and head == tail[0][0]:
@@ -325,7 +421,7 @@ class HybridTree:
         # return head, tail
 
     def recursive_partitioning_rec(self, id):
-        head = set(self.fringe(id))
+        head = set(self.__fringe(id))
         if self.in_ordering(id):
             tail = [({self.node_index(id)}, [])]
         else:
@@ -360,16 +456,22 @@ class HybridTree:
     def token_yield(self):
         """
         :return: Get yield as list of all labels of nodes, that are in the ordering and connected to the root.
-        :rtype: list[MonadicToken]
+        :rtype: YieldView
+        The list is cached and must not be modified.
         """
-        return [self.node_token(id) for id in self.__ordered_ids]
+        if self.__token_yield is None:
+            self.__token_yield = YieldView([self._id_to_token[id] for id in self.__ordered_ids])
+        return self.__token_yield
 
     def full_token_yield(self):
         """
         :return: Get yield as list of labels of nodes, that are in the ordering (including disconnected nodes).
-        :rtype: list[MonadicToken]
+        :rtype: YieldView
+        The list is cached and must not be modified.
         """
-        return [self.node_token(id) for id in self.__full_yield]
+        if self.__full_token_yield is None:
+            self.__full_token_yield = YieldView([self._id_to_token[id] for id in self.__full_yield])
+        return self.__full_token_yield
 
     def nodes(self):
         """
@@ -393,7 +495,7 @@ class HybridTree:
         :return: Does yield cover whole string?
         :rtype: bool
         """
-        return len(self.fringe(self.virtual_root)) == len(self.__ordered_ids)
+        return len(self.__fringe(self.virtual_root)) == len(self.__ordered_ids)
 
     def n_nodes(self):
         """
@@ -423,7 +525,7 @@ class HybridTree:
         for id in self.nodes():
             if len(self.children(id)) == 0 and id not in self.full_yield():
                 return True
-        return len(self.fringe(self.virtual_root)) == 0
+        return len(self.__fringe(self.virtual_root)) == 0
 
     def siblings(self, id):
         """
@@ -453,8 +555,17 @@ class HybridTree:
     def __str__(self):
         return ''.join([self.__hybrid_tree_str(id, 0) for id in self.root])
 
+    def freeze(self):
+        """
+        :return: immutable, array-backed copy of the tree with the same read API
+        :rtype: FrozenHybridTree
+        """
+        from hybridtree.frozen_hybrid_tree import FrozenHybridTree
+        return FrozenHybridTree(self)
+
     def __eq__(self, other):
-        if not isinstance(other, HybridTree):
+        from hybridtree.frozen_hybrid_tree import FrozenHybridTree
+        if not isinstance(other, (HybridTree, FrozenHybridTree)):
             return False
         return all([self.compare_recursive(other, self_node, other_node) for self_node, other_node in
                     zip(self.root, other.root)])
@@ -517,6 +628,9 @@ class HybridDag(HybridTree):
         else:
             self._sec_parents[child] = [parent]
 
+    def freeze(self):
+        raise TypeError('HybridDag cannot be frozen, since FrozenHybridTree does not store secondary edges')
+
     def sec_children(self, node):
         if node in self._id_to_sec_children:
             return self._id_to_sec_children.get(node)
@@ -528,4 +642,4 @@ class HybridDag(HybridTree):
         return []
 
 
-__all__ = ["HybridTree"]
\ No newline at end of file
+__all__ = ["HybridTree", "YieldView"]
\ No newline at end of file
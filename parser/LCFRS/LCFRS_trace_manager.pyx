@@ -22,9 +22,17 @@ cdef class PyLCFRSTraceManager(PyTraceManager):
         :param grammar:
         :type grammar: PyLCFRS
         """
-        factory = PyLCFRSFactory(grammar.start(), nonterminal_map)
-        factory.import_grammar(grammar)
-        self.parser = factory.build_parser()
+        def compile(grammar):
+            factory = PyLCFRSFactory(grammar.start(), nonterminal_map)
+            factory.import_grammar(grammar)
+            return nonterminal_map, factory.build_parser()
+
+        # the parser depends on the content of nonterminal_map, to which compiling adds the missing nonterminals
+        key = nonterminal_map.first_index, tuple([nonterminal_map.index_object(idx) for idx
+                                                  in range(nonterminal_map.first_index, nonterminal_map.counter)])
+        compiled_map, self.parser = grammar.compiled(('lcfrs', key), compile)
+        for idx in range(nonterminal_map.counter, compiled_map.counter):
+            nonterminal_map.object_index(compiled_map.index_object(idx))
 
         cdef vector[NONTERMINAL] node_labels = range(0, nonterminal_map.counter)
         cdef vector[size_t] edge_labels = range(0, len(grammar.rule_index()))
@@ -39,6 +47,7 @@ cdef class PyLCFRSTraceManager(PyTraceManager):
     cpdef void compute_reducts(self, corpus, terminal_labelling):
         start_time = time.time()
         for i, tree in enumerate(corpus):
+            # labelled without position (as in grammar induction), since labels may depend on the position
             word = [terminal_labelling.token_label(token) for token in tree.token_yield()]
             self.parser.do_parse(word)
             self.parser.prune_trace()
@@ -27,10 +27,10 @@ class DerivationItem(PassiveItem):
 class Derivation(LCFRSDerivation):
     def weight(self):
         if self.__weight is None:
-            self.__weight = 0
+            self.__weight = 1.0
             for derivation_item in self.__derivationItems.values():
                 assert isinstance(derivation_item, DerivationItem)
-                self.__weight += derivation_item.rule().weight()
+                self.__weight *= derivation_item.rule().weight()
         return self.__weight
 
     def child_id(self, id, i):
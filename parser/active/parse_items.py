@@ -156,4 +156,65 @@ class PassiveItem:
         return item
 
 
-__all__ = ["PassiveItem", "Range", "extend", "length"]
+class ItemLayout:
+    """
+    Positions of the range boundaries of a rule in compact items. A compact item is the rule idx and a flat
+    tuple of ints: the boundaries (left, right) of the LHS components, followed by those of the RHS variables
+    (ordered by member and argument), where -1 marks boundaries that are not found yet.
+    """
+    def __init__(self, rule):
+        """
+        :param rule:
+        :type rule: LCFRS_rule
+        """
+        self.rule = rule
+        self.idx = rule.get_idx()
+        self.nont = rule.lhs().nont()
+        self.fanout = rule.lhs().fanout()
+        self.rank = rule.rank()
+        variables = sorted((mem.mem, mem.arg) for arg in rule.lhs().args() for mem in arg
+                           if isinstance(mem, LCFRS_var))
+        offsets = dict((var, 2 * (self.fanout + i)) for i, var in enumerate(variables))
+        # var_offsets[mem][arg]: index of the left boundary of variable x_{mem, arg}
+        self.var_offsets = [[offsets[var] for var in variables if var[0] == mem] for mem in range(self.rank)]
+        self.size = 2 * (self.fanout + len(variables))
+        # members[c][j]: terminal, or (mem, arg, offset, consumed) for variable x_{mem, arg}, where consumed is
+        # the number of members from position j on that do not belong to mem (cf. number_of_consumed_terminals)
+        args = rule.lhs().args()
+        self.members = [[(mem.mem, mem.arg, offsets[(mem.mem, mem.arg)], self.__consumed(args, c, j, mem.mem))
+                         if isinstance(mem, LCFRS_var) else mem for j, mem in enumerate(arg)]
+                        for c, arg in enumerate(args)]
+
+    @staticmethod
+    def __consumed(args, c, j, mem):
+        members = list(args[c][j:]) + [m for arg in args[c + 1:] for m in arg]
+        return len([m for m in members if not (isinstance(m, LCFRS_var) and m.mem == mem)])
+
+    def found(self, bounds, mem, arg):
+        """
+        :param bounds: boundaries of compact item
+        :type bounds: tuple[int]
+        :return: flat boundaries of the variables x_{mem, 0}, ..., x_{mem, arg - 1}
+        :rtype: tuple[int]
+        """
+        return tuple(bound for offset in self.var_offsets[mem][:arg] for bound in bounds[offset:offset + 2])
+
+    def variables(self, bounds):
+        """
+        :param bounds: boundaries of compact item
+        :type bounds: tuple[int]
+        :return: the ranges of the found LHS components and variables as in PassiveItem
+        :rtype: dict[LCFRS_var, Range]
+        """
+        variables = {}
+        for c in range(self.fanout):
+            if bounds[2 * c] >= 0:
+                variables[LCFRS_var(-1, c)] = Range(bounds[2 * c], bounds[2 * c + 1])
+        for mem, offsets in enumerate(self.var_offsets):
+            for arg, offset in enumerate(offsets):
+                if bounds[offset] >= 0:
+                    variables[LCFRS_var(mem, arg)] = Range(bounds[offset], bounds[offset + 1])
+        return variables
+
+
+__all__ = ["PassiveItem", "ItemLayout", "Range", "extend", "length"]
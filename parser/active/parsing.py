@@ -3,167 +3,48 @@ from __future__ import print_function
 __author__ = 'kilian'
 
 from grammar.lcfrs import *
-from collections import deque
 from parser.parser_interface import AbstractParser
 from parser.active.derivation import Derivation, DerivationItem
-from parser.active.parse_items import PassiveItem, terminal_type, Range, extend, length, join
+from parser.active.parse_items import PassiveItem, ItemLayout, terminal_type
+from parser.lexical_filter import LexicalFilter
+import heapq
 import itertools
+import math
 from collections import defaultdict
 
-
-class ActiveItem(PassiveItem):
-    def __init__(self, rule, variables, dot_component, dot_position, remaining_input):
-        """
-            :param rule:
-            :type rule: LCFRS_rule
-            """
-        PassiveItem.__init__(self, rule, variables)
-        self._dot_component = dot_component
-        self._dot_position = dot_position
-        self._remaining_input = remaining_input
-
-    def dot_position(self):
-        """
-        :rtype: (int,int)
-        :return:
-        """
-        return self._dot_component, self._dot_position
-
-    def set_range(self, variable, range):
-        """
-        :param variable:
-        :type variable: LCFRS_var
-        :param range:
-        :type range: Range
-        :return:
-        """
-        self._variables[variable] = range
-
-    def action_id(self):
-        """
-        :return:
-        :rtype: str
-        """
-        assert False
-
-    def __str__(self):
-        s = '{' + ','.join(
-            ['{' + ','.join([str(self.range(LCFRS_var(-1, arg))) for arg in range(self._dot_component + 1)]) + '}']
-            + ['{' + ','.join([str(self.range(LCFRS_var(mem, arg))) for arg in range(self.max_arg(mem) + 1)]) + '}' for
-               mem in range(self.max_mem() + 1)]) + '}'
-        return '[' + self.action_id() + ':' + str(self._rule) + ':' + s + ': ' + str(self._remaining_input) + ']'
-
-    def convert_to_passive_item(self):
-        """
-        :return:
-        :rtype: PassiveItem
-        """
-        # since our grammar is ordered, we can assumed all components up to the dot component to be found
-        variables = self._variables.copy()
-
-        item = PassiveItem(self._rule, variables)
-        return item
-
-    def remaining_input(self):
-        return self._remaining_input
-
-
-class ScanItem(ActiveItem):
-    def process(self, parser):
-        """
-        :type parser: Parser
-        """
-        c_index, j = self.dot_position()
-        word_tuple_string = self._rule.lhs().arg(c_index)
-        obj = word_tuple_string[j]
-        current_component = LCFRS_var(-1, c_index)
-        current_range = self.range(current_component)
-
-        if isinstance(obj, LCFRS_var):
-            mem = obj.mem
-            index = obj.arg
-            nont = self._rule.rhs_nont(mem)
-
-            found_variables = [self.range(LCFRS_var(mem, j)) for j in range(obj.arg)]
-
-            remaining_input = self._remaining_input - number_of_consumed_terminals(self._rule, c_index,
-                                                                                   self._dot_position, mem)
-
-            parser.predict(nont, index, current_range.right, remaining_input, found_variables)
-
-            self.__class__ = CombineItem
-            parser.record_active_item(self)
-
-        else:
-            assert isinstance(obj, terminal_type)
-            if parser.in_input(current_range.right) and parser.terminal(current_range.right) == obj:
-                # if terminal matches current input position
-                self.set_range(current_component, extend(current_range, 1))
-                self._dot_position += 1
-                self._remaining_input -= 1
-
-                if self._dot_position == len(word_tuple_string):
-                    # end of word tuple component reached:
-                    item = self.convert_to_passive_item()
-                    parser.record_passive_item(item)
-
-                elif self._remaining_input > 0:
-                    # there are more variables or terminals in the current component
-                    parser.record_active_item(self)
-
-    def action_id(self):
-        return 'S'
-
-
-class CombineItem(ActiveItem):
-    def action_id(self):
-        return 'C'
-
-    def process(self, parser):
-        c_index, j = self.dot_position()
-        word_tuple_string = self._rule.lhs().arg(c_index)
-        variable = word_tuple_string[j]
-        assert isinstance(variable, LCFRS_var)
-        current_component = LCFRS_var(-1, c_index)
-        current_position = self.range(LCFRS_var(-1, c_index))
-
-        # start positions of strings
-        range_constraints = [self.range(LCFRS_var(variable.mem, comp)).left for comp in range(variable.arg)]
-        # add end of range right to dot
-        range_constraints += [current_position.right]
-
-        nont = self._rule.rhs_nont(variable.mem)
-        passive_items = parser.query_passive_items(nont, range_constraints)
-
-        for item in passive_items:
-            assert isinstance(item, PassiveItem)
-
-            consistent = True
-
-            for comp in range(variable.arg):
-                if item.range(LCFRS_var(-1, comp)) != self.range(LCFRS_var(variable.mem, comp)):
-                    consistent = False
-                    break
-
-            if consistent:
-                remaining_input = self._remaining_input - length(item.range(LCFRS_var(-1, variable.arg)))
-                if not (remaining_input > 0 or (remaining_input == 0 and j + 1 == len(word_tuple_string))):
-                    continue
-
-                # new variables dict, set ranges for found variables
-                variables = dict(self._variables)
-                new_position = join(current_position, item.range(LCFRS_var(-1, variable.arg)))
-                variables[current_component] = new_position
-                variables[variable] = item.range(LCFRS_var(-1, variable.arg))
-
-                active_item = ScanItem(self._rule, variables, c_index, j + 1, remaining_input)
-                if j + 1 == len(word_tuple_string):
-                    passive_item = active_item.convert_to_passive_item()
-                    parser.record_passive_item(passive_item)
-                else:
-                    parser.record_active_item(active_item)
-
-
+INFINITY = float('inf')
+
+
+# Items are compact (cf. ItemLayout): an active item is a tuple
+#   (layout, c, j, bounds, remaining_input)
+# where the dot is at the j-th member of the c-th LHS component, and a
+# passive item (complete up to component k) is a pair (layout, bounds). The
+# passive items of nont complete up to k are indexed by
+#   (nont, l_0, r_0, ..., l_{k-1}, r_{k-1}, l_k)     for combination and
+#   (nont, l_0, r_0, ..., l_k, r_k)                  for prediction of component k + 1.
+# Active items whose dot is at variable x_{mem, arg} wait under the first key
+# built from the ranges of x_{mem, 0}, ..., x_{mem, arg - 1} and the current
+# position; predictions of component arg > 0 wait under the second key. Both
+# sides are joined on arrival, hence each combination is a single lookup of
+# consistent items, independent of the order of processing.
+#
+# The complete passive items form a hypergraph: its nodes are the keys
+# (nont, l_0, r_0, ..., l_{f-1}, r_{f-1}) of complete items, each complete
+# item is a hyperedge from the nodes of its RHS nonterminals (given by the
+# ranges of their variables). Derivations are extracted from this hypergraph
+# in the order of their weights (lazy k-best, Huang & Chiang 2005, Alg. 3).
+#
+# With viterbi=True the agenda is a priority queue ordered by inside score
+# (-log weight), and parsing stops as soon as the start item is found. The
+# score of an item is the score of its rule plus, for each RHS nonterminal,
+# the best score of the passive items with the ranges combined so far. The
+# item carries these scores per RHS member; when a later component of the
+# same nonterminal is combined, exactly the carried score is replaced, hence
+# scores never decrease in a deduction step. Predicted items start with the
+# score of their rule only, i.e., an item may be reached with a lower score
+# after it has been processed. It is then processed again (and a passive item
+# recorded again), so that the first start item is optimal (Knuth 1977),
+# provided that rule weights are <= 1.
 class Parser(AbstractParser):
     def all_derivation_trees(self):
         all_trees = []
@@ -174,228 +55,372 @@ class Parser(AbstractParser):
         return all_trees
 
     def best_derivation_tree(self):
-        best_derivation = None
-        best_weight = float('-inf')
-        for derivation in self.all_derivation_trees():
-            # print "any: ", derivation, derivation.weight()
-            if derivation.weight() > best_weight:
-                best_derivation = derivation
-        # print "best:" , best_derivation, best_weight
-        return best_derivation
+        if self.__kth_best(self.__goal(), 0) is None:
+            return None
+        derivation = Derivation()
+        derivation_tree(derivation, self.__derivation_item(self.__goal(), 0), None)
+        return derivation
 
     def best(self):
-        best_derivation = self.best_derivation_tree()
-        if best_derivation:
-            return best_derivation.weight()
-        else:
+        """
+        :return: weight of the best derivation (product of rule weights), or None if input is not recognized
+        :rtype: float
+        """
+        best = self.__kth_best(self.__goal(), 0)
+        if best is None:
             return None
+        return math.exp(-best[0])
+
+    def k_best_derivation_trees(self):
+        """
+        Enumerates the derivations lazily in the order of their weights (at most k, cf. constructor).
+        With viterbi=True only the items found until the search stopped are ranked, hence derivations after the
+        best one may be missing.
+        :rtype: __generator[(float, Derivation)]
+        """
+        goal = self.__goal()
+        rank = 0
+        while self.__k is None or rank < self.__k:
+            kth_best = self.__kth_best(goal, rank)
+            if kth_best is None:
+                return
+            derivation = Derivation()
+            derivation_tree(derivation, self.__derivation_item(goal, rank), None)
+            yield math.exp(-kth_best[0]), derivation
+            rank += 1
 
     def recognized(self):
-        for item in self.query_passive_items(self.__grammar.start(), [0]):
-            if item.range(LCFRS_var(-1, 0)) == Range(0, len(self.__word)):
-                return True
-        return False
+        return self.__goal() in self.__passive_ranges
 
-    def __init__(self, grammar, input=None, debug=False):
+    def __init__(self, grammar, input=None, debug=False, viterbi=False, k=50):
         """
 
             :param grammar:
             :type grammar: LCFRS
             :param input:
+            :param viterbi: explore items best-first and stop at the first start item (requires rule weights <= 1); \
+                only the best derivation is guaranteed to be found
+            :type viterbi: bool
+            :param k: maximal number of derivations enumerated by k_best_derivation_trees (None for all)
+            :type k: int
             :return:
             """
         super(Parser, self).__init__(grammar, input)
         self.__debug = debug
         self.__grammar = grammar
+        self.__viterbi = viterbi
+        self.__k = k
+        # rule idx -> ItemLayout
+        self.__layouts = {}
+        self.__counter = itertools.count()
+        self.clear()
         self.__word = input
-        self.__scan_items = set()
-        self.__combine_items = set()
-        self.__passive_items = {}
-        self.__process_counter = 0
-        self.__scan_agenda = deque()
-        self.__combine_agenda = []
         if input is not None:
             self.__init_agenda()
             self.__parse()
         else:
             self.preprocess_grammar(grammar)
-        # print len(self.__passive_items.items())
 
     def set_input(self, input):
         self.__word = input
 
     def clear(self):
         self.__word = None
-        self.__scan_items = set()
-        self.__combine_items = set()
-        self.__passive_items = {}
-        self.__process_counter = 0
-        self.__scan_agenda = deque()
-        self.__combine_agenda = []
+        self.__active_items = set()
+        self.__passive_items = set()
+        self.__predictions = set()
+        # index keys -> passive items
+        self.__passive_prefix = defaultdict(list)
+        self.__passive_ranges = defaultdict(list)
+        # index keys -> waiting active items (with inside score) / predicted (position, remaining input) of
+        # components > 0
+        self.__waiting = defaultdict(list)
+        self.__requests = defaultdict(list)
+        self.__agenda = []
+        self.__filter = None
+        # viterbi: best inside score of pushed active items, inside score and scores per RHS member of passive
+        # items, and best inside score per key of __passive_ranges
+        self.__pushed = {}
+        self.__inside = {}
+        self.__best_inside = {}
+        self.__goal_found = False
+        # node -> hyperedges and [derivations, candidates, seen candidates] for k-best extraction
+        self.__hyperedges = {}
+        self.__kbest = {}
 
     def parse(self):
         self.__init_agenda()
         self.__parse()
 
     def __init_agenda(self):
-        self.predict(self.__grammar.start(), 0, 0, len(self.__word), [])
+        self.__filter = LexicalFilter(self.__grammar, self.__word)
+        self.__predict(self.__grammar.start(), 0, (), 0, len(self.__word))
 
-    def record_passive_item(self, item):
-        """
+    def __goal(self):
+        return self.__grammar.start(), 0, len(self.__word)
 
-        :param item:
-        :type item: PassiveItem
-        :return:
+    def __layout(self, rule):
         """
-        key = tuple(
-            [item.nont()] + [item.range(LCFRS_var(-1, c_index)).left for c_index in range(item.complete_to() + 1)])
-        if key in self.__passive_items:
-            if item not in self.__passive_items[key]:
-                self.__passive_items[key] += [item]
-                if self.__debug:
-                    print(" recorded   ", item)
-            elif self.__debug:
-                print(" skipped    ", item)
-        else:
-            self.__passive_items[key] = [item]
-            if self.__debug:
-                print(" recorded   ", item)
-
-    def record_active_item(self, item):
+        :type rule: LCFRS_rule
+        :rtype: ItemLayout
         """
+        idx = rule.get_idx()
+        layout = self.__layouts.get(idx)
+        if layout is None:
+            layout = self.__layouts[idx] = ItemLayout(rule)
+        return layout
 
-        :param item:
-        :type item: ActiveItem
-        :return:
-        """
-        key = tuple([item.action_id(), item.nont(), item.rule_id(), item.dot_position(), item.remaining_input()] + [
-            item.range(LCFRS_var(-1, c_index)) for c_index in range(item.dot_position()[0] + 1)] + [
-                        item.range(LCFRS_var(mem, arg)) for mem in range(item.max_mem() + 1) for arg in
-                        range(item.max_arg(mem) + 1)]
-                    )
-        if isinstance(item, CombineItem):
-            if key in self.__combine_items:
-                if self.__debug:
-                    print(" skipped    ", item)
-            else:
-                self.__combine_items.add(key)
-                self.__combine_agenda.append(item)
-                if self.__debug:
-                    print(" recorded   ", item)
+    def __parse(self):
+        agenda = self.__agenda
+        if self.__viterbi:
+            pushed = self.__pushed
+            while agenda and not self.__goal_found:
+                inside, _, key, item = heapq.heappop(agenda)
+                # skip items that were pushed again with a lower score
+                if inside == pushed[key]:
+                    self.__process(*item)
         else:
-            assert isinstance(item, ScanItem)
-            if key in self.__scan_items:
-                if self.__debug:
-                    print(" skipped    ", item)
-            else:
-                self.__scan_items.add(key)
-                self.__scan_agenda.append(item)
-                if self.__debug:
-                    print(" recorded   ", item)
-
-    def query_passive_items(self, nont, range_constraints):
+            while agenda:
+                self.__process(*agenda.pop())
+
+    def __push(self, layout, c, j, bounds, remaining_input, inside=0.0, scores=None):
+        key = layout.idx, c, j, bounds, remaining_input
+        if self.__viterbi:
+            # an item is pushed (and processed) again if its score improves
+            if self.__pushed.get(key, INFINITY) <= inside:
+                return
+            self.__pushed[key] = inside
+            heapq.heappush(self.__agenda, (inside, next(self.__counter), key,
+                                           (layout, c, j, bounds, remaining_input, inside, scores)))
+        elif key not in self.__active_items:
+            self.__active_items.add(key)
+            self.__agenda.append((layout, c, j, bounds, remaining_input))
+
+    def __process(self, layout, c, j, bounds, remaining_input, inside=0.0, scores=None):
         """
-
-        :param nont:
-        :type nont: nonterminal_type
-        :param range_constraints:
-        :type range_constraints: list[int]
-        :return:
-        :rtype: list[PassiveItem]
+        Scans the terminals after the dot. At the end of the component the item becomes passive, at a variable
+        the corresponding component of the RHS nonterminal is predicted and the item waits for it.
         """
-        key = tuple([nont] + range_constraints)
-        return self.__passive_items.get(key, [])
-
-    def __parse(self):
-        while self.__combine_agenda or self.__scan_agenda:
-            while self.__scan_agenda:
-                item = self.__scan_agenda.popleft()
-                if self.__debug:
-                    self.__process_counter += 1
-                    if self.__process_counter % 100 == 0:
-                        pass
-                    print("process  {:>3d}".format(self.__process_counter), item)
-
-                item.process(self)
-            if self.__combine_agenda:
-                item = self.__combine_agenda.pop()
-                if self.__debug:
-                    self.__process_counter += 1
-                    if self.__process_counter == 15:
-                        pass
-                    print("process  {:>3d}".format(self.__process_counter), item)
-                item.process(self)
-
-    def query_passive_items_strict(self, nont, complete, ranges):
+        members = layout.members[c]
+        word = self.__word
+        position = bounds[2 * c + 1]
+        scanned = position
+        while j < len(members):
+            member = members[j]
+            if isinstance(member, tuple):
+                break
+            if position < len(word) and word[position] == member:
+                position += 1
+                j += 1
+                remaining_input -= 1
+                if remaining_input <= 0 and j < len(members):
+                    return
+            else:
+                return
+        if position != scanned:
+            bounds = bounds[:2 * c + 1] + (position,) + bounds[2 * c + 2:]
+        if j == len(members):
+            self.__record_passive_item(layout, bounds, c, inside, scores)
+            return
+
+        mem, arg, _, consumed = member
+        nont = layout.rule.rhs_nont(mem)
+        found = layout.found(bounds, mem, arg)
+        self.__predict(nont, arg, found, position, remaining_input - consumed)
+        key = (nont,) + found + (position,)
+        self.__waiting[key].append((layout, c, j, bounds, remaining_input, inside, scores))
+        for child_layout, child_bounds in self.__passive_prefix.get(key, ()):
+            self.__combine(layout, c, j, bounds, remaining_input, inside, scores, member, child_layout, child_bounds)
+
+    def __combine(self, layout, c, j, bounds, remaining_input, inside, scores, member, child_layout, child_bounds):
+        mem, arg, offset, _ = member
+        left, right = child_bounds[2 * arg], child_bounds[2 * arg + 1]
+        remaining_input -= right - left
+        if not (remaining_input > 0 or (remaining_input == 0 and j + 1 == len(layout.members[c]))):
+            return
+        new_bounds = list(bounds)
+        new_bounds[2 * c + 1] = right
+        new_bounds[offset], new_bounds[offset + 1] = left, right
+        if self.__viterbi:
+            # the best score of all passive items with the ranges combined so far replaces the score carried for
+            # the previous components of the RHS member
+            score = self.__best_inside[(child_layout.nont,) + child_bounds[:2 * arg + 2]]
+            inside += score - scores[mem]
+            scores = scores[:mem] + (score,) + scores[mem + 1:]
+        self.__push(layout, c, j + 1, tuple(new_bounds), remaining_input, inside, scores)
+
+    def __record_passive_item(self, layout, bounds, k, inside=0.0, scores=None):
         """
-        :param nont:
-        :type nont: nonterminal_type
-        :param complete:
-        :type complete: int
-        :param ranges: list[Range]
-        :return:
+        :param k: last complete LHS component
+        :type k: int
         """
-        range_constraints = list(map(lambda x: x.left, ranges))
-        result = []
-        for passive_item in self.query_passive_items(nont, range_constraints):
-            assert isinstance(passive_item, PassiveItem)
-
-            consistent = True
-            for c_index in range(complete):
-                if ranges[c_index] != passive_item.range(LCFRS_var(-1, c_index)):
-                    consistent = False
-                    break
-
-            if consistent:
-                result.append(passive_item)
-        return result
-
-    def predict(self, nont, component, input_position, remaining_input, found_variables):
+        item = layout.idx, bounds
+        prefix = (layout.nont,) + bounds[:2 * k + 1]
+        ranges = (layout.nont,) + bounds[:2 * k + 2]
+        if item in self.__passive_items:
+            # in viterbi mode, an item that is found with a lower score is propagated again
+            if not self.__viterbi or self.__inside[item][0] <= inside:
+                if self.__debug:
+                    print(" skipped    ", self.__passive_item(layout, bounds))
+                return
+        else:
+            self.__passive_items.add(item)
+            child = layout, bounds
+            self.__passive_prefix[prefix].append(child)
+            self.__passive_ranges[ranges].append(child)
+        if self.__debug:
+            print(" recorded   ", self.__passive_item(layout, bounds))
+        if self.__viterbi:
+            self.__inside[item] = inside, scores
+            if inside < self.__best_inside.get(ranges, INFINITY):
+                self.__best_inside[ranges] = inside
+            if k + 1 == layout.fanout and ranges == self.__goal():
+                self.__goal_found = True
+                return
+        for parent in self.__waiting.get(prefix, ()):
+            p_layout, c, j, p_bounds, remaining_input, p_inside, p_scores = parent
+            self.__combine(p_layout, c, j, p_bounds, remaining_input, p_inside, p_scores, p_layout.members[c][j],
+                           layout, bounds)
+        if k + 1 < layout.fanout:
+            for position, remaining_input in self.__requests.get(ranges, ()):
+                self.__continue(layout, bounds, k + 1, position, remaining_input, inside, scores)
+
+    def __predict(self, nont, component, found, position, remaining_input):
         """
         :type nont: nonterminal_type
         :param component:
         :type component: int
-        :param input_position:
-        :type input_position: int
-        :param found_variables:
-        :type found_variables: list[Range]
-        :rtype: Bool
+        :param found: flat ranges of the components 0, ..., component - 1
+        :type found: tuple[int]
+        :param position: start of the component
+        :type position: int
+        :type remaining_input: int
         """
-        assert len(found_variables) == component
-        predicted_new = False
+        key = nont, component, found, position, remaining_input
+        if key in self.__predictions:
+            return
+        self.__predictions.add(key)
         if component == 0:
             for rule in self.__grammar.lhs_nont_to_rules(nont):
-                # TODO: filtering
-                if minimum_string_size(rule, 0) > remaining_input:
+                if not self.__filter.admits(rule) or not self.__filter.fits(rule, 0, remaining_input):
                     continue
-                if not do_all_terminals_occur_in_input(rule, component, self.__word, input_position):
+                if not do_all_terminals_occur_in_input(rule, component, self.__word, position):
                     continue
-                # TODO: filtering end
-                initial_range = Range(input_position, input_position)
-                variables = defaultdict()
-                variables[LCFRS_var(-1, 0)] = initial_range
-                item = ScanItem(rule, variables, 0, 0, remaining_input)
-                predicted_new = self.record_active_item(item) or predicted_new
+                layout = self.__layout(rule)
+                bounds = (position, position) + (-1,) * (layout.size - 2)
+                self.__push(layout, 0, 0, bounds, remaining_input, rule_score(rule), (0.0,) * layout.rank)
         else:
-            for passive_item in self.query_passive_items_strict(nont, component, found_variables):
-                assert isinstance(passive_item, PassiveItem)
-
-                # TODO: filtering
-                if minimum_string_size(passive_item.rule(), component) > remaining_input:
-                    continue
-                if not do_all_terminals_occur_in_input(passive_item.rule(), component, self.__word, input_position):
-                    continue
-                # TODO: filtering end
-
-                variables = passive_item.variables().copy()
-                variables[LCFRS_var(-1, component)] = Range(input_position, input_position)
-
-                item = ScanItem(passive_item.rule(), variables, component, 0,
-                    remaining_input)
+            ranges = (nont,) + found
+            self.__requests[ranges].append((position, remaining_input))
+            for layout, bounds in self.__passive_ranges.get(ranges, ()):
+                self.__continue(layout, bounds, component, position, remaining_input,
+                                *self.__inside.get((layout.idx, bounds), (0.0, None)))
+
+    def __continue(self, layout, bounds, component, position, remaining_input, inside, scores):
+        # start component of an item that is complete up to component - 1
+        if not self.__filter.fits(layout.rule, component, remaining_input):
+            return
+        if not do_all_terminals_occur_in_input(layout.rule, component, self.__word, position):
+            return
+        bounds = bounds[:2 * component] + (position, position) + bounds[2 * component + 2:]
+        self.__push(layout, component, 0, bounds, remaining_input, inside, scores)
+
+    def __hyperedges_of(self, node):
+        """
+        :param node: key of complete passive items
+        :type node: tuple
+        :return: hyperedges (layout, bounds, tail nodes, score of rule) into node
+        :rtype: list[tuple]
+        """
+        edges = self.__hyperedges.get(node)
+        if edges is None:
+            edges = self.__hyperedges[node] = []
+            for layout, bounds in self.__passive_ranges.get(node, ()):
+                tails = tuple((layout.rule.rhs_nont(mem),) + layout.found(bounds, mem, len(offsets))
+                              for mem, offsets in enumerate(layout.var_offsets))
+                edges.append((layout, bounds, tails, rule_score(layout.rule)))
+        return edges
+
+    def __kth_best(self, node, rank):
+        """
+        :param node: key of complete passive items
+        :type node: tuple
+        :param rank: 0 for the best derivation
+        :type rank: int
+        :return: score (-log weight), hyperedge index and ranks of the derivations of the tail nodes of the \
+            rank-th best derivation of node, or None if there are less derivations
+        :rtype: tuple
+        """
+        state = self.__kbest.get(node)
+        if state is None:
+            # a node on a cycle of hyperedges has no derivations while its candidates are computed
+            state = self.__kbest[node] = [[], [], set()]
+            candidates = []
+            for index, edge in enumerate(self.__hyperedges_of(node)):
+                ranks = (0,) * len(edge[2])
+                score = self.__score(node, index, ranks)
+                if score is not None:
+                    candidates.append((score, index, ranks))
+                    state[2].add((index, ranks))
+            heapq.heapify(candidates)
+            state[1] = candidates
+        derivations, candidates, seen = state
+        while len(derivations) <= rank:
+            if derivations:
+                # successors of the last derivation are only needed once a later one is requested
+                _, index, ranks = derivations[-1]
+                for i in range(len(ranks)):
+                    successor = ranks[:i] + (ranks[i] + 1,) + ranks[i + 1:]
+                    if (index, successor) not in seen:
+                        seen.add((index, successor))
+                        score = self.__score(node, index, successor)
+                        if score is not None:
+                            heapq.heappush(candidates, (score, index, successor))
+            if not candidates:
+                break
+            derivations.append(heapq.heappop(candidates))
+        if rank < len(derivations):
+            return derivations[rank]
+        return None
+
+    def __score(self, node, index, ranks):
+        _, _, tails, score = self.__hyperedges_of(node)[index]
+        for tail, rank in zip(tails, ranks):
+            kth_best = self.__kth_best(tail, rank)
+            if kth_best is None:
+                return None
+            score += kth_best[0]
+        return score
+
+    def __derivation_item(self, node, rank):
+        """
+        :rtype: DerivationItem
+        """
+        _, index, ranks = self.__kth_best(node, rank)
+        layout, bounds, tails, _ = self.__hyperedges_of(node)[index]
+        item = DerivationItem(layout.rule, layout.variables(bounds))
+        for tail, tail_rank in zip(tails, ranks):
+            item.add_child(self.__derivation_item(tail, tail_rank))
+        return item
 
-                predicted_new = self.record_active_item(item) or predicted_new
+    def __passive_item(self, layout, bounds):
+        """
+        :rtype: PassiveItem
+        """
+        return PassiveItem(layout.rule, layout.variables(bounds))
 
-        return predicted_new
+    def query_passive_items_strict(self, nont, complete, ranges):
+        """
+        :param nont:
+        :type nont: nonterminal_type
+        :param complete: number of components
+        :type complete: int
+        :param ranges: list[Range]
+        :return: passive items that are complete up to component complete - 1 with the given ranges
+        :rtype: list[PassiveItem]
+        """
+        key = (nont,) + tuple(bound for r in ranges[:complete] for bound in r)
+        return [self.__passive_item(layout, bounds) for layout, bounds in self.__passive_ranges.get(key, ())]
 
     def terminal(self, position):
         """
@@ -417,59 +442,46 @@ class Parser(AbstractParser):
         """
         return 0 <= position < len(self.__word)
 
-    def _remove_passive_item(self, item):
-        """
-        :param item:
-        :type item: PassiveItem
-        :return:
-        """
-        range_constraints = [item.range(LCFRS_var(-1, arg)).left() for arg in range(item.complete_to() + 1)]
-        key = tuple([item.nont()] + range_constraints)
-        self.__passive_items.get(key, []).remove(item)
-
     def connect_passive_items(self, start):
         """
         :type start: PassiveItem
         :rtype: list[DerivationItem]
         """
-        rank = start.rule().rank()
+        layout = self.__layout(start.rule())
+        bounds = [-1] * layout.size
+        for variable, r in start.variables().items():
+            offset = 2 * variable.arg if variable.mem < 0 else layout.var_offsets[variable.mem][variable.arg]
+            bounds[offset], bounds[offset + 1] = r
+        return self.__connect(layout, tuple(bounds))
+
+    def __connect(self, layout, bounds):
+        """
+        :rtype: list[DerivationItem]
+        """
         # either a leaf in the parse tree, or already connected
-        if rank == 0:
-            return [DerivationItem(start.rule(), start.variables())]
+        if layout.rank == 0:
+            return [DerivationItem(layout.rule, layout.variables(bounds))]
 
         connected_children = []
-        for mem in range(rank):
-            unconnected_mem_children = self.query_passive_items_strict(start.rule().rhs_nont(mem),
-                                                                       start.max_arg(mem) + 1,
-                                                                       [start.range(LCFRS_var(mem, arg)) for arg in
-                                                                        range(start.max_arg(mem) + 1)])
+        for mem in range(layout.rank):
+            key = (layout.rule.rhs_nont(mem),) + layout.found(bounds, mem, len(layout.var_offsets[mem]))
             connected_mem_children = []
-            for child in unconnected_mem_children:
-                connected_mem_children += self.connect_passive_items(child)
-
+            for child_layout, child_bounds in self.__passive_ranges.get(key, ()):
+                connected_mem_children += self.__connect(child_layout, child_bounds)
             connected_children.append(connected_mem_children)
 
-        # self._remove_passive_item(start)
-
         connected_selfs = []
         for choice in itertools.product(*connected_children):
-            connected_item = DerivationItem(start.rule(), start.variables())
+            connected_item = DerivationItem(layout.rule, layout.variables(bounds))
             for child in list(choice):
                 connected_item.add_child(child)
             connected_selfs.append(connected_item)
-
-        # key = tuple(
-        # [start.nont()] + [start.range(LCFRS_var(-1, c_index)).left() for c_index in range(start.complete_to() + 1)])
-
-        # self.__passive_items[key] += connected_selfs
-
         return connected_selfs
 
     def successful_root_items(self):
         connected_items = []
-        for passive_item in self.query_passive_items(self.__grammar.start(), [0]):
-            if passive_item.range(LCFRS_var(-1, 0)) == Range(0, len(self.__word)):
-                connected_items += self.connect_passive_items(passive_item)
+        for layout, bounds in self.__passive_ranges.get((self.__grammar.start(), 0, len(self.__word)), ()):
+            connected_items += self.__connect(layout, bounds)
         return connected_items
 
 
@@ -510,6 +522,19 @@ def minimum_string_size(rule, start_component, end_component=None):
     return size
 
 
+def rule_score(rule):
+    """
+    :param rule:
+    :type rule: LCFRS_rule
+    :return: -log of the weight of rule
+    :rtype: float
+    """
+    weight = rule.weight()
+    if weight > 0:
+        return -math.log(weight)
+    return INFINITY
+
+
 def number_of_consumed_terminals(rule, start_component, start_position, current_mem, end_component=None):
     """
 
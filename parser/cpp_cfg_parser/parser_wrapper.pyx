@@ -160,7 +160,7 @@ class CFGParser(AbstractParser):
             self.parser = grammar.tmp
             self.parse()
         else:
-            self.parser = CFGParser.__preprocess(grammar)
+            self.parser = grammar.compiled('cfg', CFGParser.__preprocess)
 
     def best_derivation_tree(self):
         if self.recognized():
@@ -191,7 +191,7 @@ class CFGParser(AbstractParser):
 
     @staticmethod
     def preprocess_grammar(grammar):
-        grammar.tmp = CFGParser.__preprocess(grammar)
+        grammar.tmp = grammar.compiled('cfg', CFGParser.__preprocess)
 
 
 cdef class PyCYKItem:
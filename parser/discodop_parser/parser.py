@@ -92,8 +92,10 @@ class DiscodopKbestParser(AbstractParser):
                  latent_viterbi_mode=False,
                  secondaries=None
                  ):
-        rule_list = list(transform_grammar(grammar))
-        self.disco_grammar = Grammar(rule_list, start=grammar.start())
+        if cfg_ctf:
+            self.disco_grammar, self.disco_cfg_grammar = grammar.compiled('disco-dop-cfg-ctf', self.__compile_ctf)
+        else:
+            self.disco_grammar = grammar.compiled('disco-dop', self.__compile)
         self.chart = None
         self.input = input
         self.grammar = grammar
@@ -118,12 +120,22 @@ class DiscodopKbestParser(AbstractParser):
         self.k_best_reranker = None
         if grammarInfo is not None:
             assert self.la.check_rule_split_alignment()
-        if cfg_ctf:
-            cfg_rule_list = list(transform_grammar_cfg_approx(grammar))
-            self.disco_cfg_grammar = Grammar(cfg_rule_list, start=grammar.start())
-            self.disco_grammar.getmapping(self.disco_cfg_grammar, re.compile('\*[0-9]+$'), None, True, True)
         # self.estimates = 'SXlrgaps', getestimates(self.disco_grammar, 40, grammar.start())
 
+    @staticmethod
+    def __compile(grammar):
+        rule_list = grammar.compiled('disco-dop-rules', lambda g: list(transform_grammar(g)), persistent=True)
+        return Grammar(rule_list, start=grammar.start())
+
+    @staticmethod
+    def __compile_ctf(grammar):
+        disco_grammar = DiscodopKbestParser.__compile(grammar)
+        cfg_rule_list = grammar.compiled('disco-dop-cfg-rules', lambda g: list(transform_grammar_cfg_approx(g)),
+                                         persistent=True)
+        disco_cfg_grammar = Grammar(cfg_rule_list, start=grammar.start())
+        disco_grammar.getmapping(disco_cfg_grammar, re.compile('\*[0-9]+$'), None, True, True)
+        return disco_grammar, disco_cfg_grammar
+
     def best(self):
         pass
 
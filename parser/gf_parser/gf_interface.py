@@ -82,7 +82,9 @@ class GFParser(AbstractParser):
                     prefix = DEFAULT_PREFIX
                     name = DEFAULT_NAME
                     override = False
-                self.gf_grammar = self._preprocess(grammar, prefix=prefix, name=name, override=override)
+                self.gf_grammar = grammar.compiled(
+                    ('gf', prefix, name, override),
+                    lambda g: self._preprocess(g, prefix=prefix, name=name, override=override))
 
     @staticmethod
     def resolve_path(path):
@@ -130,7 +132,7 @@ class GFParser(AbstractParser):
     @staticmethod
     def preprocess_grammar(grammar):
         # print gf_grammar
-        grammar.tmp_gf = GFParser._preprocess(grammar)
+        grammar.tmp_gf = grammar.compiled(('gf', DEFAULT_PREFIX, DEFAULT_NAME, False), GFParser._preprocess)
 
 
 class GFParser_k_best(GFParser):
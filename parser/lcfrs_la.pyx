@@ -4,6 +4,7 @@ from libcpp.vector cimport vector
 from parser.trace_manager.sm_trainer_util cimport PyGrammarInfo, PyStorageManager
 from parser.trace_manager.sm_trainer cimport PyLatentAnnotation, build_PyLatentAnnotation
 import itertools
+import numpy as np
 from collections import defaultdict
 import grammar.lcfrs as gl
 
@@ -28,29 +29,23 @@ def build_sm_grammar(PyLatentAnnotation latent_annotation,
 
         rule_dimensions = [deref(latent_annotation.latentAnnotation).nonterminalSplits[nont]
                            for nont in deref(grammarInfo.grammarInfo).rule_to_nonterminals[i]]
-        rule_dimensions_product = itertools.product(*[range(dim) for dim in rule_dimensions])
-
-        lhs_dims = deref(latent_annotation.latentAnnotation).nonterminalSplits[
-            deref(grammarInfo.grammarInfo).rule_to_nonterminals[i][0]
-        ]
-
-        for la in rule_dimensions_product:
-            index = list(la)
-
-            if rule_smoothing > 0.0:
-                weight_av = sum([deref(latent_annotation.latentAnnotation).get_weight(i, [lhs] + list(la)[1:])
-                    for lhs in range(lhs_dims)]) / lhs_dims
-
-                weight = (1 - rule_smoothing) * deref(latent_annotation.latentAnnotation).get_weight(i, index) \
-                         + rule_smoothing * weight_av
-            else:
-                weight = deref(latent_annotation.latentAnnotation).get_weight(i, index)
-            if weight > rule_pruning:
-                lhs_la = gl.LCFRS_lhs(rule.lhs().nont() + "[" + str(la[0]) + "]")
-                for arg in rule.lhs().args():
-                    lhs_la.add_arg(arg)
-                nonts = [rhs_nont + "[" + str(la[1 + j]) + "]" for j, rhs_nont in enumerate(rule.rhs())]
-                new_grammar.add_rule(lhs_la, nonts, weight, rule.dcp())
+        rule_dimensions_product = list(itertools.product(*[range(dim) for dim in rule_dimensions]))
+
+        # weights of all splits of the rule as tensor with one axis per nonterminal
+        weights = np.array([deref(latent_annotation.latentAnnotation).get_weight(i, list(la))
+                            for la in rule_dimensions_product]).reshape(rule_dimensions)
+        if rule_smoothing > 0.0:
+            # interpolate with average over splits of the lhs nonterminal
+            weights = (1 - rule_smoothing) * weights + rule_smoothing * weights.mean(axis=0)
+        weights = weights.ravel()
+
+        for j in np.flatnonzero(weights > rule_pruning):
+            la = rule_dimensions_product[j]
+            lhs_la = gl.LCFRS_lhs(rule.lhs().nont() + "[" + str(la[0]) + "]")
+            for arg in rule.lhs().args():
+                lhs_la.add_arg(arg)
+            nonts = [rhs_nont + "[" + str(la[1 + k]) + "]" for k, rhs_nont in enumerate(rule.rhs())]
+            new_grammar.add_rule(lhs_la, nonts, weights[j], rule.dcp())
 
     return new_grammar
 
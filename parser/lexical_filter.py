@@ -0,0 +1,149 @@
+"""Per-rule profiles of an LCFRS and lexical filtering of rules per input"""
+from __future__ import print_function
+# Before a parser instantiates a rule for some input, the rule can often be
+# discarded on cheap grounds: one of its terminals does not occur (often
+# enough) in the input, or its yield cannot be shorter than the input (or
+# than the part of the input that is left). The profile of a rule (terminal
+# multiset, minimum yield length per LHS member and component, fanout) is
+# computed once per grammar. The minimum yield of a nonterminal is the least
+# fixpoint over all rules, hence the bounds are exact also for grammars with
+# empty arguments, and rules with unproductive RHS nonterminals are marked.
+
+from collections import Counter
+
+from grammar.lcfrs import LCFRS_var
+
+INFINITY = float('inf')
+
+
+class RuleProfile:
+    """
+    Terminals and minimum yield lengths of a rule.
+    """
+    def __init__(self, rule, min_yields):
+        """
+        :param rule:
+        :type rule: LCFRS_rule
+        :param min_yields: minimum yield length of each component per nonterminal
+        :type min_yields: dict[str, tuple[int]]
+        """
+        self.idx = rule.get_idx()
+        self.nont = rule.lhs().nont()
+        self.fanout = rule.lhs().fanout()
+        self.terms = Counter()
+        # some RHS nonterminal does not derive any string
+        self.productive = all(rule.rhs_nont(i) in min_yields for i in range(rule.rank()))
+        members = []
+        for arg in rule.lhs().args():
+            lengths = []
+            for mem in arg:
+                if isinstance(mem, LCFRS_var):
+                    lengths.append(min_yields[rule.rhs_nont(mem.mem)][mem.arg] if self.productive else INFINITY)
+                else:
+                    self.terms[mem] += 1
+                    lengths.append(1)
+            members.append(tuple(lengths))
+        # member_lengths[i][j]: minimum yield length of the j-th member of the i-th LHS argument
+        self.member_lengths = tuple(members)
+        self.min_lengths = tuple(sum(lengths) for lengths in members)
+        # suffix_lengths[i]: minimum yield length of the components i, ..., fanout - 1
+        suffix = [0]
+        for length in reversed(self.min_lengths):
+            suffix.append(suffix[-1] + length)
+        self.suffix_lengths = tuple(reversed(suffix))
+        self.min_length = self.suffix_lengths[0]
+
+
+def min_yields(grammar):
+    """
+    :param grammar:
+    :type grammar: LCFRS
+    :return: minimum yield length of each component of each productive nonterminal
+    :rtype: dict[str, tuple[int]]
+    """
+    yields = {}
+    changed = True
+    while changed:
+        changed = False
+        for rule in grammar.rules():
+            if not all(rule.rhs_nont(i) in yields for i in range(rule.rank())):
+                continue
+            lengths = tuple(sum(yields[rule.rhs_nont(mem.mem)][mem.arg] if isinstance(mem, LCFRS_var) else 1
+                                for mem in arg)
+                            for arg in rule.lhs().args())
+            nont = rule.lhs().nont()
+            current = yields.get(nont)
+            if current is not None:
+                lengths = tuple(min(old, new) for old, new in zip(current, lengths))
+            if lengths != current:
+                yields[nont] = lengths
+                changed = True
+    return yields
+
+
+def rule_profiles(grammar):
+    """
+    :param grammar:
+    :type grammar: LCFRS
+    :return: profiles of all rules by rule idx
+    :rtype: dict[int, RuleProfile]
+    """
+    yields = min_yields(grammar)
+    return dict((rule.get_idx(), RuleProfile(rule, yields)) for rule in grammar.rules())
+
+
+class LexicalFilter:
+    """
+    Decides for the rules of a grammar whether they can be used in some derivation of an input.
+    The rule profiles are memoized with the grammar, cf. LCFRS.compiled.
+    """
+    def __init__(self, grammar, inp):
+        """
+        :param grammar:
+        :type grammar: LCFRS
+        :param inp: input
+        :type inp: list[str]
+        """
+        self.__profiles = grammar.compiled('rule_profiles', rule_profiles)
+        self.__counts = Counter(inp)
+        self.__length = len(inp)
+        self.__admitted = {}
+
+    def profile(self, rule):
+        """
+        :type rule: LCFRS_rule
+        :rtype: RuleProfile
+        """
+        return self.__profiles[rule.get_idx()]
+
+    def admits(self, rule):
+        """
+        :param rule:
+        :type rule: LCFRS_rule
+        :return: whether every terminal of rule occurs in the input (at least as often as in rule) and \
+            the minimum yield of rule fits into the input
+        :rtype: bool
+        """
+        idx = rule.get_idx()
+        admitted = self.__admitted.get(idx)
+        if admitted is None:
+            profile = self.__profiles[idx]
+            admitted = self.__admitted[idx] = profile.productive and profile.min_length <= self.__length \
+                and all(self.__counts[term] >= count for term, count in profile.terms.items())
+        return admitted
+
+    def fits(self, rule, component, remaining):
+        """
+        :param rule:
+        :type rule: LCFRS_rule
+        :param component: first component
+        :type component: int
+        :param remaining: number of input positions left
+        :type remaining: int
+        :return: whether the components component, ..., fanout - 1 of rule fit into remaining positions
+        :rtype: bool
+        """
+        return self.__profiles[rule.get_idx()].suffix_lengths[component] <= remaining
+
+
+__all__ = ["RuleProfile", "LexicalFilter", "rule_profiles", "min_yields"]
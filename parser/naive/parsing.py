@@ -1,5 +1,8 @@
 # Parsing of string with LCFRS/DCP hybrid grammar.
 from __future__ import print_function
+import gc
+import heapq
+import itertools
 import math
 import sys
 import re
@@ -9,12 +12,16 @@ from grammar.lcfrs import *
 from parser.naive.derivation import Derivation
 from grammar.dcp import *
 from parser.parser_interface import AbstractParser
+from parser.lexical_filter import LexicalFilter
 from collections import namedtuple, defaultdict
+from operator import itemgetter
 
 RULE = 0
 PAIR = 1
 KEY = 2
 
+INFINITY = float('inf')
+
 if sys.version_info[0] == 3:
     unicode = str
 
@@ -393,6 +400,252 @@ def make_rule_instances_from_members(instance, members, args, inp, pos):
                                                     rest_mems, args, inp, pos)
 
 
+#######################################################
+# Outside estimates for the Viterbi agenda.
+
+# Admissible and monotone estimate of the outside weight (-log) of passive
+# items: each input position outside of the spans of an item is generated by
+# some rule of the outside derivation. A rule with weight w and n terminals
+# contributes at least -log(w) / n per terminal, hence every position costs at
+# least the minimum of these shares among the rules that contain its terminal.
+class TerminalOutsideEstimate:
+    # grammar: LCFRS
+    def __init__(self, grammar):
+        self.__costs = {}
+        for rule in grammar.rules():
+            terms = rule.terms()
+            if terms and rule.weight() > 0:
+                share = -math.log(rule.weight()) / len(terms)
+                for term in terms:
+                    self.__costs[term] = min(share, self.__costs.get(term, share))
+        self.__inp = None
+        self.__prefix = [0.0]
+
+    # Estimate for the passive item nont(spans) of inp.
+    # nont: string
+    # spans: list of Span
+    # inp: list of string
+    # return: float
+    def __call__(self, nont, spans, inp):
+        if inp is not self.__inp:
+            self.__inp = inp
+            self.__prefix = [0.0]
+            for term in inp:
+                # terminals of no rule cannot be generated, any estimate is admissible then
+                self.__prefix.append(self.__prefix[-1] + self.__costs.get(term, 0.0))
+        inside = sum(self.__prefix[span.high] - self.__prefix[span.low] for span in spans)
+        return max(0.0, self.__prefix[-1] - inside)
+
+
+#######################################################
+# Chart layer.
+
+# The members of the LHS of a rule (terminals, variables, and empty
+# arguments) are numbered consecutively as slots. The state of an item of
+# the rule is a flat tuple of ints: position 0, followed by the boundaries
+# (low, high) of all slots, where -1 marks variables that are not
+# instantiated yet. Terminals (and empty arguments) are instantiated once per
+# input, the variables of the i-th RHS nonterminal when the dot moves over
+# it. A passive item is given by its nonterminal and the flat tuple of
+# boundaries of its components.
+# The keys of items in the chart are
+#   (KEY, nont, boundaries) for passive items and
+#   (KEY, layout, dot, state) for active items.
+TERM_SLOT = 0
+VAR_SLOT = 1
+EMPTY_SLOT = 2
+
+
+# Index of low (high) boundary of slot in state.
+def low_index(slot):
+    return 2 * slot + 1
+
+
+def high_index(slot):
+    return 2 * slot + 2
+
+
+class RuleLayout:
+    # rule: LCFRS_rule
+    def __init__(self, rule):
+        self.rule = rule
+        self.nont = rule.lhs().nont()
+        self.rank = rule.rank()
+        self.rhs = list(rule.rhs())
+        self.kinds = []
+        self.terms = []
+        self.arg_starts = []
+        # for each argument: first and last slot
+        arg_slots = []
+        var_slots = [[] for _ in range(self.rank)]
+        for arg in rule.lhs().args():
+            first = len(self.kinds)
+            if len(arg) == 0:
+                self.__add_slot(EMPTY_SLOT, None, True)
+            for i, mem in enumerate(arg):
+                if isinstance(mem, str) or isinstance(mem, unicode):
+                    self.__add_slot(TERM_SLOT, mem, i == 0)
+                else:
+                    var_slots[mem.mem].append((mem.arg, len(self.kinds)))
+                    self.__add_slot(VAR_SLOT, None, i == 0)
+            arg_slots.append((first, len(self.kinds) - 1))
+        # var_slots[i][j]: slot of variable x_{i,j}
+        self.var_slots = [[slot for _, slot in sorted(slots)] for slots in var_slots]
+        self.size = high_index(len(self.kinds) - 1) + 1
+        self.boundaries = itemgetter(*[i for first, last in arg_slots for i in (low_index(first), high_index(last))])
+        self.checks = []
+        self.advance = []
+        self.starts = []
+        for dot in range(self.rank):
+            new = dict((slot, arg) for arg, slot in enumerate(self.var_slots[dot]))
+
+            # index of low (high) boundary of slot in state + spans of passive item
+            def low(slot):
+                return self.size + 2 * new[slot] if slot in new else low_index(slot)
+
+            def high(slot):
+                return self.size + 2 * new[slot] + 1 if slot in new else high_index(slot)
+
+            self.checks.append(self.__checks(dot, new, low, high))
+            if dot + 1 < self.rank:
+                indices = [0] + [i for slot in range(len(self.kinds)) for i in (low(slot), high(slot))]
+            else:
+                indices = [i for first, last in arg_slots for i in (low(first), high(last))]
+            self.advance.append(itemgetter(*indices))
+            self.starts.append(self.__start_bounds(dot))
+
+    def __add_slot(self, kind, term, arg_start):
+        self.kinds.append(kind)
+        self.terms.append(term)
+        self.arg_starts.append(arg_start)
+
+    # Slots that are instantiated in items with given dot.
+    # dot: int
+    # return: set of int
+    def bound_slots(self, dot):
+        bound = set(slot for slot, kind in enumerate(self.kinds) if kind != VAR_SLOT)
+        for i in range(dot):
+            bound.update(self.var_slots[i])
+        return bound
+
+    # The consistency conditions of LHS_instance.consistent() relate each
+    # instantiated slot to the previous instantiated slot. When the dot moves
+    # over the i-th RHS nonterminal, only the conditions that involve one of
+    # its variables need to be checked. A check (high, low, adjacent, gap)
+    # compares two boundaries in state + spans of the passive item: low must
+    # be equal to high if adjacent, and at least high + gap otherwise.
+    # return: tuple of tuple
+    def __checks(self, dot, new, low, high):
+        bound = self.bound_slots(dot + 1)
+        checks = []
+        previous = -1
+        for slot in sorted(bound):
+            if previous in new or slot in new:
+                adjacent = previous == slot - 1 and not self.arg_starts[slot]
+                gap = len([s for s in range(previous + 1, slot) if s not in bound])
+                checks.append((high(previous) if previous >= 0 else 0, low(slot), adjacent, gap))
+            previous = slot
+        return tuple(checks)
+
+    # Where the first component of the i-th RHS nonterminal may start and end:
+    # (index of high of previous instantiated slot (or 0), whether the
+    # component must start there, minimal number of positions in between,
+    # index of low of next instantiated slot or -1, index of low of the
+    # instantiated slot where the component must end or -1)
+    # dot: int
+    # return: tuple
+    def __start_bounds(self, dot):
+        bound = self.bound_slots(dot)
+        first = self.var_slots[dot][0]
+        previous = max([slot for slot in bound if slot < first] or [-1])
+        following = min([slot for slot in bound if slot > first] or [-1])
+        exact = previous == first - 1 and not self.arg_starts[first]
+        gap = len([s for s in range(previous + 1, first) if s not in bound])
+        end = following == first + 1 and not self.arg_starts[following]
+        return (high_index(previous) if previous >= 0 else 0), exact, gap, \
+            (low_index(following) if following >= 0 else -1), (low_index(following) if end else -1)
+
+
+# Scan of the instantiated slots as in LHS_instance.consistent().
+# layout: RuleLayout
+# state: list of int
+# return: bool
+def slots_consistent(layout, state):
+    pos = 0
+    gap = True
+    for slot, arg_start in enumerate(layout.arg_starts):
+        if arg_start:
+            gap = True
+        low = state[low_index(slot)]
+        if low >= 0:
+            if low < pos or not gap and low != pos:
+                return False
+            pos = state[high_index(slot)]
+            gap = False
+        else:
+            gap = True
+            pos += 1
+    return True
+
+
+# Minimum yield length of each slot, given the minimum yield lengths of the
+# members of the LHS (cf. RuleProfile.member_lengths).
+# member_lengths: list of list of int
+# return: list of int
+def slot_lengths(member_lengths):
+    return [length for arg in member_lengths for length in (arg or (0,))]
+
+
+# For layout and input, instantiate terminals and empty arguments in all
+# consistent ways (cf. make_rule_instances). A slot is only placed where the
+# slots before and after it fit into the input.
+# layout: RuleLayout
+# inp: list of string
+# lengths: list of int (minimum yield length of each slot, by default 1 for
+#   terminals and 0 otherwise)
+# return: list of tuple of int
+def instantiate_terminals(layout, inp, lengths=None):
+    if lengths is None:
+        lengths = [1 if kind == TERM_SLOT else 0 for kind in layout.kinds]
+    # earliest and latest low boundary of each slot
+    bounds = []
+    before, after = 0, sum(lengths)
+    for length in lengths:
+        after -= length
+        bounds.append((before, len(inp) - after - length))
+        before += length
+    states = []
+    instantiate_slots(layout, inp, [0] + [-1] * (layout.size - 1), 0, 0, states, bounds)
+    return states
+
+
+# layout: RuleLayout
+# inp: list of string
+# state: list of int (instantiated up to slot)
+# slot: int
+# pos: int (first position for the next terminal)
+# states: list of tuple of int (output)
+# bounds: list of pair of int (earliest and latest low boundary of each slot)
+def instantiate_slots(layout, inp, state, slot, pos, states, bounds):
+    while slot < len(layout.kinds) and layout.kinds[slot] == VAR_SLOT:
+        slot += 1
+    if slot == len(layout.kinds):
+        states.append(tuple(state))
+        return
+    first, last = bounds[slot]
+    positions = range(max(pos, first), last + 1)
+    if layout.kinds[slot] == TERM_SLOT:
+        term = layout.terms[slot]
+        candidates = [(i, i + 1) for i in positions if inp[i] == term]
+    else:
+        candidates = [(i, i) for i in positions]
+    for low, high in candidates:
+        state[low_index(slot)], state[high_index(slot)] = low, high
+        if slots_consistent(layout, state):
+            instantiate_slots(layout, inp, state, slot + 1, high, states, bounds)
+    state[low_index(slot)] = state[high_index(slot)] = -1
+
+
 #######################################################
 # Parser.
 
@@ -403,15 +656,22 @@ class LCFRS_parser(AbstractParser):
     # Constructor.
     # grammar: LCFRS
     # inp: list of string
-    def __init__(self, grammar, input=None, save_preprocess=None, load_preprocess=None):
+    # viterbi: bool (if set, items are explored best-first and parsing stops as soon as the start item is
+    #   popped; only the best trace of each item is kept, which suffices for best and best_derivation_tree;
+    #   requires rule weights <= 1)
+    # outside_estimate: function (nont, list of Span, inp) -> float, a lower bound of the -log weight of the
+    #   outside of the passive item (admissible and monotone, e.g., TerminalOutsideEstimate); turns the
+    #   Viterbi agenda into A*
+    def __init__(self, grammar, input=None, save_preprocess=None, load_preprocess=None, viterbi=False,
+                 outside_estimate=None):
         super(LCFRS_parser, self).__init__(grammar, input)
         self.__g = grammar
-        self.__nont_items = defaultdict(list)
-        self.__rule_items = defaultdict(list)
-        self.__agenda = []
-        self.__agenda_set = set()
-        self.__trace = defaultdict(list)
-        self.__best = {}
+        self.__viterbi = viterbi or outside_estimate is not None
+        self.__outside_estimate = outside_estimate
+        # rule idx -> RuleLayout
+        self.__layouts = {}
+        self.__counter = itertools.count()
+        self.clear()
         self.__inp = input
         if self.__inp is not None:
             self.__parse()
@@ -426,114 +686,214 @@ class LCFRS_parser(AbstractParser):
 
     def clear(self):
         self.__inp = None
-        self.__nont_items = defaultdict(list)
-        self.__rule_items = defaultdict(list)
+        # Passive items and waiting active items are indexed per nonterminal
+        # by the left boundary low of the first component, or by low and high
+        # if the active item determines both (encoded as (low + 1) * (n + 1) + high).
+        # nont -> position(s) -> keys of passive items
+        self.__passive = defaultdict(lambda: defaultdict(list))
+        # nont -> position(s) -> (layout, dot, state, trace, inside weight, limit) of active items whose
+        # next RHS nonterminal is nont, and whose first component ends at limit at the latest
+        self.__waiting = defaultdict(lambda: defaultdict(list))
+        # rule idx -> states with instantiated terminals
+        self.__instances = {}
+        # nonterminals whose corner rules are waiting
+        self.__corners = set()
+        self.__filter = None
         self.__agenda = []
         self.__agenda_set = set()
         self.__trace = defaultdict(list)
         self.__best = {}
+        self.__inside = {}
+
+    # Rules that do not pass the lexical filter have no instances.
+    # rule: LCFRS_rule
+    # return: pair of RuleLayout (or None) and list of tuple of int
+    def __rule_instances(self, rule):
+        idx = rule.get_idx()
+        states = self.__instances.get(idx)
+        if states is None:
+            if not self.__filter.admits(rule):
+                states = self.__instances[idx] = []
+                return None, states
+            lengths = slot_lengths(self.__filter.profile(rule).member_lengths)
+            states = self.__instances[idx] = instantiate_terminals(self.__layout(rule), self.__inp, lengths)
+        return self.__layout(rule), states
 
+    # rule: LCFRS_rule
+    # return: RuleLayout
+    def __layout(self, rule):
+        idx = rule.get_idx()
+        layout = self.__layouts.get(idx)
+        if layout is None:
+            layout = self.__layouts[idx] = RuleLayout(rule)
+        return layout
+
+    # The chart consists of many small tuples without reference cycles, hence
+    # the cyclic garbage collector is suspended during deduction.
     def __parse(self):
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self.__deduce()
+        finally:
+            if enabled:
+                gc.enable()
+
+    def __deduce(self):
         inp = self.__inp
-        inp_len = len(inp)
+        self.__filter = LexicalFilter(self.__g, inp)
+        width = len(inp) + 1
+        goal = self.__goal()
         for rule in self.__g.epsilon_rules():
-            for inst in make_rule_instances(rule, inp):
-                self.__record_item(inst, rule)
+            layout, states = self.__rule_instances(rule)
+            for state in states:
+                self.__record_item((KEY, layout.nont, layout.boundaries(state)), rule, self.__rule_weight(rule))
         for term in set(inp):
             for rule in self.__g.lex_rules(term):
-                for inst in make_rule_instances(rule, inp):
-                    self.__record_item(inst, rule)
+                layout, states = self.__rule_instances(rule)
+                for state in states:
+                    self.__record_item((KEY, layout.nont, layout.boundaries(state)), rule, self.__rule_weight(rule))
         while len(self.__agenda) != 0:
-            item = self.__agenda.pop()
-            if isinstance(item, LHS_instance):
-                low = item.left_position()
-                nont = item.nont()
-                # key = str(low) + ' ' + nont
-                key = low, nont
-                self.__nont_items[key].append(item)
-                for rule_item in self.__rule_items[key]:
-                    # self.__combine(rule_item, item, rule_item.key(), str(item))
-                    self.__combine(rule_item, item, (KEY, rule_item.new_key()), (KEY, item.new_key()))
-                for rule in self.__g.nont_corner_of(nont):
-                    for inst in make_rule_instances(rule, inp):
-                        # self.__combine(inst, item, rule, str(item))
-                        self.__combine(inst, item, rule, (KEY, item.new_key()))
-
-            else:  # instance of Rule_instance
-                (low, high) = item.next_member_bounds(inp_len)
-                nont = item.next_nont()
-                # these are possible start positions for the next nont_item for A_i
-                # there might be multiple, if a variable precedes x_i,0
-                for pos in range(low, high + 1):
-                    # key = str(pos) + ' ' + nont
-                    key = pos, nont
-                    self.__rule_items[key].append(item)
-                    for nont_item in self.__nont_items[key]:
-                        # self.__combine(item, nont_item, item.key(), str(nont_item))
-                        self.__combine(item, nont_item, (KEY, item.new_key()), (KEY, nont_item.new_key()))
-
-                        # key = low, nont
-                        # self.__rule_items[key].append(item)
-                        # for nont_item in self.__nont_items[key]:
-                        #     # self.__combine(item, nont_item, item.key(), str(nont_item))
-                        #     self.__combine(item, nont_item, (KEY, item.new_key()), (KEY, nont_item.new_key()))
-
-    # Combine rule item with nont item.
-    # rule_item: Rule_instance
-    # nont_item: LHS_instance
-    # rule_trace: string or LCFRS_rule
-    # nont_trace: string
-    def __combine(self, rule_item, nont_item, rule_trace, nont_trace):
-        lhs = rule_item.lhs().clone()
-        dot = rule_item.dot()
-        # for i in range(nont_item.fanout()):
-        #     arg = nont_item.arg(i)
-        #     low = arg[0].low
-        #     high = arg[0].high
-        #     lhs.replace(dot, i, Span(low, high))
-        # if lhs.consistent():
-        if lhs.replace_consistent(dot, nont_item):
-            advanced_item = Rule_instance(rule_item.rule(), lhs, dot=dot + 1)
-            self.__record_item(advanced_item, (PAIR, rule_trace, nont_trace))
-
-    def __record_item(self, item, trace):
+            if self.__viterbi:
+                key = self.__pop_best()
+                if key is None:
+                    continue
+                if key == goal:
+                    break
+            else:
+                key = self.__agenda.pop()
+            if len(key) == 3:
+                _, nont, spans = key
+                if nont not in self.__corners:
+                    # rule items with dot 0 wait for the first passive item of their corner
+                    self.__corners.add(nont)
+                    for rule in self.__g.nont_corner_of(nont):
+                        layout, states = self.__rule_instances(rule)
+                        for state in states:
+                            self.__wait(layout, 0, state, rule, self.__rule_weight(rule))
+                low = spans[0]
+                span = (low + 1) * width + spans[1]
+                passive = self.__passive[nont]
+                passive[low].append(key)
+                passive[span].append(key)
+                waiting = self.__waiting[nont]
+                inside = self.__inside.get(key, 0.0)
+                high = spans[1]
+                for layout, dot, state, rule_trace, weight, limit in waiting.get(low, ()):
+                    if high <= limit:
+                        self.__combine(layout, dot, state, spans, rule_trace, key, weight + inside)
+                for layout, dot, state, rule_trace, weight, _ in waiting.get(span, ()):
+                    self.__combine(layout, dot, state, spans, rule_trace, key, weight + inside)
+            else:
+                _, layout, dot, state = key
+                self.__wait(layout, dot, state, key, self.__inside.get(key, 0.0))
+
+    # Register active item in index and combine it with the passive items found so far.
+    # layout: RuleLayout
+    # dot: int
+    # state: tuple of int
+    # rule_trace: LCFRS_rule (if dot = 0) or key of active item
+    # weight: float (inside weight of active item, if Viterbi agenda)
+    def __wait(self, layout, dot, state, rule_trace, weight):
+        width = len(self.__inp) + 1
+        nont = layout.rhs[dot]
+        previous, exact, gap, following, end = layout.starts[dot]
+        low = state[previous] + gap
+        # the first component ends at limit at the latest
+        limit = state[following] if following >= 0 else width - 1
+        high = low if exact else limit - 1
+        waiting = self.__waiting[nont]
+        passive = self.__passive[nont]
+        entry = layout, dot, state, rule_trace, weight, limit
+        for pos in range(low, high + 1):
+            index = pos if end < 0 else (pos + 1) * width + state[end]
+            waiting[index].append(entry)
+            for nont_trace in passive.get(index, ()):
+                if nont_trace[2][1] <= limit:
+                    self.__combine(layout, dot, state, nont_trace[2], rule_trace, nont_trace,
+                                   weight + self.__inside.get(nont_trace, 0.0))
+
+    # Move the dot of an item over the next RHS nonterminal, instantiated by a passive item.
+    # layout: RuleLayout
+    # dot: int
+    # state: tuple of int
+    # spans: tuple of int (boundaries of passive item)
+    # rule_trace: LCFRS_rule (if dot = 0) or key of active item
+    # nont_trace: key of passive item
+    # inside: float (sum of inside weights of both items, if Viterbi agenda)
+    def __combine(self, layout, dot, state, spans, rule_trace, nont_trace, inside):
+        values = state + spans
+        for high, low, adjacent, gap in layout.checks[dot]:
+            if values[low] != values[high] if adjacent else values[low] < values[high] + gap:
+                return
+        if dot + 1 == layout.rank:
+            key = KEY, layout.nont, layout.advance[dot](values)
+        else:
+            key = KEY, layout, dot + 1, layout.advance[dot](values)
+        if self.__viterbi:
+            self.__record_weighted_item(key, (PAIR, rule_trace, nont_trace), inside)
+        else:
+            if key not in self.__agenda_set:
+                self.__agenda_set.add(key)
+                self.__agenda.append(key)
+            self.__trace[key].append((PAIR, rule_trace, nont_trace))
+
+    def __record_item(self, key, trace, inside):
         """
-        :type item: Rule_instance
+        :param key: key of passive or active item, cf. RuleLayout
         :param trace: pair or LCFRS_rule
+        :param inside: inside weight (-log) of item w.r.t. trace (only used by Viterbi agenda)
         :return:
         """
-        if item.complete():
-            lhs = item.lhs()
-            lhs.collapse()
-            # key = str(lhs)
-            key = KEY, lhs.new_key()
-            if key not in self.__agenda_set:
-                self.__agenda_set.add(key)
-                self.__agenda.append(lhs)
-            self.__trace[key].append(trace)
+        if self.__viterbi:
+            self.__record_weighted_item(key, trace, inside)
         else:
-            key = KEY, item.new_key()
-            # key = item.key()
             if key not in self.__agenda_set:
                 self.__agenda_set.add(key)
-                self.__agenda.append(item)
+                self.__agenda.append(key)
             self.__trace[key].append(trace)
 
-    # Start item (which if presence indicates recognition).
-    # return: LHS_instance
-    def __start_item(self):
-        start_lhs = LHS_instance(self.__g.start())
-        start_lhs.add_arg()
-        start_lhs.add_mem(Span(0, len(self.__inp)))
-        return start_lhs
+    # Viterbi agenda: the agenda is a heap of (priority, counter, key), where
+    # the priority is the inside weight (-log) of the item plus the outside
+    # estimate of passive items. Both antecedents of a trace have already
+    # been popped, i.e., their inside weights are final. An item keeps only
+    # its best trace and is pushed again if that improves; stale entries are
+    # skipped in __pop_best. __agenda_set holds the popped items.
+    def __record_weighted_item(self, key, trace, inside):
+        if key in self.__agenda_set or inside >= self.__inside.get(key, INFINITY):
+            return
+        priority = inside
+        if self.__outside_estimate is not None and len(key) == 3:
+            priority += self.__outside_estimate(key[1], new_extract_spans(key), self.__inp)
+        self.__inside[key] = inside
+        self.__trace[key] = [trace]
+        heapq.heappush(self.__agenda, (priority, next(self.__counter), key))
+
+    # Pop item with least priority, or None if it was popped before.
+    # return: key
+    def __pop_best(self):
+        _, _, key = heapq.heappop(self.__agenda)
+        if key in self.__agenda_set:
+            return None
+        self.__agenda_set.add(key)
+        return key
+
+    # Inside weight of rule (only computed for Viterbi agenda).
+    # rule: LCFRS_rule
+    # return: float
+    def __rule_weight(self, rule):
+        return -math.log(rule.weight()) if self.__viterbi else 0.0
+
+    # Key of start item (which if presence indicates recognition).
+    # return: tuple
+    def __goal(self):
+        return KEY, self.__g.start(), (0, len(self.__inp))
 
     # Return weight of best derivation.
     # Or -1 when none found.
     # return: float
     def best(self):
-        start_lhs = self.__start_item()
-        # elem = str(start_lhs)
-        elem = KEY, start_lhs.new_key()
+        elem = self.__goal()
         trace = self.__trace[elem]
         if len(trace) == 0:
             return -1
@@ -546,37 +906,45 @@ class LCFRS_parser(AbstractParser):
     def __find_best_from(self, elem):
         # if isinstance(elem, str) or isinstance(elem, unicode):
         if isinstance(elem, tuple) and elem[0] == KEY:
-            if elem in self.__best:
-                return self.__best[elem]
-            else:
+            best = self.__best.get(elem)
+            if best is None:
                 self.__best[elem] = sys.float_info.max  # avoid cycles
-                traces = self.__trace[elem]
                 best = sys.float_info.max
-                for trace in traces:
-                    best = min(best, self.__find_best_from(trace))
+                best_of = self.__best
+                for trace in self.__trace[elem]:
+                    # pairs are resolved here to save a level of recursion
+                    if isinstance(trace, tuple):
+                        left = best_of.get(trace[1])
+                        if left is None:
+                            left = self.__find_best_from(trace[1])
+                        right = best_of.get(trace[2])
+                        if right is None:
+                            right = self.__find_best_from(trace[2])
+                        weight = left + right
+                    else:
+                        weight = self.__find_best_from(trace)
+                    if weight < best:
+                        best = weight
                 self.__best[elem] = best
-                return best
+            return best
         elif isinstance(elem, tuple) and elem[0] == PAIR:
             # return self.__find_best_from(elem[0]) + self.__find_best_from(elem[1])
             return self.__find_best_from(elem[1]) + self.__find_best_from(elem[2])
         else:
-            return -math.log(elem.weight())
+            weight = self.__best[elem] = -math.log(elem.weight())
+            return weight
 
     # Recognized?
     # return: bool
     def recognized(self):
-        start_lhs = self.__start_item()
-        # elem = str(start_lhs)
-        elem = KEY, start_lhs.new_key()
+        elem = self.__goal()
         trace = self.__trace[elem]
         return len(trace) > 0
 
     # Return best derivation or None.
     # return: Derivation
     def best_derivation_tree(self):
-        start_lhs = self.__start_item()
-        # elem = str(start_lhs)
-        elem = KEY, start_lhs.new_key()
+        elem = self.__goal()
         trace = self.__trace[elem]
         if len(trace) == 0:
             return None
@@ -653,7 +1021,7 @@ def new_dot_position(key):
         return 0
     # elif: isinstance(key, tuple) and key[0] == KEY:
     else:
-        return key[1][1]
+        return key[2]
 
 
 # extract spans from key-string of passive item
@@ -668,12 +1036,13 @@ def extract_spans(key):
     return spans
 
 
+# extract spans from key of passive item
+# key: tuple (KEY, nont, boundaries)
+# return: list of Span
 def new_extract_spans(key):
     # assert key[0] == KEY
-    spans = []
-    for low, high in list(key[1][1]):
-        spans.append(Span(low, high))
-    return spans
+    boundaries = key[2]
+    return [Span(boundaries[i], boundaries[i + 1]) for i in range(0, len(boundaries), 2)]
 
 
-__all__ = ["LCFRS_parser", "LHS_instance", "Span"]
\ No newline at end of file
+__all__ = ["LCFRS_parser", "LHS_instance", "Span", "TerminalOutsideEstimate"]
\ No newline at end of file
@@ -3,6 +3,7 @@ import grammar.lcfrs_derivation
 from grammar.lcfrs import LCFRS
 import grammar.dcp as gd
 import hybridtree.general_hybrid_tree as gh
+from hybridtree.frozen_hybrid_tree import FrozenHybridTree
 import parser.parser_interface as pi
 from collections import defaultdict
 
@@ -16,7 +17,7 @@ DEF ENCODE_TERMINALS = True
 cdef HybridTree[TERMINAL, int]* convert_hybrid_tree(p_tree, term_labelling, terminal_encoding=str) except * :
     # output_helper_utf8("convert hybrid tree: " + str(p_tree))
     cdef HybridTree[TERMINAL, int]* c_tree = new HybridTree[TERMINAL, int]()
-    assert isinstance(p_tree, gh.HybridTree)
+    assert isinstance(p_tree, (gh.HybridTree, FrozenHybridTree))
     cdef vector[int] linearization = [-1] * len(p_tree.id_yield())
     c_tree[0].set_entry(0)
     # output_helper_utf8(str(p_tree.root))
@@ -36,6 +37,7 @@ cdef pair[int,int] insert_nodes_recursive(p_tree, HybridTree[TERMINAL, int]* c_t
     max_id += 1
 
     if p_tree.in_ordering(p_id):
+        # labelled without position (as in grammar induction), since labels may depend on the position
         c_tree[0].add_node(pred_id, terminal_encoding(term_labelling.token_tree_label(p_tree.node_token(p_id))), terminal_encoding(term_labelling.token_label(p_tree.node_token(p_id))), c_id)
         linearization[p_tree.node_index(p_id)] = c_id
     else:
@@ -431,6 +433,13 @@ class SDCPDerivation(grammar.lcfrs_derivation.LCFRSDerivation):
         return new_deriv, range(first, child_idx + 1)
 
 
+def labelling_key(term_labelling):
+    """
+    :return: key of the terminal labelling for compiled parsers (cf. LCFRS.compiled)
+    """
+    return None if term_labelling is None else term_labelling.cache_key()
+
+
 class PysDCPParser(pi.AbstractParser):
     def __init__(self, grammar, input=None, debug=False, terminal_labelling=None):
         self.grammar = grammar
@@ -440,7 +449,8 @@ class PysDCPParser(pi.AbstractParser):
             self.clear()
             self.parse()
         else:
-            self.parser = self.__preprocess(grammar, terminal_labelling, debug=debug)
+            self.parser = grammar.compiled(('sdcp', labelling_key(terminal_labelling), debug),
+                                           lambda g: PysDCPParser.__preprocess(g, terminal_labelling, debug))
 
     def parse(self):
         self.parser.set_input(self.input)
@@ -499,7 +509,8 @@ class PysDCPParser(pi.AbstractParser):
         """
         :type grammar: LCFRS
         """
-        grammar.sdcp_parser = PysDCPParser.__preprocess(grammar, term_labelling, debug)
+        grammar.sdcp_parser = grammar.compiled(('sdcp', labelling_key(term_labelling), debug),
+                                               lambda g: PysDCPParser.__preprocess(g, term_labelling, debug))
 
 
 class LCFRS_sDCP_Parser(PysDCPParser):
@@ -511,7 +522,8 @@ class LCFRS_sDCP_Parser(PysDCPParser):
             self.clear()
             self.parse()
         else:
-            self.parser = LCFRS_sDCP_Parser.__preprocess(grammar, terminal_labelling, debug=debug)
+            self.parser = grammar.compiled(('lcfrs-sdcp', labelling_key(terminal_labelling), debug),
+                                           lambda g: LCFRS_sDCP_Parser.__preprocess(g, terminal_labelling, debug))
 
     @staticmethod
     def __preprocess(grammar, term_labelling, debug=False):
@@ -543,7 +555,8 @@ class LCFRS_sDCP_Parser(PysDCPParser):
         """
         :type grammar: LCFRS
         """
-        grammar.sdcp_parser = LCFRS_sDCP_Parser.__preprocess(grammar, term_labelling, debug)
+        grammar.sdcp_parser = grammar.compiled(('lcfrs-sdcp', labelling_key(term_labelling), debug),
+                                               lambda g: LCFRS_sDCP_Parser.__preprocess(g, term_labelling, debug))
 
 
 __all__ = ["PysDCPParser", "LCFRS_sDCP_Parser", "print_grammar"]
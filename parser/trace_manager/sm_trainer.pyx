@@ -18,6 +18,7 @@ import random
 import grammar.lcfrs as gl
 import grammar.rtg as gr
 import itertools
+import numpy as np
 from util.enumerator import Enumerator
 from collections import defaultdict
 
@@ -27,6 +28,20 @@ DEF ENCODE_TERMINALS = True
 DEF IO_PRECISION_DEFAULT = 0.000001
 DEF IO_CYCLE_LIMIT_DEFAULT = 200
 
+
+def normalize_groups(weights, groups):
+    """
+    :param weights: weight of each rule
+    :param groups: normalization group of each rule (cf. LCFRS.lhs_groups)
+    :return: weights divided by the total weight of their group; uniform weights in groups with total weight 0
+    :rtype: numpy.ndarray
+    """
+    weights = np.asarray(weights, dtype=np.double)
+    totals = np.bincount(groups, weights=weights)[groups]
+    sizes = np.bincount(groups)[groups]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(totals > 0, weights / totals, 1.0 / sizes)
+
 cdef extern from "Trainer/EMTrainer.h" namespace "Trainer":
     cdef cppclass EMTrainer[Nonterminal, TraceID]:
         vector[double] do_em_training[SemiRing](vector[double], vector[vector[unsigned_int]], unsigned)
@@ -153,10 +168,11 @@ cdef class PyEMTrainer:
                 normalization_group.append(rule_idx)
                 rule_to_group[rule_idx] = self.traceManager.get_nonterminal_map().object_index(nont)
             normalization_groups.append(normalization_group)
+        rfe_weights = grammar.weights().tolist()
         initial_weights = [0.0] * 0
         for i in range(0, len(rtg.rules)):
             if init == "rfe":
-                prob = grammar.rule_index(i).weight()
+                prob = rfe_weights[i]
             elif init == "equal" or True:
                 prob = 1.0 / len(normalization_groups[rule_to_group[i]])
 
@@ -172,16 +188,7 @@ cdef class PyEMTrainer:
 
         # restore properness
         if tie_breaking:
-            for group in normalization_groups:
-                group_sum = 0.0
-                for idx in group:
-                    group_sum += initial_weights[idx]
-                if group_sum > 0:
-                    for idx in group:
-                        initial_weights[idx] = initial_weights[idx] / group_sum
-                else:
-                    for idx in group:
-                        initial_weights[idx] = 1 / len(group)
+            initial_weights = normalize_groups(initial_weights, grammar.lhs_groups()).tolist()
 
         cdef EMTrainerBuilder trainerBuilder
         cdef shared_ptr[EMTrainer[NONTERMINAL, size_t]] emTrainer \
@@ -191,19 +198,9 @@ cdef class PyEMTrainer:
 
         # ensure properness
         if tie_breaking:
-            for group in normalization_groups:
-                group_sum = 0.0
-                for idx in group:
-                    group_sum += final_weights[idx]
-                if group_sum > 0:
-                    for idx in group:
-                        final_weights[idx] = final_weights[idx] / group_sum
-                else:
-                    for idx in group:
-                        final_weights[idx] = 1 / len(group)
-
-        for i in range(0, len(grammar.rule_index())):
-            grammar.rule_index(i).set_weight(final_weights[i])
+            grammar.set_weights(normalize_groups(final_weights, grammar.lhs_groups()))
+        else:
+            grammar.set_weights(final_weights)
 
 
 cdef class PySplitMergeTrainerBuilder:
@@ -423,21 +420,13 @@ cdef class PyLatentAnnotation:
                                 output_helper(str(i) + " " + str(index) + " " + str(weight))
                         raise Exception(nont, split_total_probs)
 
+        weights = []
         for rule_idx in range(0, len(grammar.rule_index())):
-            rule = grammar.rule_index(rule_idx)
-
             rule_dimensions = [deref(la_proj).nonterminalSplits[nont]
                                for nont in deref(grammarInfo.grammarInfo).rule_to_nonterminals[rule_idx]]
-            rule_dimensions_product = [la for la in itertools.product(*[range(dim) for dim in rule_dimensions])]
-
-            lhs_dims = deref(la_proj).nonterminalSplits[
-                deref(grammarInfo.grammarInfo).rule_to_nonterminals[rule_idx][0]
-            ]
-
-            assert len(rule_dimensions_product) == 1
-            index = list(rule_dimensions_product[0])
-            weight = deref(la_proj).get_weight(rule_idx, index)
-            rule.set_weight(weight)
+            assert all([dim == 1 for dim in rule_dimensions])
+            weights.append(deref(la_proj).get_weight(rule_idx, [0] * len(rule_dimensions)))
+        grammar.set_weights(weights)
 
 
     def project_annotation_by_merging(self,
@@ -545,11 +534,7 @@ cpdef PyLatentAnnotation build_PyLatentAnnotation_initial(
         grammar
         , PyGrammarInfo grammarInfo
         , PyStorageManager storageManager):
-    cdef vector[double] ruleWeights = []
-    cdef int i
-    for i in range(0, len(grammar.rule_index())):
-        rule = grammar.rule_index(i)
-        ruleWeights.push_back(rule.weight())
+    cdef vector[double] ruleWeights = grammar.weights().tolist()
     # output_helper(str(ruleWeights) + "\n")
     cdef PyLatentAnnotation latentAnnotation = PyLatentAnnotation()
     latentAnnotation.latentAnnotation \
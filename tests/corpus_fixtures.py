@@ -0,0 +1,111 @@
+"""
+Sample corpora and a temporary corpus directory shared by the corpus tests.
+"""
+from __future__ import print_function
+import unittest
+import io
+import os
+import shutil
+import tempfile
+
+# export format (NeGra)
+STANDARD = u"""#FORMAT 3
+#BOS 1
+Das	ART	Nom.Sg.Neut	NK	500
+ist	VAFIN	3.Sg.Pres.Ind	HD	501
+gut	ADJD	Pos	PD	501
+.	$.	--	--	0
+#500	NP	--	SB	501
+#501	S	--	--	0
+#EOS 1
+#BOS 2
+#	$(	--	--	0
+Er	PPER	Nom.Sg.Masc	SB	500
+kommt	VVFIN	3.Sg.Pres.Ind	HD	500
+heute	ADV	--	MO	500
+#500	S	--	--	0
+#EOS 2
+#BOS 3
+Schön	ADJD	Pos	--	0
+#EOS 3
+"""
+
+# TIGER-XML, to be written with encoding iso-8859-1
+SAMPLE = u"""<?xml version="1.0" encoding="ISO-8859-1"?>
+<corpus id="sample">
+<head><meta><name>sample</name></meta></head>
+<body>
+<s id="s1">
+<graph root="s1_500">
+<terminals>
+<t id="s1_1" word="Schön" lemma="schön" pos="ADJD" case="--" number="--" gender="--" person="--" degree="Pos" tense="--" mood="--" />
+<t id="s1_2" word="ist" lemma="sein" pos="VAFIN" case="--" number="Sg" gender="--" person="3" degree="--" tense="Pres" mood="Ind" />
+<t id="s1_3" word="es" lemma="es" pos="PPER" case="Nom" number="Sg" gender="Neut" person="3" degree="--" tense="--" mood="--" />
+<t id="s1_4" word="." lemma="--" pos="$." case="--" number="--" gender="--" person="--" degree="--" tense="--" mood="--" />
+</terminals>
+<nonterminals>
+<nt id="s1_500" cat="S">
+<edge label="PD" idref="s1_1" />
+<edge label="HD" idref="s1_2" />
+<edge label="SB" idref="s1_3" />
+<edge label="--" idref="s1_4" />
+</nt>
+</nonterminals>
+</graph>
+</s>
+<s id="s2">
+<graph root="s2_500">
+<terminals>
+<t id="s2_1" word="Er" lemma="er" pos="PPER" case="Nom" number="Sg" gender="Masc" person="3" degree="--" tense="--" mood="--" />
+<t id="s2_2" word="kommt" lemma="kommen" pos="VVFIN" case="--" number="Sg" gender="--" person="3" degree="--" tense="Pres" mood="Ind" />
+<t id="s2_3" word="heute" lemma="heute" pos="ADV" case="--" number="--" gender="--" person="--" degree="--" tense="--" mood="--" />
+</terminals>
+<nonterminals>
+<nt id="s2_501" cat="VP">
+<edge label="MO" idref="s2_3" />
+</nt>
+<nt id="s2_500" cat="S">
+<edge label="SB" idref="s2_1" />
+<edge label="HD" idref="s2_2" />
+<edge label="OC" idref="s2_501" />
+</nt>
+</nonterminals>
+</graph>
+</s>
+</body>
+</corpus>
+"""
+
+# CoNLL
+CONLL = u"""# comment
+1	Viele	_	PIAT	PIAT	_	2	NK	_	_
+2	laufen	_	VVFIN	VVFIN	_	0	ROOT	_	_
+
+1	Er	_	PPER	PPER	_	2	SB	_	_
+2	kommt	_	VVFIN	VVFIN	_	0	ROOT	_	_
+3	heute	_	ADV	ADV	_	2	MO	_	_
+4	.	_	$.	$.	_	2	PUNC	_	_
+
+1	Ja	_	ITJ	ITJ	_	0	ROOT	_	_
+
+
+
+1	Schön	_	ADJD	ADJD	_	0	ROOT	_	_
+"""
+
+
+class CorpusDirectoryTest(unittest.TestCase):
+    """
+    Test case with a fresh temporary directory for corpus files.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content, encoding='utf-8'):
+        path = os.path.join(self.directory, name)
+        with io.open(path, 'w', encoding=encoding) as corpus:
+            corpus.write(content)
+        return path
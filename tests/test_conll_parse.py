@@ -18,6 +18,8 @@ from corpora.conll_parse import *
 import subprocess
 import os
 import re
+import shutil
+import tempfile
 
 TEST_FILE = 'res/tests/Dependency_Corpus.conll'
 TEST_FILE_MODIFIED = 'res/tests/Dependency_Corpus_modified.conll'
@@ -209,5 +211,37 @@ class CoNLLParserTest(unittest.TestCase):
         print(mylist)
 
 
+    def test_multiple_files_and_skipping(self):
+        directory = tempfile.mkdtemp()
+        try:
+            paths = []
+            for i in range(3):
+                paths.append(os.path.join(directory, 'part%d.conll' % i))
+                with open(paths[-1], 'w') as corpus:
+                    # the last sentence of a file is not followed by an empty line
+                    corpus.write(GLOBAL_SAMPLE + '\n\n' + GLOBAL_SAMPLE.replace('\t', ' ') + '\n')
+            trees = list(parse_conll_corpus(os.path.join(directory, 'part*.conll'), False))
+            self.assertEqual(len(trees), 6)
+            self.assertListEqual([tree.sent_label() for tree in trees], ['tree' + str(i) for i in range(1, 7)])
+            for tree in trees:
+                self.assertEqual(len(tree.full_yield()), 16)
+                self.assertListEqual(tree.root, ['6'])
+
+            trees = list(parse_conll_corpus(paths[:2], False, limit=3, start=1))
+            self.assertListEqual([tree.sent_label() for tree in trees], ['tree2', 'tree3'])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_malformed_tree(self):
+        lines = ['1\tA\t_\tX\tX\t_\t2\tA\t_\t_\n', '2\tB\t_\tX\tX\t_\t1\tB\t_\t_\n', '\n',
+                 '1\tC\t_\tX\tX\t_\t0\tC\t_\t_\n']
+        self.assertRaises(Exception, list, parse_conll_lines(lines, False))
+        trees = list(parse_conll_lines(lines, True))
+        self.assertListEqual([tree.sent_label() for tree in trees], ['tree2'])
+        # skipped trees are not validated
+        self.assertEqual(len(list(parse_conll_lines(lines, False, start=1))), 1)
+        self.assertRaises(Exception, list, parse_conll_lines(['1\tA\t_\tX\n'], False))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,90 @@
+from __future__ import print_function
+import unittest
+import os
+import corpora.corpus_cache as cc
+import corpora.negra_parse as np
+import corpora.tiger_parse as tp
+from corpora.conll_parse import parse_conll_corpus
+from tests.corpus_fixtures import STANDARD, SAMPLE, CONLL, CorpusDirectoryTest
+
+
+def signature(tree):
+    nodes = list(tree.nodes())
+    return (type(tree), tree.sent_label(), str(tree), nodes, tree.root, tree.full_yield(), tree.id_yield(),
+            [str(tree.node_token(node)) for node in nodes], [tree.children(node) for node in nodes],
+            [tree.parent(node) for node in nodes])
+
+
+class CorpusCacheTest(CorpusDirectoryTest):
+    def setUp(self):
+        super(CorpusCacheTest, self).setUp()
+        self.reads = 0
+
+    def assertSameTrees(self, trees, expected):
+        self.assertListEqual([signature(tree) for tree in trees], [signature(tree) for tree in expected])
+
+    def test_roundtrip(self):
+        corpora = [list(np.hybridtrees(self.write('sample.export', STANDARD), add_vroot=True)),
+                   list(np.hybridtrees(self.write('sample.export', STANDARD), disconnect_punctuation=False)),
+                   list(tp.hybridtrees(self.write('sample.xml', SAMPLE, encoding='iso-8859-1'))),
+                   list(parse_conll_corpus(self.write('sample.conll', CONLL), False))]
+        for trees in corpora:
+            self.assertSameTrees(cc.decode_corpus(cc.encode_corpus(trees)), trees)
+        morph = cc.decode_corpus(cc.encode_corpus(corpora[2]))[0].node_token('s1_2').morph_feats()
+        self.assertListEqual(morph, corpora[2][0].node_token('s1_2').morph_feats())
+
+        vroot_stripped = corpora[0][0]
+        vroot_stripped.strip_vroot()
+        self.assertSameTrees(cc.decode_corpus(cc.encode_corpus([vroot_stripped])), [vroot_stripped])
+
+    def read(self, path, **options):
+        self.reads += 1
+        return np.hybridtrees(path, **options)
+
+    def test_load_corpus(self):
+        path = self.write('sample.export', STANDARD)
+        options = {'names': {'1', '3'}, 'add_vroot': True}
+        expected = list(np.hybridtrees(path, **options))
+
+        self.assertSameTrees(cc.load_corpus(path, self.read, 'export', options), expected)
+        self.assertEqual(self.reads, 1)
+        cache_file = cc.cache_file_name(path, 'export', options)
+        self.assertTrue(os.path.exists(cache_file))
+        self.assertSameTrees(cc.load_corpus(path, self.read, 'export', {'add_vroot': True, 'names': {'3', '1'}}),
+                             expected)
+        self.assertEqual(self.reads, 1)
+
+        # other options use another cache
+        cc.load_corpus(path, self.read, 'export', {'names': {'1', '3'}, 'add_vroot': False})
+        self.assertEqual(self.reads, 2)
+        trees = cc.load_corpus(path, self.read, 'export', options, cache=False)
+        self.assertEqual(self.reads, 3)
+        self.assertNotIsInstance(trees, list)
+
+        # the cache is rebuilt if the corpus changes
+        path = self.write('sample.export', STANDARD.replace('Das', 'Dies'))
+        trees = cc.load_corpus(path, self.read, 'export', options)
+        self.assertEqual(self.reads, 4)
+        self.assertListEqual(trees[0].word_yield(), ['Dies', 'ist', 'gut'])
+        cc.load_corpus(path, self.read, 'export', options)
+        self.assertEqual(self.reads, 4)
+
+    def test_normalized_corpus(self):
+        # the cache of a corpus that is normalized before reading belongs to the source file
+        path = self.write('sample.export', STANDARD)
+        normalized = []
+
+        def read(corpus_path, normalize=None, **options):
+            normalized.append(corpus_path)
+            corpus_path = self.write('normalized%d.export' % len(normalized),
+                                     STANDARD.replace('Das', normalize['article']))
+            return np.hybridtrees(corpus_path, **options)
+
+        for article in ['Dies', 'Dies', 'Jenes']:
+            trees = cc.load_corpus(path, read, 'export', {'add_vroot': True, 'normalize': {'article': article}})
+            self.assertListEqual(trees[0].word_yield(), [article, 'ist', 'gut'])
+        self.assertListEqual(normalized, [path, path])
+
+
+if __name__ == '__main__':
+    unittest.main()
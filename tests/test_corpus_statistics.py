@@ -0,0 +1,70 @@
+from __future__ import print_function
+import unittest
+import corpora.corpus_statistics as cs
+import corpora.negra_parse as np
+from corpora.corpus_cache import encode_corpus
+from corpora.conll_parse import parse_conll_corpus
+from hybridtree.general_hybrid_tree import HybridTree
+from hybridtree.monadic_tokens import construct_conll_token
+from tests.corpus_fixtures import STANDARD, CONLL, CorpusDirectoryTest
+
+
+class CorpusStatisticsTest(CorpusDirectoryTest):
+    @staticmethod
+    def discontinuous_tree():
+        # v spans Piet, helpen; v2 spans Marie, lezen; '.' is disconnected
+        tree = HybridTree('dutch')
+        tree.add_node("v1", construct_conll_token("Piet", "NP"), True)
+        tree.add_node("v21", construct_conll_token("Marie", "N"), True)
+        tree.add_node("v", construct_conll_token("helpen", "VP"), True)
+        tree.add_node("v2", construct_conll_token("lezen", "V"), True)
+        tree.add_child("v", "v2")
+        tree.add_child("v", "v1")
+        tree.add_child("v2", "v21")
+        tree.add_node("v3", construct_conll_token(".", "Punc"), True, False)
+        tree.add_to_root("v")
+        return tree
+
+    def assertAgrees(self, trees):
+        statistics = cs.corpus_statistics(trees)
+        self.assertEqual(statistics['trees'], len(trees))
+        self.assertListEqual(statistics['max_n_spans'].tolist(), [tree.max_n_spans() for tree in trees])
+        self.assertListEqual(statistics['n_gaps'].tolist(), [tree.n_gaps() for tree in trees])
+        self.assertListEqual(statistics['length'].tolist(), [len(tree.id_yield()) for tree in trees])
+        self.assertListEqual(statistics['full_length'].tolist(), [len(tree.full_yield()) for tree in trees])
+        fanouts = {}
+        for tree in trees:
+            for node in tree.nodes():
+                fanouts[tree.n_spans(node)] = fanouts.get(tree.n_spans(node), 0) + 1
+        self.assertDictEqual(statistics['fanouts'], fanouts)
+        return statistics
+
+    def test_discontinuous(self):
+        statistics = self.assertAgrees([self.discontinuous_tree(), HybridTree('empty')])
+        self.assertDictEqual(statistics['fanouts'], {0: 1, 1: 3, 2: 1})
+        self.assertDictEqual(statistics['gap_degrees'], {0: 1, 1: 1})
+        self.assertDictEqual(statistics['lengths'], {0: 1, 4: 1})
+        self.assertDictEqual(statistics['deprels'], {'_': 5})
+
+    def test_corpora(self):
+        path = self.write('sample.export', STANDARD)
+        for add_vroot in [False, True]:
+            trees = list(np.hybridtrees(path, add_vroot=add_vroot))
+            statistics = self.assertAgrees(trees)
+            self.assertEqual(statistics['categories']['S'], 2)
+            self.assertEqual(statistics['categories'].get('VROOT', 0), 3 if add_vroot else 0)
+            self.assertDictEqual(statistics['pos'], {'ART': 1, 'VAFIN': 1, 'ADJD': 2, '$.': 1, '$(': 1, 'PPER': 1,
+                                                     'VVFIN': 1, 'ADV': 1})
+
+        trees = list(parse_conll_corpus(self.write('sample.conll', CONLL), False))
+        statistics = self.assertAgrees(trees)
+        self.assertDictEqual(statistics['lengths'], {1: 2, 2: 1, 4: 1})
+        self.assertEqual(statistics['deprels']['ROOT'], 4)
+        self.assertEqual(statistics['nodes'], 8)
+
+        # statistics may also be computed from an encoding
+        self.assertDictEqual(cs.corpus_statistics(encode_corpus(trees))['lengths'], statistics['lengths'])
+
+
+if __name__ == '__main__':
+    unittest.main()
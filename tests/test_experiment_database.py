@@ -0,0 +1,81 @@
+from __future__ import print_function
+import unittest
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+import evaluation.experiment_database as db
+from corpora.conll_parse import parse_conll_corpus, tree_to_conll_str
+from tests.test_parallel_loading import CONLL
+
+
+class ExperimentDatabaseTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db_file = os.path.join(self.directory, 'experiments.db')
+        self.corpus = os.path.join(self.directory, 'sample.conll')
+        with io.open(self.corpus, 'w', encoding='utf-8') as corpus:
+            corpus.write(CONLL)
+        self.trees = list(parse_conll_corpus(self.corpus, False))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def count(self, table):
+        connection = sqlite3.connect(self.db_file)
+        try:
+            return connection.execute('SELECT COUNT(*) FROM ' + table).fetchone()[0]
+        finally:
+            connection.close()
+
+    def test_batched_insertion(self):
+        connection = db.initialize_database(self.db_file)
+        connection.batch_size = 3
+        tree_ids = [db.add_tree(connection, tree, self.corpus) for tree in self.trees]
+        self.assertEqual(len(set(tree_ids)), 4)
+        # the first batch is committed, the last tree is not yet
+        self.assertEqual(self.count('trees'), 3)
+        self.assertEqual(db.add_tree(connection, self.trees[1], self.corpus), tree_ids[1])
+        self.assertEqual(db.query_tree_id(connection, self.corpus, 'tree3'), tree_ids[2])
+        self.assertIsNone(db.query_tree_id(connection, self.corpus, 'tree5'))
+        db.finalize_database(connection)
+        self.assertEqual(self.count('trees'), 4)
+        self.assertEqual(self.count('tree_nodes'), 8)
+
+        # tree ids are loaded from the database
+        connection = db.initialize_database(self.db_file)
+        self.assertListEqual([db.query_tree_id(connection, self.corpus, tree.sent_label()) for tree in self.trees],
+                             tree_ids)
+        db.finalize_database(connection)
+
+    def test_query_result_trees(self):
+        connection = db.initialize_database(self.db_file)
+        experiment = db.add_experiment(connection, 'pos', 'child', 'direct', False, self.corpus, self.corpus, 0, 0)
+        other = db.add_experiment(connection, 'pos', 'strict', 'direct', False, self.corpus, self.corpus, 0, 0)
+        for tree in self.trees:
+            db.add_tree(connection, tree, self.corpus)
+        db.add_result_tree(connection, self.trees[0], self.corpus, experiment, 1, 0.5, 0.1, 'parse')
+        db.add_result_tree(connection, self.trees[1], self.corpus, experiment, 1, 0.5, 0.1, 'fallback', 'ROOT', 'P')
+        db.no_parse_result(connection, 'tree3', self.corpus, experiment, 0.1, 'no_parse')
+        db.add_result_tree(connection, self.trees[3], self.corpus, other, 1, 0.5, 0.1, 'parse')
+
+        for exp in [experiment, other]:
+            results = db.query_result_trees(connection, exp, self.corpus)
+            self.assertEqual(len(results), 4)
+            for tree_id, (status, tree) in results.items():
+                expected_status, expected_tree = db.query_result_tree(connection, exp, tree_id)
+                self.assertEqual(status, expected_status)
+                self.assertEqual(tree.sent_label(), expected_tree.sent_label())
+                self.assertEqual(tree_to_conll_str(tree), tree_to_conll_str(expected_tree))
+
+        results = db.query_result_trees(connection, experiment, self.corpus)
+        statuses = [results[db.query_tree_id(connection, self.corpus, tree.sent_label())][0] for tree in self.trees]
+        self.assertListEqual(statuses, ['parse', 'fallback', 'no_parse', 'simple_fallback'])
+        self.assertEqual(tree_to_conll_str(results[db.query_tree_id(connection, self.corpus, 'tree1')][1]),
+                         tree_to_conll_str(self.trees[0]))
+        db.finalize_database(connection)
+
+
+if __name__ == '__main__':
+    unittest.main()
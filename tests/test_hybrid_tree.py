@@ -1,8 +1,11 @@
 __author__ = 'kilian'
 
+import copy
 import unittest
 from hybridtree.monadic_tokens import construct_conll_token
-from hybridtree.general_hybrid_tree import HybridTree
+from hybridtree.general_hybrid_tree import HybridTree, HybridDag
+from hybridtree.constituent_tree import ConstituentTree
+from hybridtree.frozen_hybrid_tree import FrozenHybridTree, FrozenConstituentTree
 
 
 class GeneralHybridTreeTestCase(unittest.TestCase):
@@ -81,6 +84,134 @@ class GeneralHybridTreeTestCase(unittest.TestCase):
         self.tree.reorder()
         self.assertEqual(self.tree.recursive_partitioning(), ({0, 1, 2, 3}, [({0}, []), ({1, 3}, [({1}, []), ({3}, [])]), ({2}, [])]))
 
+    def test_node_index(self):
+        self.assertEqual(self.tree.node_index('v2'), 3)
+        self.assertEqual(self.tree.node_index_full('v3'), 4)
+        self.assertRaises(ValueError, self.tree.node_index, 'v3')
+        self.assertTrue(self.tree.in_ordering('v21'))
+        self.assertFalse(self.tree.in_ordering('v3'))
+        self.assertTrue(self.tree.disconnected('v3'))
+        self.assertFalse(self.tree.disconnected('v'))
+
+    def test_cache_invalidation(self):
+        self.assertListEqual(self.tree.fringe('v'), [2, 3, 1, 0])
+        self.assertEqual(self.tree.n_spans('v2'), 2)
+        self.tree.reorder()
+        self.assertListEqual(self.tree.fringe('v'), [2, 0, 3, 1])
+
+        # the returned fringe is a copy
+        self.tree.fringe('v').append(7)
+        self.assertListEqual(self.tree.fringe('v'), [2, 0, 3, 1])
+
+        self.tree.add_node("v4", construct_conll_token("gaan", "V"), True)
+        self.tree.add_child("v2", "v4")
+        self.assertTrue(self.tree.in_ordering('v4'))
+        self.assertEqual(self.tree.node_index('v4'), 4)
+        self.assertListEqual(self.tree.fringe('v2'), [3, 1, 4])
+        self.assertEqual(self.tree.n_spans('v2'), 2)
+        self.assertEqual(self.tree.n_spans('v'), 1)
+        self.assertEqual(self.tree.max_n_spans(), 2)
+
+    def test_token_yield_view(self):
+        tokens = self.tree.token_yield()
+        self.assertListEqual([token.form() for token in tokens], ['Piet', 'Marie', 'helpen', 'lezen'])
+        self.assertIs(self.tree.token_yield(), tokens)
+        self.assertIs(self.tree.full_token_yield(), self.tree.full_token_yield())
+        self.assertRaises(TypeError, tokens.append, construct_conll_token("gaan", "V"))
+        self.assertRaises(TypeError, tokens.__setitem__, 0, construct_conll_token("gaan", "V"))
+
+        # copies are modifiable lists
+        cleaned_tokens = copy.deepcopy(self.tree.full_token_yield())
+        self.assertIs(type(cleaned_tokens), list)
+        cleaned_tokens.pop()
+        self.assertEqual(len(cleaned_tokens), 4)
+        self.assertEqual(len(list(self.tree.full_token_yield())), 5)
+
+        self.tree.add_node("v4", construct_conll_token("gaan", "V"), True)
+        self.assertEqual(len(tokens), 4)
+        self.assertListEqual([token.form() for token in self.tree.token_yield()],
+                             ['Piet', 'Marie', 'helpen', 'lezen', 'gaan'])
+        self.assertEqual(len(self.tree.full_token_yield()), 6)
+
+
+class FrozenHybridTreeTestCase(GeneralHybridTreeTestCase):
+    def test_freeze(self):
+        for reorder in [False, True]:
+            if reorder:
+                self.tree.reorder()
+            frozen = self.tree.freeze()
+            self.assertIsInstance(frozen, FrozenHybridTree)
+            self.assertIs(frozen.freeze(), frozen)
+            self.assertEqual(frozen, self.tree)
+            self.assertEqual(self.tree, frozen)
+            self.assertEqual(hash(frozen), hash(self.tree))
+            self.assertEqual(str(frozen), str(self.tree))
+            self.assertListEqual(frozen.root, self.tree.root)
+            self.assertListEqual(frozen.id_yield(), self.tree.id_yield())
+            self.assertListEqual(frozen.full_yield(), self.tree.full_yield())
+            self.assertListEqual(frozen.token_yield(), self.tree.token_yield())
+            self.assertListEqual(frozen.full_token_yield(), self.tree.full_token_yield())
+            self.assertListEqual(list(frozen.nodes()), list(self.tree.nodes()))
+            for id in list(self.tree.nodes()) + [frozen.virtual_root, 'v5']:
+                self.assertListEqual(frozen.children(id), self.tree.children(id))
+                self.assertListEqual(frozen.descendants(id), self.tree.descendants(id))
+                self.assertEqual(frozen.parent(id), self.tree.parent(id))
+                self.assertEqual(frozen.in_ordering(id), self.tree.in_ordering(id))
+                self.assertEqual(frozen.disconnected(id), self.tree.disconnected(id))
+                self.assertListEqual(frozen.fringe(id), self.tree.fringe(id))
+                self.assertEqual(frozen.n_spans(id), self.tree.n_spans(id))
+            self.assertEqual(frozen.node_index('v2'), self.tree.node_index('v2'))
+            self.assertEqual(frozen.node_index_full('v3'), 4)
+            self.assertRaises(ValueError, frozen.node_index, 'v3')
+            self.assertEqual(frozen.index_node(2), self.tree.index_node(2))
+            self.assertListEqual(frozen.siblings('v1'), self.tree.siblings('v1'))
+            self.assertEqual(frozen.n_gaps(), self.tree.n_gaps())
+            self.assertEqual(frozen.max_n_spans(), self.tree.max_n_spans())
+            self.assertEqual(frozen.n_nodes(), self.tree.n_nodes())
+            self.assertEqual(frozen.complete(), self.tree.complete())
+            self.assertEqual(frozen.empty_fringe(), self.tree.empty_fringe())
+            self.assertEqual(frozen.reentrant(), self.tree.reentrant())
+            self.assertEqual(frozen.unlabelled_structure(), self.tree.unlabelled_structure())
+            self.assertEqual(frozen.recursive_partitioning(), self.tree.recursive_partitioning())
+            self.assertEqual(frozen.node_id_rec_par(frozen.recursive_partitioning()),
+                             self.tree.node_id_rec_par(self.tree.recursive_partitioning()))
+
+    def test_immutable(self):
+        frozen = self.tree.freeze()
+        self.assertRaises(AttributeError, setattr, frozen, 'label', 'x')
+        self.assertFalse(hasattr(frozen, 'add_node'))
+        frozen.children('v').append('v3')
+        self.assertListEqual(frozen.children('v'), ['v2', 'v1'])
+        # secondary edges of dags cannot be frozen
+        self.assertRaises(TypeError, HybridDag('s1').freeze)
+
+    def test_constituent_tree(self):
+        tree = ConstituentTree('s1')
+        tree.add_leaf('f1', 'VAFIN', 'hat')
+        tree.add_leaf('f2', 'ADV', 'schnell')
+        tree.add_leaf('f3', 'VVPP', 'gearbeitet')
+        tree.add_punct('f4', '$.', '.')
+        tree.set_label('VP', 'VP')
+        tree.set_label('S', 'S')
+        tree.add_child('VP', 'f2')
+        tree.add_child('VP', 'f3')
+        tree.add_child('S', 'f1')
+        tree.add_child('S', 'VP')
+        tree.add_to_root('S')
+        frozen = tree.freeze()
+        self.assertIsInstance(frozen, FrozenConstituentTree)
+        self.assertEqual(frozen.sent_label(), 's1')
+        self.assertListEqual(frozen.leaves(), tree.leaves())
+        self.assertListEqual(frozen.ids(), tree.ids())
+        self.assertListEqual(frozen.word_yield(), tree.word_yield())
+        self.assertListEqual(frozen.pos_yield(), tree.pos_yield())
+        self.assertListEqual(frozen.labelled_spans(), tree.labelled_spans())
+        self.assertEqual(frozen.n_nodes(), tree.n_nodes())
+        self.assertEqual(frozen.label('VP'), tree.label('VP'))
+        self.assertTrue(frozen.is_leaf('f4'))
+        self.assertFalse(frozen.is_leaf('VP'))
+        self.assertEqual(frozen.leaf_index('f3'), 2)
+
 
 if __name__ == '__main__':
     unittest.main()
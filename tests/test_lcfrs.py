@@ -0,0 +1,303 @@
+from __future__ import print_function
+import unittest
+import os
+import pickle
+import shutil
+import tempfile
+from collections import defaultdict
+from grammar.lcfrs import LCFRS, LCFRS_lhs, LCFRS_var
+from grammar.dcp import DCP_rule, DCP_var, DCP_term, DCP_index
+
+LEGACY_PICKLE = 'res/tests/lcfrs_before_weight_store.pickle'
+
+
+def build_grammar(interned=False):
+    grammar = LCFRS(start='S', interned=interned)
+
+    # S(x1 x2) -> A(x1) B(x2)
+    lhs = LCFRS_lhs('S')
+    lhs.add_arg([LCFRS_var(0, 0), LCFRS_var(1, 0)])
+    grammar.add_rule(lhs, ['A', 'B'], 2.0)
+
+    # S(x1) -> A(x1)
+    lhs = LCFRS_lhs('S')
+    lhs.add_arg([LCFRS_var(0, 0)])
+    grammar.add_rule(lhs, ['A'], 2.0)
+
+    # A(a), with sDCP rule <0> = [0]()
+    lhs = LCFRS_lhs('A')
+    lhs.add_arg(['a'])
+    grammar.add_rule(lhs, [], 1.0, dcp=[DCP_rule(DCP_var(-1, 0), [DCP_term(DCP_index(0), [])])])
+
+    # A(b)
+    lhs = LCFRS_lhs('A')
+    lhs.add_arg(['b'])
+    grammar.add_rule(lhs, [], 3.0)
+
+    # B(b)
+    lhs = LCFRS_lhs('B')
+    lhs.add_arg(['b'])
+    grammar.add_rule(lhs, [], 1.0)
+    return grammar
+
+
+class LCFRSTest(unittest.TestCase):
+    def test_interned_rule_store(self):
+        plain = build_grammar()
+        interned = build_grammar(interned=True)
+        self.assertFalse(plain.interned())
+        self.assertTrue(interned.interned())
+
+        self.assertEqual([str(rule) for rule in plain.rules()], [str(rule) for rule in interned.rules()])
+        for i in range(len(plain.rule_index())):
+            self.assertEqual(str(plain.rule_index(i)), str(interned.rule_index(i)))
+        for nont in ['S', 'A', 'B']:
+            self.assertEqual([rule.get_idx() for rule in plain.lhs_nont_to_rules(nont)],
+                             [rule.get_idx() for rule in interned.lhs_nont_to_rules(nont)])
+        for term in ['a', 'b']:
+            self.assertEqual([rule.get_idx() for rule in plain.lex_rules(term)],
+                             [rule.get_idx() for rule in interned.lex_rules(term)])
+
+        nonts = interned.nont_enumerator()
+        self.assertEqual([nonts.index_object(i) for i in interned.rule_lhs_ids()], ['S', 'S', 'A', 'A', 'B'])
+        self.assertEqual([nonts.index_object(i) for i in interned.rule_rhs_ids(0)], ['A', 'B'])
+        self.assertEqual(list(interned.rule_rhs_ids(2)), [])
+
+    def test_interned_duplicates(self):
+        for interned in [False, True]:
+            grammar = build_grammar(interned=interned)
+            lhs = LCFRS_lhs('A')
+            lhs.add_arg(['a'])
+            dcp = [DCP_rule(DCP_var(-1, 0), [DCP_term(DCP_index(0), [])])]
+            rule = grammar.add_rule(lhs, [], 1.5, dcp=dcp)
+            self.assertEqual(rule.get_idx(), 2)
+            self.assertEqual(rule.weight(), 2.5)
+
+            # same LCFRS rule, but without sDCP rule
+            lhs = LCFRS_lhs('A')
+            lhs.add_arg(['a'])
+            rule = grammar.add_rule(lhs, [], 1.0)
+            self.assertEqual(rule.get_idx(), 5)
+            self.assertEqual(len(grammar.rules()), 6)
+
+    def test_purge_rules(self):
+        for interned in [False, True]:
+            grammar = build_grammar(interned=interned)
+            feature_log = defaultdict(lambda: 0)
+            feature_log[('A', 'x')] = 4
+            for rule in grammar.rules():
+                feature_log[(rule.get_idx(), 'x', ())] = rule.get_idx() + 1
+
+            idx_map = grammar.purge_rules(1.0, feature_log)
+            self.assertDictEqual(idx_map, {0: 0, 1: 1, 3: 2})
+            self.assertEqual([rule.get_idx() for rule in grammar.rules()], [0, 1, 2])
+            self.assertEqual([str(grammar.rule_index(i).lhs()) for i in range(3)], ['S(<0,0> <1,0>)', 'S(<0,0>)', 'A(b)'])
+            self.assertEqual([rule.get_idx() for rule in grammar.lhs_nont_to_rules('A')], [2])
+            self.assertEqual(grammar.lhs_nont_to_rules('B'), [])
+            self.assertEqual(grammar.lex_rules('a'), [])
+            self.assertEqual([rule.get_idx() for rule in grammar.lex_rules('b')], [2])
+            self.assertDictEqual(dict(feature_log), {('A', 'x'): 4, (0, 'x', ()): 1, (1, 'x', ()): 2, (2, 'x', ()): 4})
+            if interned:
+                self.assertEqual(len(grammar.rule_lhs_ids()), 3)
+                self.assertEqual(list(grammar.rule_rhs_ids(2)), [])
+
+            # purged rules are not resurrected by adding them again
+            lhs = LCFRS_lhs('B')
+            lhs.add_arg(['b'])
+            rule = grammar.add_rule(lhs, [], 1.0)
+            self.assertEqual(rule.get_idx(), 3)
+            self.assertEqual(rule.weight(), 1.0)
+
+    def test_add_gram(self):
+        for interned, other_interned in [(False, False), (True, True), (True, False), (False, True)]:
+            grammar = build_grammar(interned=interned)
+            other = LCFRS(start='S', interned=other_interned)
+            # C(c), new rule
+            lhs = LCFRS_lhs('C')
+            lhs.add_arg(['c'])
+            other.add_rule(lhs, [], 1.0)
+            # S(x1) -> A(x1), known rule
+            lhs = LCFRS_lhs('S')
+            lhs.add_arg([LCFRS_var(0, 0)])
+            other.add_rule(lhs, ['A'], 3.0)
+            # A(a), known rule
+            lhs = LCFRS_lhs('A')
+            lhs.add_arg(['a'])
+            other.add_rule(lhs, [], 1.0, dcp=[DCP_rule(DCP_var(-1, 0), [DCP_term(DCP_index(0), [])])])
+
+            self_log = defaultdict(lambda: 0)
+            self_log[(1, 'f', ())] = 1
+            other_log = defaultdict(lambda: 0)
+            other_log[('C', 'g')] = 7
+            other_log[(0, 'g', ())] = 2
+            other_log[(1, 'f', ())] = 3
+            other_log[(1, 'h', ())] = 4
+
+            idx_map = grammar.add_gram(other, feature_logging=(self_log, other_log))
+            self.assertDictEqual(idx_map, {0: 5, 1: 1, 2: 2})
+            self.assertEqual(list(grammar.weights()), [2.0, 5.0, 2.0, 3.0, 1.0, 1.0])
+            self.assertEqual(str(grammar.rule_index(5)), '[1.0] C(c) -> ')
+            self.assertEqual(grammar.fanout('C'), 1)
+            self.assertDictEqual(dict(self_log), {(5, 'g', ()): 2, ('C', 'g'): 2, (1, 'f', ()): 4, ('S', 'f'): 3,
+                                                  (1, 'h', ()): 4, ('S', 'h'): 4})
+
+            # rules of merged grammar are deduplicated against later additions
+            lhs = LCFRS_lhs('C')
+            lhs.add_arg(['c'])
+            self.assertEqual(grammar.add_rule(lhs, [], 1.0).get_idx(), 5)
+            if interned:
+                self.assertEqual(grammar.nont_enumerator().index_object(grammar.rule_lhs_ids()[5]), 'C')
+
+        grammar = LCFRS()
+        grammar.add_gram(build_grammar())
+        self.assertEqual(grammar.start(), 'S')
+        self.assertEqual(str(grammar), str(build_grammar()))
+
+    def test_weights(self):
+        grammar = build_grammar()
+        self.assertEqual(list(grammar.weights()), [2.0, 2.0, 1.0, 3.0, 1.0])
+        self.assertEqual(list(grammar.lhs_groups()), [0, 0, 1, 1, 2])
+
+        # the view is backed by the rules, but read-only
+        weights = grammar.weights()
+        with self.assertRaises(ValueError):
+            weights[0] = 4.0
+        grammar.rule_index(0).set_weight(4.0)
+        grammar.rule_index(1).set_weight(6.0)
+        self.assertEqual(list(weights[:2]), [4.0, 6.0])
+
+        grammar.make_proper()
+        self.assertEqual(list(grammar.weights()), [0.4, 0.6, 0.25, 0.75, 1.0])
+        self.assertEqual(grammar.rule_index(3).weight(), 0.75)
+
+        grammar.set_weights([1.0, 0.0, 0.5, 0.5, 1.0])
+        self.assertEqual([rule.weight() for rule in grammar.rules()], [1.0, 0.0, 0.5, 0.5, 1.0])
+        self.assertRaises(ValueError, grammar.set_weights, [1.0])
+
+        # growing beyond the initial capacity keeps weights of existing rules
+        for i in range(40):
+            lhs = LCFRS_lhs('C')
+            lhs.add_arg([str(i)])
+            grammar.add_rule(lhs, [], 2.0)
+        self.assertEqual(len(grammar.weights()), 45)
+        self.assertEqual(grammar.rule_index(2).weight(), 0.5)
+        grammar.make_proper()
+        self.assertAlmostEqual(grammar.rule_index(44).weight(), 1.0 / 40)
+
+        # purged rules keep their weight, remaining ones are moved
+        rule = grammar.rule_index(1)
+        grammar.purge_rules(0.0)
+        self.assertEqual(rule.weight(), 0.0)
+        self.assertEqual(list(grammar.lhs_groups())[:4], [0, 1, 1, 2])
+        self.assertEqual(list(grammar.weights())[:4], [1.0, 0.5, 0.5, 1.0])
+
+    def test_pickle(self):
+        grammar = build_grammar()
+        loaded = pickle.loads(pickle.dumps(grammar))
+        self.assertEqual(str(loaded), str(grammar))
+        loaded.rule_index(1).set_weight(0.5)
+        self.assertEqual(list(loaded.weights()), [2.0, 0.5, 1.0, 3.0, 1.0])
+        rule = pickle.loads(pickle.dumps(grammar.rule_index(3)))
+        self.assertEqual(str(rule), str(grammar.rule_index(3)))
+
+        # rule and grammar pickled before rules kept their weights in the weight store of the grammar
+        with open(LEGACY_PICKLE, 'rb') as f:
+            rule, grammar = pickle.load(f)
+        self.assertEqual(str(rule), '[0.25] A(a <0,0>) -> A')
+        self.assertEqual(rule.get_idx(), 3)
+        self.assertEqual(list(grammar.weights()), [1.0, 0.25, 0.75])
+        self.assertEqual(list(grammar.lhs_groups()), [0, 1, 1])
+        grammar.rule_index(1).set_weight(0.5)
+        self.assertEqual(list(grammar.weights()), [1.0, 0.5, 0.75])
+        lhs = LCFRS_lhs('A')
+        lhs.add_arg(['b'])
+        self.assertEqual(grammar.add_rule(lhs, [], 0.5).get_idx(), 3)
+        grammar.make_proper()
+        self.assertEqual(list(grammar.weights()), [1.0, 0.5 / 1.75, 0.75 / 1.75, 0.5 / 1.75])
+
+    def test_grammar_image(self):
+        for interned in [False, True]:
+            grammar = build_grammar(interned=interned)
+            _, path = tempfile.mkstemp(suffix='.grammar')
+            try:
+                grammar.save(path)
+                loaded = LCFRS.load(path)
+                self.assertEqual(loaded.start(), 'S')
+                self.assertEqual(loaded.interned(), interned)
+                self.assertEqual(len(loaded.rule_index()), 5)
+                self.assertEqual(str(loaded), str(grammar))
+                self.assertEqual([rule.get_idx() for rule in loaded.lhs_nont_to_rules('A')], [2, 3])
+                self.assertEqual([rule.get_idx() for rule in loaded.lex_rules('b')], [3, 4])
+                self.assertEqual(list(loaded.lex_rules('c')), [])
+                self.assertEqual([rule.get_idx() for rule in loaded.nont_corner_of('A')], [0, 1])
+                self.assertEqual(str(loaded.rule_index(2).dcp()[0]), '<0>=[0]()')
+                self.assertIs(loaded.rule_index(2), loaded.rules()[2])
+
+                # modification after loading
+                loaded.make_proper()
+                self.assertEqual(loaded.rule_index(3).weight(), 0.75)
+                lhs = LCFRS_lhs('B')
+                lhs.add_arg(['b'])
+                rule = loaded.add_rule(lhs, [], 1.0)
+                self.assertEqual(rule.get_idx(), 4)
+                self.assertEqual(rule.weight(), 2.0)
+                self.assertEqual(len(loaded.rules()), 5)
+            finally:
+                os.remove(path)
+
+    def test_fingerprint(self):
+        grammar = build_grammar()
+        fingerprint = grammar.fingerprint()
+        # the fingerprint is only recomputed after a change of weights
+        self.assertIs(grammar.fingerprint(), fingerprint)
+        for change in [lambda: grammar.rule_index(2).set_weight(0.5), lambda: grammar.rule_index(2).add_weight(0.5),
+                       lambda: grammar.set_weights([1.0] * 5), grammar.make_proper]:
+            change()
+            self.assertNotEqual(grammar.fingerprint(), fingerprint)
+            fingerprint = grammar.fingerprint()
+        grammar.set_weights([2.0, 2.0, 1.0, 3.0, 1.0])
+        self.assertEqual(grammar.fingerprint(), build_grammar().fingerprint())
+
+    def test_compiled_cache(self):
+        grammar = build_grammar()
+        compilations = []
+
+        def compile(g):
+            compilations.append(g.fingerprint())
+            return len(g.rules())
+
+        self.assertEqual(grammar.compiled('test', compile), 5)
+        self.assertEqual(grammar.compiled('test', compile), 5)
+        self.assertEqual(len(compilations), 1)
+        self.assertEqual(build_grammar().fingerprint(), grammar.fingerprint())
+
+        grammar.rule_index(0).set_weight(0.5)
+        self.assertEqual(grammar.compiled('test', compile), 5)
+        self.assertEqual(len(compilations), 2)
+
+        lhs = LCFRS_lhs('B')
+        lhs.add_arg(['a'])
+        grammar.add_rule(lhs, [])
+        self.assertEqual(grammar.compiled('test', compile), 6)
+        grammar.purge_rules(0.5)
+        self.assertEqual(grammar.compiled('test', compile), 5)
+        self.assertEqual(len(compilations), 4)
+
+        directory = tempfile.mkdtemp()
+        grammar.set_compiled_cache_dir(directory)
+        self.assertEqual(grammar.compiled('test', compile, persistent=True), 5)
+        self.assertEqual(len(compilations), 4)
+        other = build_grammar()
+        other.rule_index(0).set_weight(0.5)
+        lhs = LCFRS_lhs('B')
+        lhs.add_arg(['a'])
+        other.add_rule(lhs, [])
+        other.purge_rules(0.5)
+        other.set_compiled_cache_dir(directory)
+        self.assertEqual(other.compiled('test', compile, persistent=True), 5)
+        self.assertEqual(len(compilations), 4)
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+from __future__ import print_function
+import unittest
+import io
+import os
+import corpora.negra_parse as np
+from corpora.offset_index import index_file_name
+from tests.corpus_fixtures import STANDARD, CorpusDirectoryTest
+
+DISCODOP = u"""%% word	lemma	tag	morph	edge	parent	secedge
+#BOS 7
+Er	er	PPER	Nom.Sg.Masc	SB	500
+schläft	schlafen	VVFIN	3.Sg.Pres.Ind	HD	500
+#500	--	S	--	--	0
+#EOS 7
+"""
+
+
+class NegraParseTest(CorpusDirectoryTest):
+    def setUp(self):
+        super(NegraParseTest, self).setUp()
+        self.path = self.write('sample.export', STANDARD)
+
+    def test_read(self):
+        trees = np.sentence_names_to_hybridtrees(['3', '1', '2'], self.path)
+        self.assertListEqual([tree.sent_label() for tree in trees], ['1', '2', '3'])
+        self.assertListEqual(trees[0].word_yield(), ['Das', 'ist', 'gut'])
+        self.assertListEqual(trees[0].labelled_spans(), [['NP', 0, 0], ['S', 0, 2]])
+        self.assertTrue(trees[0].disconnected('104'))
+        self.assertListEqual([token.form() for token in trees[1].full_token_yield()], ['#', 'Er', 'kommt', 'heute'])
+        self.assertListEqual(trees[1].word_yield(), ['Er', 'kommt', 'heute'])
+        self.assertListEqual(trees[2].word_yield(), [])
+
+        trees = list(np.hybridtrees(self.path, disconnect_punctuation=False, add_vroot=True))
+        self.assertEqual(len(trees), 3)
+        self.assertListEqual(trees[0].root, ['0'])
+        self.assertListEqual(trees[0].word_yield(), ['Das', 'ist', 'gut', '.'])
+        self.assertListEqual(trees[2].word_yield(), [u'Schön'])
+
+        self.assertListEqual(np.sentence_names_to_hybridtrees(['4'], self.path), [])
+
+    def test_index(self):
+        index = np.sentence_index(self.path)
+        self.assertListEqual(list(index), ['1', '2', '3'])
+        self.assertFalse(os.path.exists(index_file_name(self.path)))
+        with io.open(self.path, 'rb') as corpus:
+            corpus.seek(index['2'])
+            self.assertEqual(corpus.readline(), b'#BOS 2\n')
+
+        for names in [['2'], ['3', '1'], ['1', '2', '3', '4']]:
+            expected = [str(tree) for tree in np.sentence_names_to_hybridtrees(names, self.path)]
+            trees = np.sentence_names_to_hybridtrees(names, self.path, index=True)
+            self.assertListEqual([str(tree) for tree in trees], expected)
+        self.assertTrue(os.path.exists(index_file_name(self.path)))
+
+    def test_discodop_header(self):
+        self.write('sample.export', DISCODOP)
+        for index in [False, True]:
+            trees = np.sentence_names_to_hybridtrees(['7'], self.path, index=index)
+            self.assertEqual(len(trees), 1)
+            self.assertListEqual(trees[0].word_yield(), ['Er', u'schläft'])
+            self.assertListEqual(trees[0].pos_yield(), ['PPER', 'VVFIN'])
+            self.assertListEqual(trees[0].labelled_spans(), [['S', 0, 1]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+from __future__ import print_function
+import unittest
+from dependency.induction import induce_grammar
+from dependency.labeling import the_labeling_factory
+from grammar.induction.recursive_partitioning import the_recursive_partitioning_factory, direct_extraction
+from grammar.induction.parallel_induction import induce_in_parallel
+from grammar.induction.count_table import RuleCountTable
+from hybridtree.general_hybrid_tree import HybridTree
+from hybridtree.monadic_tokens import CoNLLToken
+
+
+def dependency_tree(words):
+    # chain of dependencies, the last word is the root
+    tree = HybridTree()
+    for i, (form, pos) in enumerate(words):
+        tree.add_node(str(i), CoNLLToken(form, '_', pos, pos, '_', 'DEP'), True)
+    for i in range(len(words) - 1):
+        tree.add_child(str(i + 1), str(i))
+    tree.add_to_root(str(len(words) - 1))
+    tree.reorder()
+    return tree
+
+
+def corpus():
+    sentences = [[('Piet', 'NP'), ('Marie', 'N'), ('helpen', 'V')],
+                 [('Marie', 'N'), ('lezen', 'V')],
+                 [('Piet', 'NP'), ('Marie', 'N'), ('leren', 'V'), ('lezen', 'V')],
+                 [('lezen', 'V')]]
+    return [dependency_tree(sentence) for sentence in sentences * 5]
+
+
+class ParallelInductionTest(unittest.TestCase):
+    def test_dependency_induction(self):
+        labeling = the_labeling_factory().create_simple_labeling_strategy('child', 'pos')
+        term_pos = lambda token: token.pos()
+        fanout_1 = the_recursive_partitioning_factory().get_partitioning('fanout-1')
+        for rec_par in [[direct_extraction], fanout_1]:
+            n_seq, sequential = induce_grammar(corpus(), labeling, term_pos, rec_par, 'START')
+            n_par, parallel = induce_grammar(corpus(), labeling, term_pos, rec_par, 'START', n_workers=3,
+                                             shard_size=3)
+            self.assertEqual(n_seq, 20)
+            self.assertEqual(n_par, 20)
+            self.assertEqual([str(rule) for rule in parallel.rules()], [str(rule) for rule in sequential.rules()])
+
+    def test_feature_logging(self):
+        labeling = the_labeling_factory().create_simple_labeling_strategy('child', 'pos')
+        term_pos = lambda token: token.pos()
+
+        def induce(tree):
+            _, grammar = induce_grammar([tree], labeling, term_pos, [direct_extraction], 'START')
+            features = {(rule.get_idx(), 'f', ()): 1 for rule in grammar.rules()}
+            return grammar, features
+
+        results = [induce_in_parallel(corpus(), induce, n_workers=n_workers, shard_size=3, feature_logging=True)
+                   for n_workers in [1, 2]]
+        self.assertEqual(results[0][0], results[1][0])
+        self.assertEqual(str(results[0][1]), str(results[1][1]))
+        self.assertDictEqual(dict(results[0][2]), dict(results[1][2]))
+        self.assertEqual(results[1][2][('START', 'f')], 20)
+
+    def test_count_table(self):
+        labeling = the_labeling_factory().create_simple_labeling_strategy('child', 'pos')
+        term_pos = lambda token: token.pos()
+        _, in_memory = induce_grammar(corpus(), labeling, term_pos, [direct_extraction], 'START')
+        for n_workers in [1, 2]:
+            table = RuleCountTable()
+            # trees are generated lazily
+            trees = (tree for tree in corpus())
+            n_trees, spilled = induce_grammar(trees, labeling, term_pos, [direct_extraction], 'START',
+                                              n_workers=n_workers, shard_size=3, count_table=table)
+            self.assertEqual(n_trees, 20)
+            self.assertEqual(len(table), len(in_memory.rules()))
+            self.assertEqual(str(spilled), str(in_memory))
+            table.close()
+
+    def test_count_table_features(self):
+        labeling = the_labeling_factory().create_simple_labeling_strategy('child', 'pos')
+        term_pos = lambda token: token.pos()
+
+        def induce(tree):
+            _, grammar = induce_grammar([tree], labeling, term_pos, [direct_extraction], 'START')
+            features = {(rule.get_idx(), 'f', ()): 1 for rule in grammar.rules()}
+            return grammar, features
+
+        _, grammar, features = induce_in_parallel(corpus(), induce, n_workers=1, shard_size=3, feature_logging=True)
+        table = RuleCountTable()
+        _, spilled, spilled_features = induce_in_parallel(corpus(), induce, n_workers=1, shard_size=3,
+                                                          feature_logging=True, count_table=table)
+        table.close()
+        self.assertEqual(str(spilled), str(grammar))
+        self.assertDictEqual(dict(spilled_features), dict(features))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+from __future__ import print_function
+import unittest
+import os
+import corpora.parallel_loading as pl
+import corpora.negra_parse as np
+import corpora.tiger_parse as tp
+from corpora.conll_parse import parse_conll_corpus
+from tests.corpus_fixtures import STANDARD, SAMPLE, CONLL, CorpusDirectoryTest
+
+
+def signature(tree):
+    return tree.sent_label(), str(tree), tree.full_yield(), tree.id_yield()
+
+
+class ParallelLoadingTest(CorpusDirectoryTest):
+    def assertSameTrees(self, trees, expected):
+        self.assertListEqual([signature(tree) for tree in trees], [signature(tree) for tree in expected])
+
+    def test_chunks(self):
+        path = self.write('sample.export', STANDARD * 3)
+        for chunk_size in [1, 50, 1000]:
+            ranges = pl.chunks(path, pl.EXPORT, chunk_size)
+            self.assertEqual(ranges[0][0], STANDARD.index('#BOS'))
+            self.assertEqual(ranges[-1][1], os.path.getsize(path))
+            for (_, end, _), (begin, _, _) in zip(ranges, ranges[1:]):
+                self.assertEqual(end, begin)
+        self.assertEqual(len(pl.chunks(path, pl.EXPORT, 1)), 9)
+
+        path = self.write('sample.conll', CONLL)
+        self.assertListEqual([count for _, _, count in pl.chunks(path, pl.CONLL, 1)], [0, 1, 2, 3])
+
+    def test_export(self):
+        path = self.write('sample.export', STANDARD * 3)
+        expected = list(np.hybridtrees(path, add_vroot=True))
+        for n_workers in [1, 3]:
+            for chunk_size in [1, 100, 1 << 20]:
+                trees = pl.load_corpus(path, pl.EXPORT, n_workers=n_workers, chunk_size=chunk_size, add_vroot=True)
+                self.assertSameTrees(trees, expected)
+        trees = pl.iter_corpus(path, pl.EXPORT, n_workers=2, chunk_size=1, names=['3', '2'])
+        self.assertListEqual([tree.sent_label() for tree in trees], ['2', '3'] * 3)
+
+    def test_tiger(self):
+        path = self.write('sample.xml', SAMPLE, encoding='iso-8859-1')
+        expected = list(tp.hybridtrees(path))
+        for n_workers in [1, 2]:
+            for chunk_size in [1, 1 << 20]:
+                self.assertSameTrees(pl.load_corpus(path, pl.TIGERXML, n_workers, chunk_size), expected)
+        trees = pl.load_corpus(path, pl.TIGERXML, 2, 1, names=['s2'], disconnect_punctuation=False)
+        self.assertSameTrees(trees, list(tp.hybridtrees(path, names=['s2'], disconnect_punctuation=False)))
+
+    def test_conll(self):
+        path = self.write('sample.conll', CONLL)
+        for start, limit in [(0, 100), (1, 3), (2, 3)]:
+            expected = list(parse_conll_corpus(path, False, limit, start))
+            for chunk_size in [1, 30, 1 << 20]:
+                trees = pl.load_corpus(path, pl.CONLL, 2, chunk_size, start=start, limit=limit)
+                self.assertSameTrees(trees, expected)
+        self.assertEqual(len(expected), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
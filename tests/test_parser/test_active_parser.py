@@ -2,6 +2,7 @@ from __future__ import print_function, division
 
 __author__ = 'kilian'
 
+import random
 import unittest
 
 from dependency.induction import induce_grammar
@@ -13,6 +14,7 @@ from hybridtree.general_hybrid_tree import HybridTree
 from hybridtree.monadic_tokens import *
 from parser.active.derivation import Derivation
 from parser.active.parsing import *
+from parser.active.parse_items import ItemLayout, Range
 from grammar.lcfrs_derivation import derivation_to_hybrid_tree
 from parser.sDCPevaluation.evaluator import DCP_evaluator, dcp_to_hybridtree
 from tests.test_induction import hybrid_tree_1, hybrid_tree_2
@@ -260,6 +262,80 @@ class ActiveParserTest(unittest.TestCase):
         self.assertEqual(counter, number_of_ambiguous_trees(len(word) // 2))
         print(counter)
 
+    def test_late_passive_items(self):
+        # passive items that are found after an item waits for them are combined as well
+        grammar = discontinuous_chain_grammar()
+        for n, count in [(7, 8), (8, 17)]:
+            parser = Parser(grammar, ['a'] * n)
+            self.assertTrue(parser.recognized())
+            self.assertEqual(len(parser.successful_root_items()), count)
+
+    def test_weighted_search(self):
+        grammar = discontinuous_chain_grammar()
+        weights = [1.0, 0.6, 0.5, 0.9, 0.3]
+        for rule, weight in zip(grammar.rules(), weights):
+            rule.set_weight(weight)
+        word = ['a'] * 7
+
+        parser = Parser(grammar, word, k=None)
+        all_weights = sorted([derivation.weight() for derivation in parser.all_derivation_trees()], reverse=True)
+        k_best = list(parser.k_best_derivation_trees())
+        self.assertEqual(len(k_best), 8)
+        for (weight, derivation), expected in zip(k_best, all_weights):
+            self.assertAlmostEqual(weight, expected)
+            self.assertAlmostEqual(derivation.weight(), expected)
+        self.assertAlmostEqual(parser.best(), all_weights[0])
+        self.assertAlmostEqual(parser.best_derivation_tree().weight(), all_weights[0])
+        self.assertEqual(len(list(Parser(grammar, word, k=3).k_best_derivation_trees())), 3)
+
+        viterbi = Parser(grammar, word, viterbi=True)
+        self.assertTrue(viterbi.recognized())
+        self.assertAlmostEqual(viterbi.best(), all_weights[0])
+        self.assertAlmostEqual(viterbi.best_derivation_tree().weight(), all_weights[0])
+
+        for parser in [Parser(grammar, ['a'] * 2), Parser(grammar, ['a'] * 2, viterbi=True)]:
+            self.assertFalse(parser.recognized())
+            self.assertIsNone(parser.best())
+            self.assertIsNone(parser.best_derivation_tree())
+            self.assertListEqual(list(parser.k_best_derivation_trees()), [])
+
+    def test_random_viterbi_search(self):
+        # viterbi search agrees with the exhaustive one for random weights
+        rnd = random.Random(0)
+        grammar = fanout_two_grammar()
+        for _ in range(500):
+            for rule in grammar.rules():
+                rule.set_weight(rnd.uniform(0.05, 1.0))
+            word = ['a'] * rnd.randint(1, 5) + ['b'] * rnd.randint(1, 4)
+            exhaustive = Parser(grammar, word)
+            viterbi = Parser(grammar, word, viterbi=True)
+            self.assertEqual(viterbi.recognized(), exhaustive.recognized())
+            if exhaustive.recognized():
+                self.assertAlmostEqual(viterbi.best(), exhaustive.best())
+                self.assertAlmostEqual(viterbi.best_derivation_tree().weight(), exhaustive.best())
+
+    def test_item_layout(self):
+        grammar = kallmeyer_grammar()
+        layout = ItemLayout(grammar.rules()[1])
+        # S(c x1 y1 c x2 y2 c x3) -> A B
+        self.assertEqual(layout.size, 12)
+        self.assertListEqual(layout.var_offsets, [[2, 4, 6], [8, 10]])
+        self.assertListEqual(layout.members[0], ['c', (0, 0, 2, 4), (1, 0, 8, 4), 'c', (0, 1, 4, 2), (1, 1, 10, 2),
+                                                 'c', (0, 2, 6, 0)])
+        for j, member in enumerate(layout.members[0]):
+            if isinstance(member, tuple):
+                self.assertEqual(member[3], number_of_consumed_terminals(layout.rule, 0, j, member[0]))
+        bounds = (0, 11, 1, 3, 5, 7, 9, 11, 3, 4, 7, 8)
+        self.assertEqual(layout.found(bounds, 0, 2), (1, 3, 5, 7))
+        self.assertEqual(layout.variables(bounds)[LCFRS_var(1, 1)], Range(7, 8))
+
+        word = 'c a a b c a a b c a a'.split(' ')
+        parser = Parser(grammar, word)
+        items = parser.query_passive_items_strict('A', 3, [Range(1, 3), Range(5, 7), Range(9, 11)])
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0].range(LCFRS_var(-1, 2)), Range(9, 11))
+        self.assertListEqual(parser.query_passive_items_strict('A', 1, [Range(1, 4)]), [])
+
 
 def number_of_ambiguous_trees(n):
     assert (n >= 1)
@@ -467,6 +543,86 @@ def kallmeyer_grammar():
     return grammar
 
 
+def discontinuous_chain_grammar():
+    grammar = LCFRS('S')
+
+    x1 = LCFRS_var(0, 0)
+    x2 = LCFRS_var(0, 1)
+    y1 = LCFRS_var(1, 0)
+
+    lhs = LCFRS_lhs('S')
+    lhs.add_arg([x1])
+    grammar.add_rule(lhs, ['A'])
+
+    lhs = LCFRS_lhs('A')
+    lhs.add_arg([x1, y1, x2])
+    grammar.add_rule(lhs, ['D', 'A'])
+
+    lhs = LCFRS_lhs('A')
+    lhs.add_arg(['a'])
+    grammar.add_rule(lhs, [])
+
+    lhs = LCFRS_lhs('D')
+    lhs.add_arg(['a'])
+    lhs.add_arg(['a'])
+    grammar.add_rule(lhs, [])
+
+    lhs = LCFRS_lhs('D')
+    lhs.add_arg([x1, y1])
+    lhs.add_arg([x2])
+    grammar.add_rule(lhs, ['D', 'A'])
+
+    assert (grammar.ordered()[0])
+    return grammar
+
+
+def fanout_two_grammar():
+    grammar = LCFRS('S')
+
+    x1 = LCFRS_var(0, 0)
+    x2 = LCFRS_var(0, 1)
+    y1 = LCFRS_var(1, 0)
+    y2 = LCFRS_var(1, 1)
+
+    for nont in ['A', 'B']:
+        lhs = LCFRS_lhs('S')
+        lhs.add_arg([x1, x2])
+        grammar.add_rule(lhs, [nont])
+
+        lhs = LCFRS_lhs(nont)
+        lhs.add_arg(['a'])
+        lhs.add_arg(['b'])
+        grammar.add_rule(lhs, [])
+
+    lhs = LCFRS_lhs('A')
+    lhs.add_arg(['a', x1])
+    lhs.add_arg(['b', x2])
+    grammar.add_rule(lhs, ['A'])
+
+    lhs = LCFRS_lhs('A')
+    lhs.add_arg([x1, 'a'])
+    lhs.add_arg([x2, 'b'])
+    grammar.add_rule(lhs, ['B'])
+
+    lhs = LCFRS_lhs('B')
+    lhs.add_arg(['a', x1])
+    lhs.add_arg([x2])
+    grammar.add_rule(lhs, ['A'])
+
+    lhs = LCFRS_lhs('B')
+    lhs.add_arg([x1, y1])
+    lhs.add_arg([x2, y2])
+    grammar.add_rule(lhs, ['A', 'B'])
+
+    lhs = LCFRS_lhs('B')
+    lhs.add_arg([x1])
+    lhs.add_arg(['b', x2])
+    grammar.add_rule(lhs, ['B'])
+
+    assert (grammar.ordered()[0])
+    return grammar
+
+
 def print_derivation_tree(root_element):
     derivation = Derivation()
     derivation_tree(derivation, root_element, None)
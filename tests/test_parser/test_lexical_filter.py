@@ -0,0 +1,78 @@
+from __future__ import print_function
+import unittest
+
+from grammar.lcfrs import LCFRS, LCFRS_lhs, LCFRS_var
+from parser.lexical_filter import LexicalFilter, min_yields, rule_profiles
+
+
+def filter_grammar():
+    grammar = LCFRS('S')
+    x1, x2 = LCFRS_var(0, 0), LCFRS_var(0, 1)
+
+    lhs = LCFRS_lhs('S')
+    lhs.add_arg([x1, x2])
+    grammar.add_rule(lhs, ['A'])
+
+    lhs = LCFRS_lhs('A')
+    lhs.add_arg(['a', x1])
+    lhs.add_arg(['a', x2])
+    grammar.add_rule(lhs, ['A'])
+
+    lhs = LCFRS_lhs('A')
+    lhs.add_arg(['a'])
+    lhs.add_arg(['a'])
+    grammar.add_rule(lhs, [])
+
+    # B only derives the empty string
+    lhs = LCFRS_lhs('B')
+    lhs.add_arg([])
+    grammar.add_rule(lhs, [])
+
+    lhs = LCFRS_lhs('S')
+    lhs.add_arg(['b', x1, 'b'])
+    grammar.add_rule(lhs, ['B'])
+
+    # E is unproductive
+    lhs = LCFRS_lhs('E')
+    lhs.add_arg(['c', x1])
+    grammar.add_rule(lhs, ['E'])
+
+    lhs = LCFRS_lhs('S')
+    lhs.add_arg([x1, 'c'])
+    grammar.add_rule(lhs, ['E'])
+    return grammar
+
+
+class LexicalFilterTest(unittest.TestCase):
+    def test_profiles(self):
+        grammar = filter_grammar()
+        self.assertDictEqual(min_yields(grammar), {'A': (1, 1), 'B': (0,), 'S': (2,)})
+
+        profiles = rule_profiles(grammar)
+        rules = list(grammar.rules())
+        recursive = profiles[rules[1].get_idx()]
+        self.assertEqual(recursive.fanout, 2)
+        self.assertDictEqual(dict(recursive.terms), {'a': 2})
+        self.assertEqual(recursive.member_lengths, ((1, 1), (1, 1)))
+        self.assertEqual(recursive.min_lengths, (2, 2))
+        self.assertEqual(recursive.suffix_lengths, (4, 2, 0))
+        self.assertEqual(profiles[rules[4].get_idx()].min_lengths, (2,))
+        self.assertFalse(profiles[rules[6].get_idx()].productive)
+
+    def test_filter(self):
+        grammar = filter_grammar()
+        rules = list(grammar.rules())
+
+        lexical_filter = LexicalFilter(grammar, ['a', 'a', 'a'])
+        self.assertListEqual([lexical_filter.admits(rule) for rule in rules],
+                             [True, False, True, True, False, False, False])
+        self.assertTrue(lexical_filter.fits(rules[2], 1, 1))
+        self.assertFalse(lexical_filter.fits(rules[2], 0, 1))
+
+        lexical_filter = LexicalFilter(grammar, ['b', 'c', 'a', 'a', 'b'])
+        self.assertListEqual([lexical_filter.admits(rule) for rule in rules],
+                             [True, True, True, True, True, False, False])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,10 +2,15 @@ from __future__ import print_function
 
 __author__ = 'kilian'
 
+import math
 import unittest
 
+from grammar.lcfrs import *
 from parser.naive.parsing import *
-from tests.test_parser.test_active_parser import ambiguous_copy_grammar
+from parser.naive.parsing import RuleLayout, instantiate_terminals, make_rule_instances, slot_lengths
+from parser.lexical_filter import LexicalFilter
+from tests.test_parser.test_active_parser import ambiguous_copy_grammar, kallmeyer_grammar, kaeshammer_grammar, \
+    create_copy_grammar
 
 
 class PassiveParserTest(unittest.TestCase):
@@ -52,6 +57,94 @@ class PassiveParserTest(unittest.TestCase):
         derivation = parser2.best_derivation_tree()
         print(derivation)
 
+    def test_rule_layout(self):
+        word = ['a', 'b', 'a', 'a', 'b', 'a']
+        for rule in create_copy_grammar().rules():
+            layout = RuleLayout(rule)
+            states = instantiate_terminals(layout, word)
+            instances = make_rule_instances(rule, word)
+            self.assertEqual(len(states), len(instances))
+            for state, instance in zip(states, instances):
+                spans = [mem for i in range(instance.lhs().fanout()) for mem in instance.lhs().arg(i)
+                         if isinstance(mem, Span)]
+                bound = [Span(state[i], state[i + 1]) for i in range(1, len(state), 2) if state[i] >= 0]
+                self.assertListEqual(bound, spans)
+
+        # A(a x1 a, a x2 a, a x3 a) -> A: the components of A have length 2 at least, hence the terminals
+        # fit in one way only
+        rule = kallmeyer_grammar().rules()[2]
+        layout = RuleLayout(rule)
+        word = ['a'] * 12
+        self.assertGreater(len(instantiate_terminals(layout, word)), 1)
+        states = instantiate_terminals(layout, word, slot_lengths(LexicalFilter(kallmeyer_grammar(), word)
+                                                                  .profile(rule).member_lengths))
+        self.assertListEqual(states, [(0, 0, 1, -1, -1, 3, 4, 4, 5, -1, -1, 7, 8, 8, 9, -1, -1, 11, 12)])
+
+    def test_chart(self):
+        grammar = kaeshammer_grammar()
+        for m, n, recognized in [(2, 1, True), (3, 2, True), (1, 1, True), (2, 1, False)]:
+            word = ['a'] * m + ['b'] * n + ['c'] * (m if recognized else m + 1) + ['d'] * n
+            parser = LCFRS_parser(grammar, word)
+            self.assertEqual(parser.recognized(), recognized)
+            derivation = parser.best_derivation_tree()
+            if recognized:
+                self.assertEqual(sorted(derivation.terminal_positions(derivation.root_id())
+                                        + [p for id in derivation.ids() if id != derivation.root_id()
+                                           for p in derivation.terminal_positions(id)]),
+                                 list(range(1, len(word) + 1)))
+            else:
+                self.assertIsNone(derivation)
+
+        # the parser can be reused
+        parser = LCFRS_parser(kallmeyer_grammar())
+        for word, recognized in [('c a a b c a a b c a a', True), ('c a a a b c a a a b c a a a', False)]:
+            parser.clear()
+            parser.set_input(word.split(' '))
+            parser.parse()
+            self.assertEqual(parser.recognized(), recognized)
+
+    def test_viterbi_agenda(self):
+        grammar = weighted_ambiguous_copy_grammar()
+        estimate = TerminalOutsideEstimate(grammar)
+        for word in [['a'] * 6, ['a', 'b', 'a', 'a', 'b', 'a'], ['a', 'b', 'b', 'a'], ['a', 'b', 'a', 'b'] * 3]:
+            exhaustive = LCFRS_parser(grammar, word)
+            for parser in [LCFRS_parser(grammar, word, viterbi=True),
+                           LCFRS_parser(grammar, word, outside_estimate=estimate)]:
+                self.assertEqual(parser.recognized(), exhaustive.recognized())
+                self.assertAlmostEqual(parser.best(), exhaustive.best())
+                if exhaustive.recognized():
+                    derivation = parser.best_derivation_tree()
+                    weight = sum(-math.log(derivation.getRule(id).weight()) for id in derivation.ids())
+                    self.assertAlmostEqual(weight, exhaustive.best())
+                    self.assertEqual(derivation.root().lhs().arg(0), [Span(0, len(word))])
+                else:
+                    self.assertIsNone(parser.best_derivation_tree())
+
+        word = 'c a a b c a a b c a a'.split(' ')
+        parser = LCFRS_parser(kallmeyer_grammar(), word, viterbi=True)
+        self.assertTrue(parser.recognized())
+        self.assertEqual(parser.best(), 0.0)
+
+    def test_terminal_outside_estimate(self):
+        estimate = TerminalOutsideEstimate(weighted_ambiguous_copy_grammar())
+        word = ['a', 'b', 'c', 'a']
+        # 'a' costs -log(0.5) / 2, 'b' costs -log(0.25) / 2, 'c' occurs in no rule
+        self.assertAlmostEqual(estimate('A', [Span(1, 3)], word), math.log(2))
+        self.assertAlmostEqual(estimate('A', [Span(0, 1), Span(3, 4)], word), math.log(2))
+        self.assertAlmostEqual(estimate('S', [Span(0, 4)], word), 0.0)
+
+
+def weighted_ambiguous_copy_grammar():
+    grammar = ambiguous_copy_grammar()
+    weights = {'a': 0.5, 'b': 0.25}
+    for rule in grammar.rules():
+        terms = rule.terms()
+        if terms:
+            rule.set_weight(weights[terms[0]])
+        elif rule.rank() == 2:
+            rule.set_weight(0.3)
+    return grammar
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -7,7 +7,8 @@ from grammar.induction.decomposition import fanout_limited_partitioning
 from corpora.conll_parse import parse_conll_corpus
 from dependency.induction import induce_grammar
 from grammar.induction.recursive_partitioning import cfg
-from grammar.induction.terminal_labeling import the_terminal_labeling_factory, PosTerminals, FormPosTerminalsUnk
+from grammar.induction.terminal_labeling import the_terminal_labeling_factory, PosTerminals, FormPosTerminalsUnk, \
+    StanfordUNKing
 from constituent.induction import fringe_extract_lcfrs, direct_extract_lcfrs
 from dependency.labeling import the_labeling_factory
 from hybridtree.general_hybrid_tree import HybridTree
@@ -104,6 +105,29 @@ class sDCPParserTest(unittest.TestCase):
 
         print("completed test", file=stderr)
 
+    def test_training_tree_labels(self):
+        # rare capitalized words are labelled by a signature that depends on the position
+        trees = [flat_tree("s1", [("Heute", "ADV"), ("kommt", "VVFIN"), ("er", "PPER")]),
+                 flat_tree("s2", [("Er", "PPER"), ("kommt", "VVFIN"), ("gern", "ADV")]),
+                 flat_tree("s3", [("Er", "PPER"), ("kommt", "VVFIN"), ("gern", "ADV")])]
+        terminal_labeling = StanfordUNKing(trees, unknown_threshold=1)
+        first = trees[0].token_yield()[0]
+        self.assertNotEqual(terminal_labeling.token_label(first, 0), terminal_labeling.token_label(first))
+
+        grammar = LCFRS('START')
+        for tree in trees:
+            part = fanout_limited_partitioning(tree.unlabelled_structure(), 1)
+            grammar.add_gram(fringe_extract_lcfrs(tree, part, naming='child', term_labeling=terminal_labeling))
+        grammar.make_proper()
+
+        # training trees are labelled as in grammar induction, so each of them has a reduct
+        parser = LCFRS_sDCP_Parser(grammar, terminal_labelling=terminal_labeling)
+        for tree in trees:
+            parser.set_input(tree)
+            parser.parse()
+            self.assertTrue(parser.recognized())
+            parser.clear()
+
     def test_basic_em_training(self):
         tree = hybrid_tree_1()
         tree2 = hybrid_tree_2()
@@ -486,6 +510,16 @@ def constituent_tree_2():
     return tree
 
 
+def flat_tree(name, tagged_words):
+    tree = ConstituentTree(name)
+    tree.set_label("S", "S")
+    for i, (word, pos) in enumerate(tagged_words):
+        tree.add_leaf("f" + str(i), pos, word)
+        tree.add_child("S", "f" + str(i))
+    tree.add_to_root("S")
+    return tree
+
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,6 @@
 from __future__ import print_function
 import unittest
-from corpora.sdc_parse import parse_sentence, parse_file, export_sentence, export_corpus
+from corpora.sdc_parse import parse_sentence, parse_file, iter_file, export_sentence, export_corpus, write_sentence
 from grammar.induction.decomposition import left_branching_partitioning
 from graphs.util import render_and_view_dog, extract_recursive_partitioning, pretty_print_rec_partitioning
 from graphs.graph_decomposition import compute_decomposition, induce_grammar_from, dog_evaluation
@@ -8,6 +8,9 @@ from graphs.dog_generator import generate_sdg
 from parser.naive.parsing import LCFRS_parser
 from itertools import product
 from random import randint
+import io
+import os
+import tempfile
 
 content = """
 #20001001
@@ -48,6 +51,31 @@ class SDPTest(unittest.TestCase):
         # print(export_sentence(dsg)[1:])
         self.assertListEqual(lines[2:], export_sentence(dsg)[1:])
 
+    def test_sdp_file_selection(self):
+        lines = content.splitlines()[2:]
+        handle, path = tempfile.mkstemp(suffix='.sdp')
+        os.close(handle)
+        try:
+            with open(path, 'w') as corpus:
+                corpus.write('#SDP 2015\n')
+                for sentence_id in [3, 5, 8, 13]:
+                    write_sentence(parse_sentence(lines[:sentence_id], sentence_id), corpus)
+            self.assertListEqual([dsg.label for dsg in parse_file(path)], [3, 5, 8, 13])
+            self.assertListEqual([dsg.label for dsg in iter_file(path, start_id=4, last_id=12)], [5, 8])
+            self.assertListEqual([dsg.label for dsg in iter_file(path, start_id=5, max_n=2)], [5, 8])
+            self.assertListEqual([dsg.label for dsg in iter_file(path, last_id=2)], [])
+            self.assertListEqual([len(dsg.sentence) for dsg in iter_file(path, start_id=13)], [13])
+
+            export_corpus(iter_file(path, start_id=8), path + '.export')
+            with io.open(path + '.export') as corpus:
+                exported = corpus.read().splitlines()
+            expected = [export_sentence(parse_sentence(lines[:n], n)) for n in [8, 13]]
+            self.assertListEqual(exported, ['#SDP 2015'] + expected[0] + [''] + expected[1] + [''])
+        finally:
+            for name in [path, path + '.export']:
+                if os.path.exists(name):
+                    os.remove(name)
+
     def test_sdp_parsing(self):
         for style, rec_part_strat in product(['dm', 'pas', 'psd'], self.rec_part_strategies):
             path = 'res/sdp/trial/' + style + '.sdp'
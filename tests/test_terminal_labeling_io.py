@@ -6,6 +6,18 @@ import json
 import io
 
 
+class Sentence:
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+    def token_yield(self):
+        return self.tokens
+
+
+def tokens(tagged_words):
+    return [mt.construct_conll_token(form, pos) for form, pos in tagged_words]
+
+
 class TestTerminalLabelingIO(unittest.TestCase):
     def test_simple_labelings(self):
         for labeling_class in [tl.PosTerminals, tl.FormTerminals, tl.CPosTerminals]:
@@ -53,6 +65,66 @@ class TestTerminalLabelingIO(unittest.TestCase):
         self.assertEqual(label1, instance2.token_label(token1))
         self.assertEqual(label2, instance2.token_label(token2))
 
+    def test_label_cache(self):
+        cache = tl.LabelCache(2)
+        cache.put(('Tisch', 'NN', False), 'a')
+        cache.put(('Stuhl', 'NN', False), 'b')
+        self.assertEqual(cache.get(('Tisch', 'NN', False)), 'a')
+        cache.put(('Bank', 'NN', False), 'c')
+        # least recently used entry is evicted
+        self.assertIsNone(cache.get(('Stuhl', 'NN', False)))
+        self.assertEqual(cache.get(('Tisch', 'NN', False)), 'a')
+        self.assertEqual(len(cache), 2)
+
+    def test_label_sentence(self):
+        sentence = tokens([('Der', 'ART'), ('Tisch', 'NN'), ('steht', 'VVFIN'), ('Tisch', 'NN')])
+        self.assertListEqual(tl.PosTerminals().label_sentence(sentence), ['ART', 'NN', 'VVFIN', 'NN'])
+
+        labeling = tl.FormPosTerminalsUnkMorph([Sentence(sentence)], 2)
+        expected = ['UNKNOWN-:-ART', 'tisch-:-NN', 'UNKNOWN-:-VVFIN', 'tisch-:-NN']
+        self.assertListEqual(labeling.label_sentence(sentence), expected)
+        self.assertListEqual(labeling.prepare_parser_input(sentence), expected)
+        self.assertListEqual([labeling.token_label(token) for token in sentence], expected)
+        self.assertEqual(len(labeling.label_cache()), 3)
+
+    def test_cache_key(self):
+        composition = tl.CompositionalTerminalLabeling(tl.FormTerminals(), tl.PosTerminals(), binding_string='/')
+        self.assertEqual(composition.cache_key(),
+                         tl.CompositionalTerminalLabeling(tl.FormTerminals(), tl.PosTerminals(), '/').cache_key())
+        self.assertNotEqual(composition.cache_key(),
+                            tl.CompositionalTerminalLabeling(tl.FormTerminals(), tl.PosTerminals(), '+').cache_key())
+        self.assertNotEqual(tl.FormTerminals().cache_key(), tl.PosTerminals().cache_key())
+
+        # labelings trained on different corpora
+        corpus1 = [Sentence(tokens([('Der', 'ART'), ('Tisch', 'NN')]))] * 2
+        corpus2 = [Sentence(tokens([('Der', 'ART'), ('Stuhl', 'NN')]))] * 2
+        for labeling_class in [tl.FormTerminalsUnk, tl.FormTerminalsPOS, tl.FormPosTerminalsUnk,
+                               tl.FormPosTerminalsUnkMorph]:
+            self.assertEqual(labeling_class(corpus1, 2).cache_key(), labeling_class(corpus1, 2).cache_key())
+            self.assertNotEqual(labeling_class(corpus1, 2).cache_key(), labeling_class(corpus2, 2).cache_key())
+
+        # functions are not serialized, so each instance has its own key
+        features = tl.FeatureTerminals(None, None)
+        self.assertEqual(features.cache_key(), features.cache_key())
+        self.assertNotEqual(features.cache_key(), tl.FeatureTerminals(None, None).cache_key())
+        composition = tl.CompositionalTerminalLabeling(features, tl.PosTerminals())
+        self.assertNotEqual(composition.cache_key(),
+                            tl.CompositionalTerminalLabeling(tl.FeatureTerminals(None, None),
+                                                             tl.PosTerminals()).cache_key())
+
+    def test_lexicon_labelings(self):
+        sentence = [mt.CoNLLToken(form, '_', pos, pos, feats, '_') for form, pos, feats
+                    in [('Der', 'ART', '_'), ('Tisch', 'NN', 'case=nom|num=sg'), ('steht', 'VVFIN', '_'),
+                        ('Tisch', 'NN', 'case=acc|num=sg')]]
+        for labeling in [tl.FormTerminalsUnk([Sentence(sentence)], 2, UNK='?'),
+                         tl.FormTerminalsPOS([Sentence(sentence)], 2),
+                         tl.FormPosTerminalsUnk([Sentence(sentence)], 2),
+                         tl.FormPosTerminalsUnkMorph([Sentence(sentence)], 3, add_morph={'NN': ['case']})]:
+            instance2 = tl.deserialize_labeling(json.loads(json.dumps(labeling.serialize())))
+            self.assertTrue(isinstance(instance2, labeling.__class__))
+            self.assertListEqual(instance2.label_sentence(sentence), labeling.label_sentence(sentence))
+            self.assertEqual(instance2.cache_key(), labeling.cache_key())
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,65 @@
+from __future__ import print_function
+import unittest
+import os
+import corpora.tiger_parse as tp
+from corpora.offset_index import index_file_name, load_index
+from tests.corpus_fixtures import SAMPLE, CorpusDirectoryTest
+
+
+class TigerParseTest(CorpusDirectoryTest):
+    def setUp(self):
+        super(TigerParseTest, self).setUp()
+        self.path = self.write('sample.xml', SAMPLE, encoding='iso-8859-1')
+        tp.clear()
+
+    def tearDown(self):
+        tp.clear()
+        super(TigerParseTest, self).tearDown()
+
+    def test_streaming(self):
+        trees = list(tp.hybridtrees(self.path))
+        self.assertListEqual([tree.sent_label() for tree in trees], ['s1', 's2'])
+        self.assertListEqual(trees[0].word_yield(), [u'Schön', 'ist', 'es'])
+        self.assertListEqual([token.form() for token in trees[0].full_token_yield()], [u'Schön', 'ist', 'es', '.'])
+        self.assertTrue(trees[0].disconnected('s1_4'))
+        self.assertEqual(trees[0].node_token('s1_3').edge(), 'SB')
+        self.assertListEqual(trees[1].labelled_spans(), [['S', 0, 2], ['VP', 2, 2]])
+
+        trees = list(tp.hybridtrees(self.path, disconnect_punctuation=False, names=['s1']))
+        self.assertEqual(len(trees), 1)
+        self.assertEqual(trees[0].word_yield(), [u'Schön', 'ist', 'es', '.'])
+
+        graphs = list(tp.deep_syntax_graphs(self.path))
+        self.assertListEqual([graph.label for graph in graphs], ['s1', 's2'])
+
+    def test_random_access(self):
+        index = tp.sentence_index(self.path)
+        self.assertListEqual(list(index), ['s1', 's2'])
+        self.assertFalse(os.path.exists(index_file_name(self.path)))
+
+        streamed = list(tp.hybridtrees(self.path))
+        trees = tp.sentence_names_to_hybridtrees(['s2', 's3', 's1'], self.path, persist_index=True)
+        self.assertListEqual([tree.sent_label() for tree in trees], ['s2', 's1'])
+        self.assertEqual(trees[0], streamed[1])
+        self.assertEqual(trees[1], streamed[0])
+        self.assertListEqual(trees[1].word_yield(), streamed[0].word_yield())
+        self.assertIsNone(tp.sentence_name_to_hybridtree('s3', self.path))
+
+        graphs = tp.sentence_names_to_deep_syntax_graphs(['s2'], self.path)
+        self.assertEqual(graphs[0].label, 's2')
+
+    def test_persisted_index(self):
+        tp.sentence_index(self.path, persist=True)
+        self.assertTrue(os.path.exists(index_file_name(self.path)))
+        self.assertDictEqual(load_index(self.path), tp.build_index(self.path))
+        tp.clear()
+        self.assertListEqual(tp.sentence_name_to_hybridtree('s2', self.path).word_yield(), ['Er', 'kommt', 'heute'])
+
+        # the index is stale once the corpus file changes
+        with open(self.path, 'ab') as corpus:
+            corpus.write(b'\n')
+        self.assertIsNone(load_index(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()